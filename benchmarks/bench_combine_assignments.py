@@ -0,0 +1,63 @@
+"""
+Scaling benchmark for the combine_assignments pass.
+
+Run with:
+    python -m benchmarks.bench_combine_assignments [--sizes 1000 10000 ...]
+
+The previous pass removed each combined temporary with list.pop(i), which
+shifts the rest of the list, so it grew quadratically on long listings.
+It is reproduced below only as a reference point for timing and is
+skipped above --legacy-max instructions. The ns/instr column of the
+forwarding pass should stay flat up to millions of instructions.
+"""
+import argparse
+from collections import Counter
+
+from benchmarks.common import DEFAULT_SIZES, synthetic_ir, time_call, print_table
+from src.ir import Instruction, is_temp, COPY, UNSUPPORTED
+from src.forwarding import forward_temporaries
+
+
+def legacy_combine_assignments(code):
+    code = list(code)
+    uses = Counter(var for ins in code for var in ins.uses())
+    i = 0
+    while i < len(code) - 1:
+        curr = code[i]
+        next_ins = code[i + 1]
+        if (is_temp(curr.dest) and curr.op != UNSUPPORTED and uses[curr.dest] == 1
+                and next_ins.op == COPY and next_ins.arg1 == curr.dest):
+            code[i + 1] = Instruction(curr.op, next_ins.dest, curr.arg1, curr.arg2)
+            code.pop(i)
+            continue
+        i += 1
+    return code
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES + [4_000_000])
+    parser.add_argument('--legacy-max', type=int, default=200_000,
+                        help="Largest size the quadratic legacy pass is timed at")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    rows = []
+    for size in args.sizes:
+        code = synthetic_ir(size)
+        if len(code) <= args.legacy_max:
+            legacy_seconds = time_call(legacy_combine_assignments, code, repeat=args.repeat)
+            legacy = [f"{legacy_seconds * 1000:.2f}", len(code) - len(legacy_combine_assignments(code))]
+        else:
+            legacy = ["-", "-"]
+        seconds = time_call(forward_temporaries, code, repeat=args.repeat)
+        _, removed = forward_temporaries(code)
+        rows.append([len(code), *legacy, f"{seconds * 1000:.2f}", removed,
+                     f"{seconds / len(code) * 1e9:.0f}"])
+
+    print_table(["instructions", "legacy ms", "legacy removed", "forwarding ms",
+                 "forwarding removed", "ns/instr"], rows)
+
+
+if __name__ == '__main__':
+    main()
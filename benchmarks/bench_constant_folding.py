@@ -0,0 +1,87 @@
+"""
+Compare the table-driven constant folder with the previous eval() path.
+
+Run with:
+    python -m benchmarks.bench_constant_folding [--sizes 10000 100000 ...]
+
+The previous pass called eval() on every binary instruction whose operands
+were both integer literals, compiling a code object per instruction. It is
+reproduced below only as a reference point for timing and folds.
+"""
+import argparse
+
+from benchmarks.common import time_call, print_table
+from src.ir import Instruction, Const, name, COPY
+from src.optimizer import CodeOptimizer
+
+LEGACY_FOLDABLE_OPS = frozenset(['+', '-', '*', '/', '%'])
+
+
+def legacy_constant_folding(code):
+    folded = []
+    for ins in code:
+        if (ins.op in LEGACY_FOLDABLE_OPS
+                and isinstance(ins.arg1, Const) and type(ins.arg1.value) is int
+                and isinstance(ins.arg2, Const) and type(ins.arg2.value) is int):
+            try:
+                result = eval(f"{ins.arg1.value} {ins.op} {ins.arg2.value}")
+                ins = Instruction(COPY, ins.dest, Const(result))
+            except Exception:
+                pass
+        folded.append(ins)
+    return folded
+
+
+def arithmetic_ir(size, chain=1):
+    """
+    Build `size` instructions of literal arithmetic.
+
+    Every `chain`-th instruction starts from two literals and the ones in
+    between combine the previous temporary with another literal, so only a
+    folder that substitutes folded temporaries can reduce whole chains.
+    With chain=1 every instruction has two literal operands.
+    """
+    ops = sorted(LEGACY_FOLDABLE_OPS)
+    code = []
+    for i in range(size):
+        dest = name(f"t{i}")
+        op = ops[i % len(ops)]
+        if i % chain == 0:
+            code.append(Instruction(op, dest, Const(i % 1000 + 7), Const(i % 13 + 1)))
+        else:
+            code.append(Instruction(op, dest, name(f"t{i - 1}"), Const(i % 11 + 1)))
+    return code
+
+
+def count_folded(code):
+    return sum(1 for ins in code if ins.op == COPY and isinstance(ins.arg1, Const))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 400_000])
+    parser.add_argument('--chain', type=int, nargs='+', default=[1, 4],
+                        help="Instructions per chain of dependent temporaries")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    def fold(code):
+        return CodeOptimizer().optimize_with_technique(code, 'constant_folding')
+
+    rows = []
+    for chain in args.chain:
+        for size in args.sizes:
+            code = arithmetic_ir(size, chain)
+            legacy_seconds = time_call(legacy_constant_folding, code, repeat=args.repeat)
+            seconds = time_call(fold, code, repeat=args.repeat)
+            rows.append([chain, size,
+                         f"{legacy_seconds * 1000:.1f}", count_folded(legacy_constant_folding(code)),
+                         f"{seconds * 1000:.1f}", count_folded(fold(code)),
+                         f"{size / seconds / 1e6:.2f}"])
+
+    print_table(["chain", "instructions", "eval ms", "eval folded", "table ms", "table folded",
+                 "M ins/s"], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""
+Scaling benchmark for CodeOptimizer._constant_propagation.
+
+Run with:
+    python -m benchmarks.bench_constant_propagation [--sizes 1000 10000 ...]
+
+The time per instruction should stay flat as the program grows; a
+super-linear pass shows up as a rising ns/instr column.
+"""
+import argparse
+
+from benchmarks.common import DEFAULT_SIZES, synthetic_ir, time_call, print_table
+from src.optimizer import CodeOptimizer
+
+
+def run_propagation(code):
+    optimizer = CodeOptimizer()
+    optimizer.code = list(code)
+    optimizer._constant_propagation()
+    return optimizer.code
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+    
+    rows = []
+    for size in args.sizes:
+        code = synthetic_ir(size)
+        seconds = time_call(run_propagation, code, repeat=args.repeat)
+        rows.append([len(code), f"{seconds * 1000:.2f}", f"{seconds / len(code) * 1e9:.0f}"])
+    
+    print_table(["instructions", "ms", "ns/instr"], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Compare liveness-driven dead code elimination with the original pass.
+
+Run with:
+    python -m benchmarks.bench_dead_code_elimination [--sizes 1000 10000 ...]
+
+The original pass worked on text lines: it collected every assigned name,
+then for each line split its right-hand side once per collected name to
+see whether that name appeared there, which is O(lines x names). It is
+copied below from the first version of src/optimizer.py and run on the
+formatted listing, only as a reference point for timing and removals. It
+is skipped above --legacy-max instructions. The liveness pass should stay
+well under a second at 100k instructions.
+"""
+import argparse
+
+from benchmarks.common import synthetic_ir, time_call, print_table
+from src.ir import format_code
+from src.liveness import eliminate_dead_code
+
+
+def legacy_analyze_variable_usage(lines):
+    used_vars = set()
+    defined_vars = set()
+
+    # First pass: collect variable definitions
+    for line in lines:
+        if '=' in line and not line.strip().startswith('if') and 'goto' not in line:
+            var = line.split('=', 1)[0].strip()
+            defined_vars.add(var)
+
+    # Second pass: collect variable uses
+    for line in lines:
+        if '=' in line and not line.strip().startswith('if') and 'goto' not in line:
+            # Right side of assignment
+            expr = line.split('=', 1)[1].strip()
+            # Add all defined variables that appear in the expression
+            for var in defined_vars:
+                if var in expr.split():
+                    used_vars.add(var)
+        elif 'if' in line:
+            # Condition in if statements
+            for var in defined_vars:
+                if var in line.split():
+                    used_vars.add(var)
+        elif 'goto' not in line and ':' not in line:
+            # Other statements
+            for var in defined_vars:
+                if var in line.split():
+                    used_vars.add(var)
+    return used_vars
+
+
+def legacy_dead_code_elimination(lines):
+    used_vars = legacy_analyze_variable_usage(lines)
+    new_code = []
+    for line in lines:
+        if '=' in line and not line.strip().startswith('if') and 'goto' not in line:
+            var = line.split('=', 1)[0].strip()
+            if var in used_vars or var.startswith('t') or var == "result":
+                new_code.append(line)
+        else:
+            new_code.append(line)
+    return new_code
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--legacy-max', type=int, default=20_000,
+                        help="Largest size the O(lines x names) original pass is timed at")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    rows = []
+    for size in args.sizes:
+        code = synthetic_ir(size)
+        if len(code) <= args.legacy_max:
+            lines = format_code(code)
+            legacy_seconds = time_call(legacy_dead_code_elimination, lines, repeat=args.repeat)
+            legacy = [f"{legacy_seconds * 1000:.2f}", len(lines) - len(legacy_dead_code_elimination(lines))]
+        else:
+            legacy = ["-", "-"]
+        seconds = time_call(eliminate_dead_code, code, repeat=args.repeat)
+        _, removed = eliminate_dead_code(code)
+        rows.append([len(code), *legacy, f"{seconds * 1000:.2f}", removed])
+
+    print_table(["instructions", "legacy ms", "legacy removed", "liveness ms", "liveness removed"], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""
+Throughput of IntermediateCodeGenerator in AST nodes per second.
+
+Run with:
+    python -m benchmarks.bench_generator [--functions 10 100 1000]
+
+Parsing is timed separately so the lowering column measures only the
+generator's own dispatch and instruction emission.
+"""
+import argparse
+import ast
+
+from benchmarks.common import synthetic_source, time_call, print_table
+from src.parser import IntermediateCodeGenerator
+
+
+def lower(tree):
+    generator = IntermediateCodeGenerator()
+    generator._process_module(tree)
+    return generator.code
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--functions', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--statements', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+    
+    rows = []
+    for functions in args.functions:
+        source = synthetic_source(functions, args.statements)
+        tree = ast.parse(source)
+        nodes = sum(1 for _ in ast.walk(tree))
+        parse_seconds = time_call(ast.parse, source, repeat=args.repeat)
+        lower_seconds = time_call(lower, tree, repeat=args.repeat)
+        instructions = len(lower(tree))
+        rows.append([nodes, instructions,
+                     f"{parse_seconds * 1000:.1f}", f"{lower_seconds * 1000:.1f}",
+                     f"{nodes / lower_seconds:,.0f}"])
+    
+    print_table(["ast nodes", "instructions", "parse ms", "lower ms", "nodes/s"], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Scaling benchmark for optimizing a module's functions on a process pool.
+
+Run with:
+    python -m benchmarks.bench_parallel_optimizer [--functions 100 400 1600] [--workers 1 2 4]
+
+Each module has the given number of many_functions functions. The serial
+column runs the whole pipeline over the whole listing with PassManager;
+the other columns run it with ParallelPassManager, one function per unit,
+in this process (0 workers) or on a pool of the given size. The pool is
+started before timing so its start-up cost is left out. Wall time should
+drop roughly with the number of cores until the module code and the whole
+program passes, which stay serial, dominate.
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.common import time_call, print_table
+from benchmarks.programs import many_functions
+from src.optimizer import CodeOptimizer, DEFAULT_PIPELINE
+from src.parallel import ParallelPassManager
+from src.parser import generate_intermediate_code
+from src.pass_manager import PassManager
+
+
+def optimize_serial(code):
+    return PassManager(DEFAULT_PIPELINE, CodeOptimizer()).run(code)
+
+
+def optimize_units(code, executor=None, workers=None):
+    manager = ParallelPassManager(DEFAULT_PIPELINE, CodeOptimizer(), executor, workers,
+                                  min_instructions=0)
+    return manager.run(code)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--functions', type=int, nargs='+', default=[100, 400, 1600])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{os.cpu_count()} CPUs")
+    pools = {}
+    for workers in args.workers:
+        pools[workers] = ProcessPoolExecutor(max_workers=workers)
+        # Start every worker now rather than inside the timed runs
+        list(pools[workers].map(abs, range(workers * 4)))
+
+    rows = []
+    try:
+        for functions in args.functions:
+            code = generate_intermediate_code(many_functions(functions))
+            serial = time_call(optimize_serial, code, repeat=args.repeat)
+            row = [functions, len(code), f"{serial * 1000:.1f}",
+                   f"{time_call(optimize_units, code, repeat=args.repeat) * 1000:.1f}"]
+            for workers in args.workers:
+                seconds = time_call(optimize_units, code, pools[workers], workers, repeat=args.repeat)
+                row.append(f"{seconds * 1000:.1f} ({serial / seconds:.1f}x)")
+            rows.append(row)
+    finally:
+        for pool in pools.values():
+            pool.shutdown()
+
+    print_table(["functions", "instructions", "serial ms", "0 workers ms",
+                 *(f"{workers} workers ms" for workers in args.workers)], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+import os
+import sys
+import time
+
+# Add the repository root to the path so the benchmarks can import src
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.ir import Instruction, Const, name, COPY, CALL, IF_FALSE, GOTO, LABEL
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+
+def synthetic_ir(size, block_size=50, variables=64):
+    """
+    Build a straight-line-heavy program of roughly `size` instructions.
+    
+    The program is a sequence of blocks separated by labels and conditional
+    jumps. Each block mixes constant definitions, arithmetic on user
+    variables and single-use temporaries, and calls, which is the shape
+    IntermediateCodeGenerator produces for arithmetic-heavy modules.
+    
+    Args:
+        size (int): Approximate number of instructions to generate
+        block_size (int): Instructions between labels
+        variables (int): Number of distinct user variables
+        
+    Returns:
+        list: List of Instruction objects
+    """
+    names = [name(f"v{i}") for i in range(variables)]
+    code = []
+    temp = 0
+    label = 0
+    ops = ['+', '-', '*', '//', '%']
+    
+    while len(code) < size:
+        code.append(Instruction(LABEL, arg1=name(f"L{label}")))
+        label += 1
+        for j in range(block_size // 5):
+            k = len(code)
+            x = names[k % variables]
+            y = names[(k * 7 + 3) % variables]
+            t_a = name(f"t{temp}")
+            t_b = name(f"t{temp + 1}")
+            temp += 2
+            code.append(Instruction(COPY, x, Const(k % 97 + 1)))
+            code.append(Instruction(ops[j % len(ops)], t_a, x, Const(j + 1)))
+            code.append(Instruction('+', t_b, t_a, y))
+            code.append(Instruction(COPY, y, t_b))
+            if j % 4 == 0:
+                code.append(Instruction(CALL, name(f"t{temp}"), name("print"), (y,)))
+                temp += 1
+            else:
+                code.append(Instruction(COPY, names[(k + 5) % variables], x))
+        cond = name(f"t{temp}")
+        temp += 1
+        code.append(Instruction('<', cond, names[label % variables], Const(100)))
+        code.append(Instruction(IF_FALSE, arg1=cond, arg2=name(f"L{label}")))
+        code.append(Instruction(GOTO, arg1=name(f"L{label}")))
+    
+    return code
+
+
+def synthetic_source(functions=100, statements=20):
+    """
+    Build a Python module exercising most of the node types the generator lowers.
+    
+    Args:
+        functions (int): Number of function definitions
+        statements (int): Statement groups per function body
+        
+    Returns:
+        str: Python source code
+    """
+    lines = []
+    for f in range(functions):
+        lines.append(f"def func{f}(a, b, items):")
+        lines.append("    total = 0")
+        for s in range(statements):
+            lines.append(f"    x{s} = (a + {s}) * b - a // {s + 1} % 7")
+            lines.append(f"    if x{s} > {s} and not b or a <= x{s} < 100:")
+            lines.append(f"        total += x{s} ** 2")
+            lines.append("    else:")
+            lines.append(f"        items[{s % 3}] = -x{s}")
+            lines.append("    for k, v in items:")
+            lines.append("        total = total + obj.scale[k] * v")
+            lines.append(f"    while total > {s * 10}:")
+            lines.append(f"        total -= len([a, b, (x{s}, 1)])")
+        lines.append("    return total")
+        lines.append(f"result{f} = func{f}(1, 2, data)")
+    return "\n".join(lines) + "\n"
+
+
+def time_call(func, *args, repeat=3):
+    """Return the best wall time in seconds over `repeat` runs"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def print_table(headers, rows):
+    """Print rows as an aligned plain-text table"""
+    widths = [max(len(str(cell)) for cell in column) for column in zip(headers, *rows)]
+    print("  ".join(str(h).rjust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print("  ".join(str(cell).rjust(w) for cell, w in zip(row, widths)))
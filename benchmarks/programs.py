@@ -0,0 +1,100 @@
+"""
+Synthetic Python programs of parameterized size and shape.
+
+Each generator takes `size`, the number of top-level units (statements,
+loop nests or functions) to emit, and returns module source. The shapes
+stress different parts of the compiler: expression depth and temporary
+count, long basic blocks, nested control flow, and many small functions.
+"""
+
+
+def deep_expressions(size, depth=24):
+    """
+    Assignments whose right-hand sides are nested `depth` levels deep.
+
+    Every level adds a temporary, so the generator's recursion and the
+    folding and propagation chains get long.
+    """
+    ops = ['+', '*', '-', '//', '%']
+    lines = ["a = 3", "b = 5"]
+    for i in range(size):
+        expr = "a" if i % 2 else "b"
+        for d in range(depth):
+            operand = str(d % 9 + 1) if d % 3 else ("a" if d % 2 else "b")
+            expr = f"({expr} {ops[(i + d) % len(ops)]} {operand})"
+        lines.append(f"x{i} = {expr}")
+    lines.append(f"print(x{size - 1})")
+    return "\n".join(lines) + "\n"
+
+
+def straight_line(size):
+    """
+    One long basic block of assignments, repeated subexpressions and prints.
+
+    There are no labels, so block-local passes (value numbering, constant
+    propagation) see the whole module at once.
+    """
+    lines = ["a = 2", "b = 7", "c = a * b"]
+    for i in range(size):
+        prev = f"v{i - 1}" if i else "c"
+        lines.append(f"v{i} = {prev} * 3 + b")
+        lines.append(f"w{i} = {prev} * 3 + b - a")
+        lines.append(f"k{i} = {i % 10} * 4 + 1")
+        if i % 10 == 9:
+            lines.append(f"print(v{i}, w{i}, k{i})")
+    return "\n".join(lines) + "\n"
+
+
+def nested_loops(size, depth=3):
+    """
+    `size` loop nests, each `depth` deep with loop-invariant work in the body.
+    """
+    lines = ["n = 4", "scale = 3", "total = 0"]
+    for i in range(size):
+        indent = ""
+        for d in range(depth):
+            if d % 2:
+                lines.append(f"{indent}j{d} = 0")
+                lines.append(f"{indent}while j{d} < n:")
+            else:
+                lines.append(f"{indent}for j{d} in range(n):")
+            indent += "    "
+        lines.append(f"{indent}t = scale * n + {i}")
+        lines.append(f"{indent}total = total + t + j0 * 4")
+        for d in reversed(range(depth)):
+            indent = indent[:-4]
+            if d % 2:
+                lines.append(f"{indent}    j{d} = j{d} + 1")
+    lines.append("print(total)")
+    return "\n".join(lines) + "\n"
+
+
+def many_functions(size, statements=6):
+    """
+    `size` small functions, each calling the previous one, plus calls to all of them.
+    """
+    lines = []
+    for f in range(size):
+        lines.append(f"def f{f}(a, b):")
+        lines.append("    r = a")
+        for s in range(statements):
+            lines.append(f"    if r > {s * 5}:")
+            lines.append(f"        r = r - b * {s + 1}")
+            lines.append("    else:")
+            lines.append(f"        r = r + {s}")
+        if f:
+            lines.append(f"    return f{f - 1}(r, b) + 1")
+        else:
+            lines.append("    return r")
+    for f in range(0, size, max(1, size // 20)):
+        lines.append(f"print(f{f}({f}, 2))")
+    return "\n".join(lines) + "\n"
+
+
+# Shape name -> generator, in the order the suite reports them
+SHAPES = {
+    'deep_expressions': deep_expressions,
+    'straight_line': straight_line,
+    'nested_loops': nested_loops,
+    'many_functions': many_functions,
+}
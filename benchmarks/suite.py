@@ -0,0 +1,266 @@
+"""
+Benchmark suite for the generator and every optimizer pass, with a regression gate.
+
+Run with:
+    python -m benchmarks.suite [--shapes straight_line ...] [--sizes 100 400]
+    python -m benchmarks.suite --save benchmarks/baseline.json
+    python -m benchmarks.suite --check benchmarks/baseline.json [--threshold 2.0]
+
+For every program shape in benchmarks.programs and every size, the suite
+times IntermediateCodeGenerator.generate, each CodeOptimizer pass run on
+its own over the unoptimized code, and the whole pipeline, and records
+the peak memory each one allocates. Peak memory is measured in a separate
+run under tracemalloc so it does not slow the timed runs down.
+
+The scaling exponent of a stage is the slope of log(time) against
+log(instructions) between the smallest and largest size: about 1 for a
+linear pass, 2 for a quadratic one. With --check the suite exits with
+status 1 when a stage got slower or bigger than the baseline by more than
+--threshold, or when its exponent grew by more than --exponent-margin.
+Baselines are only comparable on the machine that recorded them.
+"""
+import argparse
+import gc
+import json
+import math
+import platform
+import sys
+import tracemalloc
+
+from benchmarks.common import time_call, print_table
+from benchmarks.programs import SHAPES
+from src.optimizer import CodeOptimizer, DEFAULT_PIPELINE
+from src.parser import IntermediateCodeGenerator
+
+BASELINE_VERSION = 1
+
+# Differences below these are noise, whatever the ratio
+MIN_TIME_DELTA_MS = 5.0
+MIN_MEMORY_DELTA_KB = 256
+
+# Stages faster than this at the largest size are too noisy for an exponent
+MIN_EXPONENT_MS = 10.0
+
+
+def reference_workload():
+    """Fixed pure-Python work used to calibrate timings for the speed of the machine"""
+    table = {}
+    for i in range(200_000):
+        key = ('+', i % 997, i % 13)
+        table[key] = table.get(key, 0) + 1
+    return sorted(table.items())
+
+
+def calibrate(repeat=5):
+    """Return the best time of the reference workload in ms"""
+    gc.collect()
+    return round(time_call(reference_workload, repeat=repeat) * 1000, 3)
+
+
+def peak_memory_kb(func, *args):
+    """Return the peak memory in KiB allocated while running func(*args)"""
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def measure(func, *args, repeat=3):
+    # Collections triggered by earlier stages' garbage would land on whichever stage runs next
+    gc.collect()
+    gc.disable()
+    try:
+        seconds = time_call(func, *args, repeat=repeat)
+    finally:
+        gc.enable()
+    return {
+        'ms': round(seconds * 1000, 3),
+        'peak_kb': round(peak_memory_kb(func, *args), 1),
+    }
+
+
+def run_pass(code, technique):
+    return CodeOptimizer().optimize_with_technique(code, technique)
+
+
+def run_pipeline(code):
+    return CodeOptimizer().optimize(code)
+
+
+def benchmark_source(source, repeat=3):
+    """
+    Time and measure every stage on one program.
+
+    Returns:
+        dict: instructions, and per stage name the best time in ms and peak KiB
+    """
+    code = IntermediateCodeGenerator().generate(source)
+    stages = {'generate': measure(IntermediateCodeGenerator().generate, source, repeat=repeat)}
+    for technique in DEFAULT_PIPELINE:
+        stages[technique] = measure(run_pass, code, technique, repeat=repeat)
+    stages['pipeline'] = measure(run_pipeline, code, repeat=repeat)
+    return {'instructions': len(code), 'stages': stages}
+
+
+def scaling_exponents(runs):
+    """
+    Growth exponent of each stage between the smallest and largest run.
+
+    Args:
+        runs (list): benchmark_source results for one shape, smallest first
+
+    Returns:
+        dict: Stage name -> exponent, or None when the stage is too fast to tell
+    """
+    first, last = runs[0], runs[-1]
+    growth = last['instructions'] / first['instructions']
+    exponents = {}
+    for stage, result in last['stages'].items():
+        before = first['stages'][stage]['ms']
+        if growth <= 1 or result['ms'] < MIN_EXPONENT_MS or before <= 0:
+            exponents[stage] = None
+        else:
+            exponents[stage] = round(math.log(result['ms'] / before) / math.log(growth), 2)
+    return exponents
+
+
+def run_suite(shapes, sizes, repeat=3):
+    """
+    Benchmark every shape at every size.
+
+    Returns:
+        dict: JSON-serializable results, the format of a baseline file
+    """
+    # The first measurements of a fresh process are slow (allocator and cache warm-up)
+    calibration = calibrate()
+    for shape in shapes:
+        benchmark_source(SHAPES[shape](min(sizes)), repeat=1)
+
+    results = {}
+    for shape in shapes:
+        runs = []
+        for size in sorted(sizes):
+            run = benchmark_source(SHAPES[shape](size), repeat=repeat)
+            run['size'] = size
+            runs.append(run)
+        results[shape] = {'runs': runs, 'exponents': scaling_exponents(runs)}
+    return {
+        'version': BASELINE_VERSION,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'repeat': repeat,
+        # Averaged over the start and end of the run, in case the machine's load changed
+        'calibration_ms': round((calibration + calibrate()) / 2, 3),
+        'results': results,
+    }
+
+
+def compare(current, baseline, threshold, exponent_margin):
+    """
+    Find stages that regressed against a baseline.
+
+    Only shapes, sizes and stages present in both are compared. Baseline
+    times are scaled by how much slower or faster the reference workload
+    ran, so a busier machine does not look like a regression.
+
+    Returns:
+        list: One message per regression
+    """
+    speed = current['calibration_ms'] / baseline['calibration_ms']
+    regressions = []
+    for shape, result in current['results'].items():
+        base = baseline['results'].get(shape)
+        if base is None:
+            continue
+        base_runs = {run['size']: run for run in base['runs']}
+        for run in result['runs']:
+            base_run = base_runs.get(run['size'])
+            if base_run is None:
+                continue
+            for stage, now in run['stages'].items():
+                then = base_run['stages'].get(stage)
+                if then is None:
+                    continue
+                where = f"{shape} size {run['size']} {stage}"
+                expected = then['ms'] * speed
+                if now['ms'] > expected * threshold and now['ms'] - expected > MIN_TIME_DELTA_MS:
+                    regressions.append(
+                        f"{where}: {expected:.1f} ms (calibrated) -> {now['ms']:.1f} ms")
+                if (now['peak_kb'] > then['peak_kb'] * threshold
+                        and now['peak_kb'] - then['peak_kb'] > MIN_MEMORY_DELTA_KB):
+                    regressions.append(
+                        f"{where}: peak {then['peak_kb']:.0f} KiB -> {now['peak_kb']:.0f} KiB")
+        for stage, exponent in result['exponents'].items():
+            base_exponent = base['exponents'].get(stage)
+            if exponent is not None and base_exponent is not None:
+                if exponent > base_exponent + exponent_margin:
+                    regressions.append(
+                        f"{shape} {stage}: scaling exponent {base_exponent} -> {exponent}")
+    return regressions
+
+
+def print_results(results):
+    for shape, result in results['results'].items():
+        print(f"\n{shape}")
+        runs = result['runs']
+        stages = list(runs[0]['stages'])
+        headers = ["stage"]
+        for run in runs:
+            headers += [f"{run['instructions']} ins ms", "peak KiB"]
+        headers.append("exponent")
+        rows = []
+        for stage in stages:
+            row = [stage]
+            for run in runs:
+                row += [f"{run['stages'][stage]['ms']:.2f}", f"{run['stages'][stage]['peak_kb']:.0f}"]
+            exponent = result['exponents'][stage]
+            row.append("-" if exponent is None else f"{exponent:.2f}")
+            rows.append(row)
+        print_table(headers, rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--shapes', nargs='+', choices=list(SHAPES), default=list(SHAPES))
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 400],
+                        help="Top-level units per program; the exponent needs two or more")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--save', metavar='FILE', help="Write the results as a new baseline")
+    parser.add_argument('--check', metavar='FILE', help="Compare the results with a baseline")
+    parser.add_argument('--threshold', type=float, default=2.0,
+                        help="Allowed time and peak memory ratio against the baseline")
+    parser.add_argument('--exponent-margin', type=float, default=0.5,
+                        help="Allowed growth of a stage's scaling exponent")
+    args = parser.parse_args(argv)
+
+    # Deeply nested expressions recurse through the generator
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10_000))
+
+    results = run_suite(args.shapes, args.sizes, repeat=args.repeat)
+    print_results(results)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline written to {args.save}")
+
+    if args.check:
+        with open(args.check) as f:
+            baseline = json.load(f)
+        if baseline.get('version') != BASELINE_VERSION:
+            print(f"\n{args.check} was written by another version of the suite; save a new baseline")
+            return 1
+        regressions = compare(results, baseline, args.threshold, args.exponent_margin)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.check}:")
+            for message in regressions:
+                print(f"  {message}")
+            return 1
+        print(f"\nNo regressions against {args.check}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,21 @@
-from src.app import app
+import sys
 
 if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'batch':
+        # python main.py batch <files or directories> ...
+        from src.batch import main as batch_main
+        batch_main(sys.argv[2:])
+        sys.exit(0)
+    
+    if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        # python main.py serve [--bind host:port] [--workers N] ...
+        from src.server import main as serve_main
+        serve_main(sys.argv[2:])
+        sys.exit(0)
+    
+    # Imported here so `serve` can configure the app's limits before it loads
+    from src.app import app
+    
     print("Starting Python Intermediate Code Generator...")
     print("Open your web browser and navigate to http://127.0.0.1:5000")
     app.run(debug=True) 
\ No newline at end of file
@@ -1,15 +1,135 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, abort, render_template, request, jsonify, stream_with_context
+import json
 import sys
 import os
+import threading
+import time
 
 # Add the src directory to the path so we can import our modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.parser import generate_intermediate_code
-from src.optimizer import optimize_intermediate_code, CodeOptimizer
+from src.parser import IntermediateCodeGenerator
+from src.optimizer import optimize_intermediate_code, CodeOptimizer, StreamingOptimizer
+from src.parallel import ParallelPassManager
+from src.cache import CompilationCache, cache_key, DEFAULT_MAX_BYTES, DEFAULT_MAX_DISK_ENTRIES
+from src.batch import iter_batch, get_executor
+from src.incremental import IncrementalCompiler
+from src.ir import format_code
+from src.serialize import encode_listings, listing_delta
+from src.lowering import lower_to_assembly
+from src.regalloc import MAX_REGISTERS
+from src.interpreter import run_code
+from src.deadline import compile_deadline, iter_with_deadline, CompileTimeout
+from src.jobs import JobQueue, QueueFull, JobStopped
+from src.metrics import (
+    MetricsRegistry, Histogram, Counter, CallbackMetric, StageTimer, NULL_TIMER,
+    SECONDS_BUCKETS, SIZE_BUCKETS,
+)
 
 app = Flask(__name__)
 
+# Limits that keep one pathological request from pinning a worker: request bodies
+# above MAX_REQUEST_BYTES are rejected with 413, a /generate compilation is aborted
+# after COMPILE_TIMEOUT seconds, and no optimizer pass starts after OPTIMIZATION_BUDGET
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_REQUEST_BYTES', 2 * 1024 * 1024))
+COMPILE_TIMEOUT = float(os.environ.get('COMPILE_TIMEOUT', 10))
+OPTIMIZATION_BUDGET = float(os.environ.get('OPTIMIZATION_BUDGET', 5))
+
+# Background compilations (/jobs) may optimize for longer, since no request waits on them,
+# and fail when they are still running after JOB_TIMEOUT. JOB_WORKERS=0 turns /jobs off.
+JOB_OPTIMIZATION_BUDGET = float(os.environ.get('JOB_OPTIMIZATION_BUDGET', 60))
+JOB_TIMEOUT = float(os.environ.get('JOB_TIMEOUT', 120))
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+
+# Worker processes the functions of large modules are optimized on, see src.parallel.
+# With OPTIMIZER_WORKERS=0 they are optimized in the process serving the request.
+# Every process serving requests has its own pool, so src.server divides the CPUs
+# between its workers. /generate/batch uses the same pool, with at least one process.
+OPTIMIZER_WORKERS = int(os.environ.get('OPTIMIZER_WORKERS', os.cpu_count() or 1))
+
+# Request setting -> optimizer technique -> description shown in the UI, in pipeline order
+OPTIMIZATION_SETTINGS = [
+    ('constantFolding', 'constant_folding', "Constant Folding"),
+    ('constantPropagation', 'constant_propagation', "Constant Propagation"),
+    ('interproceduralConstantPropagation', 'interprocedural_constant_propagation',
+     "Interprocedural Constant Propagation"),
+    ('functionInlining', 'inlining', "Function Inlining"),
+    ('unreachableCodeElimination', 'unreachable_code_elimination', "Unreachable Code Elimination"),
+    ('commonSubexpressionElimination', 'common_subexpression_elimination', "Common Subexpression Elimination"),
+    ('deadCodeElimination', 'dead_code_elimination', "Dead Code Elimination"),
+    ('combineAssignments', 'combine_assignments', "Assignment Combinations"),
+    ('loopOptimization', 'loop_optimization', "Loop Optimization"),
+]
+
+# Values of /generate's `format` query parameter: listings as JSON arrays of lines,
+# the optimized code as edits to the intermediate code, or the src.serialize encoding
+OUTPUT_FORMATS = ('json', 'delta', 'binary')
+BINARY_MIMETYPE = 'application/vnd.icg.ir'
+
+# Compiled responses keyed by source and settings. Set COMPILE_CACHE_PATH to keep them across restarts.
+compile_cache = CompilationCache(
+    max_bytes=int(os.environ.get('COMPILE_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)),
+    disk_path=os.environ.get('COMPILE_CACHE_PATH'),
+    max_disk_entries=int(os.environ.get('COMPILE_CACHE_MAX_DISK_ENTRIES', DEFAULT_MAX_DISK_ENTRIES)),
+)
+
+# Per-statement results reused across edits of the same buffer
+incremental_compiler = IncrementalCompiler()
+
+# Generator and optimizer of each request thread, reset between requests
+_worker_state = threading.local()
+
+# Background compilations submitted to /jobs, None when they are turned off
+job_queue = JobQueue(
+    max_workers=JOB_WORKERS,
+    max_pending=int(os.environ.get('JOB_MAX_PENDING', 64)),
+    ttl=float(os.environ.get('JOB_TTL', 300)),
+    timeout=JOB_TIMEOUT,
+) if JOB_WORKERS > 0 else None
+
+# Metrics of this process, served at /metrics. Each worker of a pre-forked
+# server keeps its own, so scrape them per worker or aggregate downstream.
+metrics = MetricsRegistry()
+STAGE_SECONDS = metrics.register(Histogram(
+    'icg_stage_seconds', "Time spent in each stage of a /generate request",
+    SECONDS_BUCKETS, ('stage',)))
+REQUEST_SECONDS = metrics.register(Histogram(
+    'icg_generate_seconds', "Total time of /generate requests by cache outcome",
+    SECONDS_BUCKETS, ('cache',)))
+SOURCE_SIZE = metrics.register(Histogram(
+    'icg_source_characters', "Length of the source submitted to /generate", SIZE_BUCKETS))
+INSTRUCTION_COUNT = metrics.register(Histogram(
+    'icg_instructions', "Intermediate instructions generated per compiled module", SIZE_BUCKETS))
+REQUESTS = metrics.register(Counter(
+    'icg_generate_requests_total', "/generate requests by cache outcome (HIT, MISS or TIMEOUT)",
+    ('cache',)))
+for stat, metric_type, description in [
+        ('hits', 'counter', "Compilation cache memory hits"),
+        ('disk_hits', 'counter', "Compilation cache disk hits"),
+        ('misses', 'counter', "Compilation cache misses"),
+        ('evictions', 'counter', "Compilation cache evictions"),
+        ('disk_evictions', 'counter', "Compilation cache disk tier evictions"),
+        ('entries', 'gauge', "Entries in the compilation cache memory tier"),
+        ('bytes', 'gauge', "Bytes held by the compilation cache memory tier")]:
+    suffix = '_total' if metric_type == 'counter' else ''
+    metrics.register(CallbackMetric(
+        f'icg_cache_{stat}{suffix}', description, metric_type,
+        lambda stat=stat: compile_cache.stats()[stat]))
+for status in ['queued', 'running'] if job_queue is not None else []:
+    metrics.register(CallbackMetric(
+        f'icg_jobs_{status}', f"Background compilation jobs {status}", 'gauge',
+        lambda status=status: job_queue.stats().get(status, 0)))
+
+class InvalidRequest(ValueError):
+    """Raised for a /generate body with a setting out of range"""
+
+@app.before_request
+def limit_request_size():
+    """Reject oversized bodies before reading them; Werkzeug only enforces the limit for form data"""
+    limit = app.config['MAX_CONTENT_LENGTH']
+    if limit is not None and request.content_length is not None and request.content_length > limit:
+        abort(413)
+
 @app.route('/')
 def index():
     """Render the main page"""
@@ -17,58 +137,446 @@ def index():
 
 @app.route('/generate', methods=['POST'])
 def generate():
-    """Generate intermediate code from the submitted Python code"""
+    """
+    Generate intermediate code from the submitted Python code.
+    
+    With `?profile=1` the response also has `stage_timings`, the
+    milliseconds spent in each stage of this request. (The `profile` field
+    of the body is different: it executes the code, see add_execution_profile.)
+    
+    `?format=delta` replaces `optimized_code` with `optimized_delta`, the
+    edits that turn `intermediate_code` into it, and `?format=binary`
+    answers with both listings in the src.serialize encoding, the rest of
+    the payload being stored as its JSON metadata.
+    
+    With `"registers": N` in the body the final code is also register
+    allocated for N registers and lowered, see add_target_code.
+    """
+    start = time.perf_counter()
+    timer = StageTimer()
+    output = request.args.get('format', 'json')
+    if output not in OUTPUT_FORMATS:
+        return jsonify({'error': f"unknown format {output!r}, expected one of {', '.join(OUTPUT_FORMATS)}"}), 400
+    try:
+        python_code, optimize, incremental, profile, pipeline, optimizations_applied, registers = \
+            read_generate_request(request.get_json())
+    except InvalidRequest as e:
+        return jsonify({'error': str(e)}), 400
+    SOURCE_SIZE.observe(len(python_code))
+    
+    # Identical requests are served from the cache without recompiling
+    key = cache_key(python_code, optimize, pipeline, incremental, profile, output, registers)
+    with timer.stage('cache_lookup'):
+        body = compile_cache.get(key)
+    if body is not None:
+        return finish_generate(body, 'HIT', timer, start, output)
+    
+    try:
+        with compile_deadline(COMPILE_TIMEOUT):
+            if incremental:
+                result = compile_incremental(python_code, optimize, pipeline, optimizations_applied,
+                                             profile, timer, output, registers)
+            else:
+                result = compile_source(python_code, optimize, pipeline, optimizations_applied,
+                                        profile, timer, output=output, registers=registers)
+    except CompileTimeout as e:
+        record_request('TIMEOUT', timer, start)
+        return jsonify({'error': str(e)}), 503
+    # Read before serializing, which takes the listings out of a binary result
+    budget_exhausted = result.get('optimization_stats', {}).get('budget_exhausted')
+    with timer.stage('serialize'):
+        body = serialize_result(result, output)
+    # A result cut short by the optimization budget depends on load, so it is not cached
+    if not budget_exhausted:
+        compile_cache.put(key, body)
+    return finish_generate(body, 'MISS', timer, start, output)
+
+def read_generate_request(data):
+    """
+    Return (code, optimize, incremental, profile, pipeline, optimizations_applied, registers)
+    from a /generate body, raising InvalidRequest for a register count out of range.
+    """
+    pipeline, optimizations_applied = build_pipeline(data.get('optimizationSettings', {}))
+    registers = data.get('registers')
+    if registers is not None and (type(registers) is not int or not 1 <= registers <= MAX_REGISTERS):
+        raise InvalidRequest(f"registers must be an integer from 1 to {MAX_REGISTERS}")
+    return (data.get('code', ''), data.get('optimize', False), data.get('incremental', False),
+            data.get('profile', False), pipeline, optimizations_applied, registers)
+
+def finish_generate(body, cache_status, timer, start, output='json'):
+    """Record the request's metrics and build its response, with stage timings if asked"""
+    record_request(cache_status, timer, start)
+    if output == 'binary':
+        response = Response(body, mimetype=BINARY_MIMETYPE)
+        response.headers['X-Cache'] = cache_status
+        return response
+    if request.args.get('profile') == '1':
+        result = json.loads(body)
+        result['stage_timings'] = timer.as_dict()
+        body = json.dumps(result).encode('utf-8')
+    return json_response(body, cache_status=cache_status)
+
+def record_request(cache_status, timer, start):
+    for stage, seconds in timer.stages.items():
+        STAGE_SECONDS.observe(seconds, stage)
+    REQUEST_SECONDS.observe(time.perf_counter() - start, cache_status)
+    REQUESTS.inc(cache_status)
+
+@app.route('/generate/stream', methods=['POST'])
+def generate_stream():
+    """
+    Stream intermediate code as NDJSON, one line per top-level statement.
+    
+    Each line carries that statement's intermediate code and, when
+    optimization is requested, its code after the streaming passes
+    (comment removal, constant propagation and folding). A stream that
+    takes more than COMPILE_TIMEOUT seconds to compile ends with an
+    `error` line.
+    """
     data = request.get_json()
     python_code = data.get('code', '')
+    optimize = data.get('optimize', False)
+    pipeline, _ = build_pipeline(data.get('optimizationSettings', {}))
+    
+    def records():
+        streaming = StreamingOptimizer(pipeline) if optimize else None
+        for chunk in IntermediateCodeGenerator().generate_chunks(python_code):
+            record = {'intermediate_code': format_code(chunk)}
+            if streaming is not None:
+                record['optimized_code'] = format_code(streaming.feed(chunk))
+            yield record
+    
+    return Response(stream_with_context(stream_ndjson(records())), mimetype='application/x-ndjson')
+
+@app.route('/generate/batch', methods=['POST'])
+def generate_batch():
+    """
+    Compile many files on the worker pool, streaming one NDJSON line per file.
+    
+    Each file is optimized for at most OPTIMIZATION_BUDGET seconds, and
+    the stream ends with an `error` line once the batch has taken more
+    than COMPILE_TIMEOUT seconds.
+    """
+    data = request.get_json()
+    files = data.get('files', [])
+    optimize = data.get('optimize', True)
+    pipeline, _ = build_pipeline(data.get('optimizationSettings', {}))
+    if not isinstance(files, list) or not all(isinstance(f, dict) for f in files):
+        return jsonify({'error': "files must be a list of objects"}), 400
+    items = [(str(f.get('name', f"file{i}")), f.get('code', '')) for i, f in enumerate(files)]
+    # A missing source must not make the server open `name` (see compile_chunk)
+    if not all(isinstance(code, str) for _, code in items):
+        return jsonify({'error': "code of every file must be a string"}), 400
+    
+    results = iter_batch(items, optimize, pipeline, get_executor(max(OPTIMIZER_WORKERS, 1)),
+                         workers=max(OPTIMIZER_WORKERS, 1), time_budget=OPTIMIZATION_BUDGET)
+    return Response(stream_with_context(stream_ndjson(results)), mimetype='application/x-ndjson')
+
+def stream_ndjson(records):
+    """Serialize records as NDJSON lines, ending with an error line if they take past COMPILE_TIMEOUT"""
+    try:
+        for record in iter_with_deadline(records, COMPILE_TIMEOUT):
+            yield json.dumps(record) + '\n'
+    except CompileTimeout as e:
+        yield json.dumps({'error': str(e)}) + '\n'
+    finally:
+        records.close()
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    Compile in the background so no request waits on a large program.
+    
+    Takes the same body as /generate and answers 202 with the job's
+    status; poll GET /jobs/<job_id> until it is done, failed or cancelled.
+    Answers 429 when too many jobs are already pending, and 503 when
+    background jobs are turned off.
+    """
+    if job_queue is None:
+        return jobs_disabled()
+    try:
+        python_code, optimize, incremental, profile, pipeline, optimizations_applied, registers = \
+            read_generate_request(request.get_json())
+    except InvalidRequest as e:
+        return jsonify({'error': str(e)}), 400
+    SOURCE_SIZE.observe(len(python_code))
+    
+    key = cache_key(python_code, optimize, pipeline, incremental, profile, registers=registers)
+    body = compile_cache.get(key)
+    if body is not None:
+        job = job_queue.complete(json.loads(body))
+    else:
+        try:
+            job = job_queue.submit(compile_job, key, python_code, optimize, pipeline,
+                                   optimizations_applied, incremental, profile, registers)
+        except QueueFull as e:
+            return jsonify({'error': str(e)}), 429
+    return jsonify(job.as_dict()), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def poll_job(job_id):
+    """
+    Report a job's status: its stage and partial results while it runs,
+    the /generate payload once it is done. Finished jobs expire after JOB_TTL.
+    """
+    if job_queue is None:
+        return jobs_disabled()
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': f"unknown or expired job {job_id}"}), 404
+    return jsonify(job.as_dict())
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel a job; a running one stops before its next optimizer pass"""
+    if job_queue is None:
+        return jobs_disabled()
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return jsonify({'error': f"unknown or expired job {job_id}"}), 404
+    return jsonify(job.as_dict())
+
+def jobs_disabled():
+    return jsonify({'error': "background jobs are turned off on this server"}), 503
+
+@app.route('/cache/stats')
+def cache_stats():
+    """Report compilation cache counters"""
+    return jsonify(compile_cache.stats())
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Expose stage latency histograms, sizes and cache counters in the Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+def build_pipeline(opt_settings):
+    """Turn the request's optimization settings into pass names and descriptions"""
+    pipeline = []
+    optimizations_applied = []
+    for setting, technique, description in OPTIMIZATION_SETTINGS:
+        if opt_settings.get(setting, True):
+            pipeline.append(technique)
+            optimizations_applied.append(description)
+    return pipeline, optimizations_applied
+
+def worker_compiler():
+    """
+    Return this thread's generator and optimizer, ready for a new program.
+    
+    They are created on first use and reused by every later request the
+    thread serves, so a warmed-up worker does not rebuild them.
+    """
+    state = _worker_state
+    if not hasattr(state, 'generator'):
+        state.generator = IntermediateCodeGenerator()
+        state.optimizer = CodeOptimizer()
+    state.optimizer.reset()
+    return state.generator, state.optimizer
+
+def compile_job(job, key, python_code, optimize, pipeline, optimizations_applied, incremental, profile,
+                registers=None):
+    """Body of a /jobs compilation: the /generate payload, also stored in the cache"""
+    if incremental:
+        job.update('compiling')
+        result = compile_incremental(python_code, optimize, pipeline, optimizations_applied, profile,
+                                     registers=registers)
+    else:
+        result = compile_source(python_code, optimize, pipeline, optimizations_applied, profile,
+                                job=job, registers=registers)
+    if job.stopped:
+        raise JobStopped(job.id)
+    if not result.get('optimization_stats', {}).get('budget_exhausted'):
+        compile_cache.put(key, json.dumps(result).encode('utf-8'))
+    return result
+
+def compile_source(python_code, optimize, pipeline, optimizations_applied, profile=False,
+                   timer=NULL_TIMER, job=None, output='json', registers=None):
+    """
+    Generate (and optionally optimize) intermediate code, returning the response payload.
+    
+    The listings are laid out for the `output` format, see add_listings.
+    When run for a background `job`, its stage and partial results are
+    updated as the compilation goes, and cancelling it or running past its
+    deadline stops the optimizer.
+    """
+    generator, optimizer = worker_compiler()
     
     # Generate intermediate code
-    intermediate_code = generate_intermediate_code(python_code)
+    if job is not None:
+        job.update('generating')
+    intermediate_code = generator.generate(python_code, timer)
+    INSTRUCTION_COUNT.observe(len(intermediate_code))
     
     # Optimize the code if requested
-    optimize = data.get('optimize', False)
     if optimize:
-        # Get optimization settings
-        opt_settings = data.get('optimizationSettings', {})
-        
-        # Create a CustomOptimizer with specific settings
-        optimizer = CodeOptimizer()
-        
-        # Track which optimizations were applied
-        optimizations_applied = []
-        
-        # Create a copy of the intermediate code
-        optimized_code = intermediate_code.copy()
-        
-        # Apply selected optimizations
-        if opt_settings.get('constantFolding', True):
-            optimized_code = optimizer.optimize_with_technique(optimized_code, 'constant_folding')
-            optimizations_applied.append("Constant Folding")
-            
-        if opt_settings.get('constantPropagation', True):
-            optimized_code = optimizer.optimize_with_technique(optimized_code, 'constant_propagation')
-            optimizations_applied.append("Constant Propagation")
-            
-        if opt_settings.get('deadCodeElimination', True):
-            optimized_code = optimizer.optimize_with_technique(optimized_code, 'dead_code_elimination')
-            optimizations_applied.append("Dead Code Elimination")
-            
-        if opt_settings.get('combineAssignments', True):
-            optimized_code = optimizer.optimize_with_technique(optimized_code, 'combine_assignments')
-            optimizations_applied.append("Assignment Combinations")
+        # Run the selected passes to a fixed point, or until the time budget runs out;
+        # large modules are optimized a function at a time on the worker pool
+        executor = get_executor(OPTIMIZER_WORKERS) if OPTIMIZER_WORKERS else None
+        if job is None:
+            manager = ParallelPassManager(pipeline, optimizer, executor, OPTIMIZER_WORKERS,
+                                          time_budget=OPTIMIZATION_BUDGET)
+        else:
+            manager = ParallelPassManager(pipeline, optimizer, executor, OPTIMIZER_WORKERS,
+                                          time_budget=JOB_OPTIMIZATION_BUDGET,
+                                          should_stop=lambda: job.stopped)
+            job.update('optimizing', partial={'intermediate_code': format_code(intermediate_code)},
+                       progress=manager.report)
+        optimized_code = manager.run(intermediate_code)
+        for technique, stats in manager.stats.items():
+            if stats.runs:
+                timer.add(f"pass:{technique}", stats.seconds)
 
         # Calculate optimization stats
         optimization_stats = calculate_optimization_stats(intermediate_code, optimized_code)
+        optimization_stats['passes'] = manager.report()
+        optimization_stats['iterations'] = manager.iterations
+        optimization_stats['optimization_time_ms'] = round(manager.total_seconds() * 1000, 3)
+        optimization_stats['budget_exhausted'] = manager.budget_exhausted
+        
+        # Text is only produced here, at the edge of the pipeline
+        with timer.stage('format'):
+            result = add_listings({}, output, intermediate_code, optimized_code)
+            result['optimizations_applied'] = optimizations_applied
+            result['optimization_stats'] = optimization_stats
+        if registers:
+            if job is not None:
+                job.update('lowering')
+            add_target_code(result, optimized_code, registers, timer)
+        if profile:
+            if job is not None:
+                job.update('executing')
+            with timer.stage('execute'):
+                add_execution_profile(result, intermediate_code, optimized_code)
+        return result
+    
+    with timer.stage('format'):
+        result = add_listings({}, output, intermediate_code)
+    if registers:
+        if job is not None:
+            job.update('lowering')
+        add_target_code(result, intermediate_code, registers, timer)
+    if profile:
+        if job is not None:
+            job.update('executing')
+        with timer.stage('execute'):
+            add_execution_profile(result, intermediate_code)
+    return result
+
+def compile_incremental(python_code, optimize, pipeline, optimizations_applied, profile=False,
+                        timer=NULL_TIMER, output='json', registers=None):
+    """Compile statement by statement, reusing units unchanged since an earlier request"""
+    compiled = incremental_compiler.compile(python_code, optimize, pipeline, timer, OPTIMIZATION_BUDGET)
+    INSTRUCTION_COUNT.observe(len(compiled['intermediate_instructions']))
+    result = add_listings({}, output, compiled['intermediate_instructions'],
+                          compiled.get('optimized_instructions'),
+                          (compiled['intermediate_code'], compiled.get('optimized_code')))
+    
+    if optimize:
+        optimization_stats = calculate_optimization_stats(compiled['intermediate_code'],
+                                                          compiled['optimized_code'])
+        optimization_stats['units'] = compiled['units']
+        optimization_stats['units_compiled'] = compiled['units_compiled']
+        optimization_stats['optimization_time_ms'] = compiled.get('compile_time_ms', 0)
+        optimization_stats['budget_exhausted'] = compiled['budget_exhausted']
+        result['optimizations_applied'] = optimizations_applied
+        result['optimization_stats'] = optimization_stats
+    
+    if registers:
+        add_target_code(result, compiled.get('optimized_instructions',
+                                             compiled['intermediate_instructions']),
+                        registers, timer)
+    
+    if profile:
+        with timer.stage('execute'):
+            add_execution_profile(result, compiled['intermediate_instructions'],
+                                  compiled.get('optimized_instructions'))
+    return result
+
+def add_listings(result, output, intermediate_code, optimized_code=None, lines=None):
+    """
+    Put the listings into a response payload in the requested output format.
+    
+    'json' adds `intermediate_code` and `optimized_code` as lists of lines,
+    'delta' sends `optimized_delta` ([start, end, lines] edits to the
+    intermediate code) instead of the optimized lines, and 'binary' keeps
+    the instructions under `listings` for serialize_result to encode.
+    `lines` is the already formatted (intermediate, optimized) pair, if any.
+    """
+    if output == 'binary':
+        result['listings'] = [intermediate_code]
+        if optimized_code is not None:
+            result['listings'].append(optimized_code)
+        return result
+    
+    if lines is None:
+        lines = (format_code(intermediate_code),
+                 format_code(optimized_code) if optimized_code is not None else None)
+    result['intermediate_code'] = lines[0]
+    if optimized_code is not None:
+        if output == 'delta':
+            result['optimized_delta'] = listing_delta(lines[0], lines[1])
+        else:
+            result['optimized_code'] = lines[1]
+    return result
+
+def serialize_result(result, output):
+    """Encode a response payload as JSON, or as IR listings with JSON metadata for 'binary'"""
+    if output == 'binary':
+        listings = result.pop('listings')
+        return encode_listings(listings, json.dumps(result))
+    return json.dumps(result).encode('utf-8')
+
+def add_target_code(result, code, registers, timer=NULL_TIMER):
+    """
+    Allocate `registers` registers for the final code and lower it to pseudo-assembly.
+    
+    Adds `target_code`, the lowered listing, and `register_allocation`:
+    register pressure, variables spilled and spill loads and stores, in
+    total and per function (see src.regalloc and src.lowering).
+    """
+    with timer.stage('regalloc'):
+        target_code, stats = lower_to_assembly(code, registers)
+    result['target_code'] = target_code
+    result['register_allocation'] = stats
+
+def add_execution_profile(result, intermediate_code, optimized_code=None):
+    """
+    Run the code in the interpreter and add dynamic instruction counts to the response.
+    
+    Static line counts say nothing about loops; executing both versions
+    shows how many instructions the optimizations actually save.
+    """
+    before = run_code(intermediate_code, profile=True)
+    profile = {'intermediate_code': execution_summary(before)}
+    
+    if optimized_code is not None:
+        after = run_code(optimized_code, profile=True)
+        profile['optimized_code'] = execution_summary(after)
+        profile['outputs_match'] = before['output'] == after['output']
         
-        return jsonify({
-            'intermediate_code': intermediate_code,
-            'optimized_code': optimized_code,
-            'optimizations_applied': optimizations_applied,
-            'optimization_stats': optimization_stats
-        })
-    
-    return jsonify({
-        'intermediate_code': intermediate_code
-    })
+        stats = result['optimization_stats']
+        stats['dynamic_instructions_before'] = before['steps']
+        stats['dynamic_instructions_after'] = after['steps']
+        stats['dynamic_reduction_percentage'] = (
+            round(max(0, before['steps'] - after['steps']) / before['steps'] * 100)
+            if before['steps'] > 0 else 0)
+    
+    result['profile'] = profile
+
+def execution_summary(run):
+    """JSON form of one interpreter run"""
+    summary = run['profile'].as_dict()
+    summary['output'] = run['output']
+    if 'error' in run:
+        summary['error'] = run['error']
+    return summary
+
+def json_response(body, cache_status=None):
+    """Wrap already serialized JSON bytes in a response"""
+    response = Response(body, mimetype='application/json')
+    if cache_status:
+        response.headers['X-Cache'] = cache_status
+    return response
 
 def calculate_optimization_stats(original_code, optimized_code):
     """Calculate statistics about the optimizations applied"""
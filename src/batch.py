@@ -0,0 +1,170 @@
+import argparse
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Allow running as `python src/batch.py` as well as `python -m src.batch`
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.parser import generate_intermediate_code
+from src.optimizer import CodeOptimizer, DEFAULT_PIPELINE
+from src.pass_manager import PassManager
+from src.ir import format_code
+
+# Aim for this many chunks per worker so a few slow files do not leave workers idle
+CHUNKS_PER_WORKER = 4
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def compile_one(name, source_code, optimize=True, pipeline=None, time_budget=None):
+    """
+    Compile one source file into a JSON-serializable result.
+
+    Args:
+        name (str): File name reported back with the result
+        source_code (str): Python source code
+        optimize (bool): Whether to run the optimizer
+        pipeline (list): Technique names, defaults to DEFAULT_PIPELINE
+        time_budget (float): Seconds after which no further optimizer pass is started
+
+    Returns:
+        dict: File name, intermediate code and (optionally) optimized code
+    """
+    intermediate_code = generate_intermediate_code(source_code)
+    result = {
+        'file': name,
+        'intermediate_code': format_code(intermediate_code),
+    }
+    if optimize:
+        manager = PassManager(pipeline or DEFAULT_PIPELINE, CodeOptimizer(), time_budget=time_budget)
+        optimized_code = manager.run(intermediate_code)
+        result['optimized_code'] = format_code(optimized_code)
+        result['lines_before'] = len(intermediate_code)
+        result['lines_after'] = len(optimized_code)
+        result['budget_exhausted'] = manager.budget_exhausted
+    return result
+
+
+def compile_chunk(items, optimize=True, pipeline=None, read_files=False, time_budget=None):
+    """
+    Compile a chunk of (name, source or None) pairs inside a worker process.
+
+    With `read_files`, a source of None means the worker reads the file
+    `name` itself, so only paths cross the process boundary for on-disk
+    inputs. Only the command line sets it: names sent over HTTP must never
+    be opened on the server.
+    """
+    results = []
+    for name, source_code in items:
+        try:
+            if not isinstance(source_code, str):
+                if source_code is not None or not read_files:
+                    raise TypeError("source code must be a string")
+                with open(name, encoding='utf-8') as f:
+                    source_code = f.read()
+            results.append(compile_one(name, source_code, optimize, pipeline, time_budget))
+        except Exception as e:
+            # One bad file must not take the rest of its chunk down with it
+            results.append({'file': name, 'error': f"{type(e).__name__}: {e}"})
+    return results
+
+
+def collect_sources(paths):
+    """Expand files and directories into a sorted list of .py file paths"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs.sort()
+                for file_name in sorted(names):
+                    if file_name.endswith('.py'):
+                        files.append(os.path.join(root, file_name))
+        else:
+            files.append(path)
+    return files
+
+
+def chunked(items, chunk_size):
+    for i in range(0, len(items), chunk_size):
+        yield items[i:i + chunk_size]
+
+
+def default_chunk_size(count, workers):
+    return max(1, count // (workers * CHUNKS_PER_WORKER))
+
+
+def get_executor(workers=None):
+    """Return the shared process pool used by the web endpoint"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=workers)
+        return _executor
+
+
+def iter_batch(items, optimize=True, pipeline=None, executor=None, chunk_size=None, workers=None,
+               read_files=False, time_budget=None):
+    """
+    Compile many sources on a process pool, yielding results as they finish.
+
+    Args:
+        items (list): (name, source) pairs
+        optimize (bool): Whether to run the optimizer
+        pipeline (list): Technique names, defaults to DEFAULT_PIPELINE
+        executor (ProcessPoolExecutor): Pool to use, defaults to the shared pool
+        chunk_size (int): Files per task, defaults to a few chunks per worker
+        workers (int): Pool size used to pick the default chunk size
+        read_files (bool): Read the file `name` for a source of None; only
+            for trusted, local callers such as the command line
+        time_budget (float): Seconds each file may be optimized for
+
+    Yields:
+        dict: One result per file, in completion order
+    """
+    if not items:
+        return
+    executor = executor or get_executor()
+    chunk_size = chunk_size or default_chunk_size(len(items), workers or os.cpu_count() or 1)
+
+    futures = [executor.submit(compile_chunk, chunk, optimize, pipeline, read_files, time_budget)
+               for chunk in chunked(items, chunk_size)]
+    try:
+        for future in as_completed(futures):
+            yield from future.result()
+    finally:
+        # A consumer that stops early (e.g. on a timeout) leaves no queued chunks behind
+        for future in futures:
+            future.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compile Python files to intermediate code and print NDJSON results")
+    parser.add_argument('paths', nargs='+', help="Python files or directories to compile")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="Worker processes (default: number of CPUs)")
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help="Files per task (default: a few chunks per worker)")
+    parser.add_argument('--no-optimize', action='store_true', help="Skip the optimizer")
+    parser.add_argument('--passes', nargs='+', default=None, metavar='PASS',
+                        help="Optimizer techniques to run, in order")
+    parser.add_argument('--optimization-budget', type=float, default=None, metavar='SECONDS',
+                        help="Start no optimizer pass on a file after this many seconds (default: no limit)")
+    args = parser.parse_args(argv)
+
+    items = [(path, None) for path in collect_sources(args.paths)]
+    out = sys.stdout
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for result in iter_batch(items, not args.no_optimize, args.passes or DEFAULT_PIPELINE,
+                                 executor, args.chunk_size, args.workers, read_files=True,
+                                 time_budget=args.optimization_budget):
+            out.write(json.dumps(result) + '\n')
+            out.flush()
+
+
+if __name__ == '__main__':
+    main()
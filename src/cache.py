@@ -0,0 +1,164 @@
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# Bump when generator or optimizer output changes so stale disk entries are ignored
+CACHE_VERSION = 18
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_DISK_ENTRIES = 10_000
+
+
+def cache_key(source_code, optimize, pipeline, incremental=False, profile=False, output='json',
+              registers=None):
+    """
+    Build a content-addressed key for one compilation request.
+
+    Args:
+        source_code (str): Python source code
+        optimize (bool): Whether optimization was requested
+        pipeline (list): Technique names that will run, in order
+        incremental (bool): Whether the module is compiled unit by unit
+        profile (bool): Whether the code is also executed and profiled
+        output (str): Response format, 'json', 'delta' or 'binary'
+        registers (int): Registers to allocate for the target code, or None
+
+    Returns:
+        str: Hex digest identifying the request
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([CACHE_VERSION, bool(optimize), list(pipeline), bool(incremental),
+                               bool(profile), output, registers]).encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(source_code.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class CompilationCache:
+    """
+    Two-tier cache of serialized /generate responses.
+
+    The memory tier is an LRU bounded by the total size of the stored
+    values in bytes. The optional disk tier is a sqlite file that survives
+    restarts; entries found there are promoted back into memory. It keeps
+    the `max_disk_entries` most recently written entries: every write
+    deletes the rows beyond them, oldest rowid first, so the file stays
+    bounded even when workers of a pre-forked server share it. All
+    operations take a lock so the cache can be shared between request
+    threads.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, disk_path=None,
+                 max_disk_entries=DEFAULT_MAX_DISK_ENTRIES):
+        self.max_bytes = max_bytes
+        self.disk_path = disk_path
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._db = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+        if disk_path:
+            self._db = self._connect()
+
+    def _connect(self):
+        db = sqlite3.connect(self.disk_path, check_same_thread=False)
+        db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL)")
+        db.commit()
+        return db
+
+    def reconnect(self):
+        """
+        Open a fresh disk connection in a forked worker.
+
+        A sqlite connection must not be used on both sides of a fork, so
+        pre-forking servers call this in every worker after it starts.
+        """
+        self._lock = threading.Lock()
+        if self.disk_path:
+            self._db = self._connect()
+
+    def get(self, key):
+        """Return the cached bytes for `key`, or None"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    value = bytes(row[0])
+                    self._store(key, value)
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        """Store serialized bytes under `key` in both tiers"""
+        with self._lock:
+            self._store(key, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO entries (key, value) VALUES (?, ?)", (key, value))
+                # A replaced key gets a new rowid, so rowid order is write order
+                evicted = self._db.execute(
+                    "DELETE FROM entries WHERE rowid IN "
+                    "(SELECT rowid FROM entries ORDER BY rowid DESC LIMIT -1 OFFSET ?)",
+                    (self.max_disk_entries,)).rowcount
+                self.disk_evictions += max(evicted, 0)
+                self._db.commit()
+
+    def clear(self):
+        """Drop every entry from both tiers"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM entries")
+                self._db.commit()
+
+    def stats(self):
+        """Return hit/miss/eviction counters and current memory usage"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'disk_evictions': self.disk_evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'disk': self.disk_path is not None,
+            }
+
+    def _store(self, key, value):
+        """Insert into the memory tier and evict least recently used entries"""
+        size = len(value)
+        if size > self.max_bytes:
+            return
+
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old)
+
+        self._entries[key] = value
+        self._bytes += size
+
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.evictions += 1
@@ -0,0 +1,211 @@
+from src.liveness import block_defs, OUTPUT_VARS
+from src.ir import FUNCTION, END_FUNCTION, PARAMS, CALL, LABEL, GOTO, IF_FALSE
+
+
+class FunctionInfo:
+    """
+    A function every direct call to its name is known to reach.
+
+    `start` and `end` are the positions of its `function` and
+    `end function` instructions; the body runs from `body_start` to `end`.
+    """
+    __slots__ = ('name', 'start', 'end', 'params', 'body_start', 'callees', 'unconditional')
+
+    def __init__(self, name, start, end, params, body_start):
+        self.name = name
+        self.start = start
+        self.end = end
+        self.params = params
+        self.body_start = body_start
+        # Names of the known functions its body calls directly
+        self.callees = []
+        # Whether no module-level jump skips the definition
+        self.unconditional = True
+
+    def __repr__(self):
+        return f"FunctionInfo({self.name!r}, {self.start}, {self.end})"
+
+
+class CallSite:
+    """A `call` instruction whose target is a known function"""
+    __slots__ = ('position', 'region', 'callee')
+
+    def __init__(self, position, region, callee):
+        self.position = position
+        # Position of the `function` instruction of the enclosing body, None for module code
+        self.region = region
+        self.callee = callee
+
+    def __repr__(self):
+        return f"CallSite({self.position}, {self.region}, {self.callee!r})"
+
+
+class CallGraph:
+    """
+    Direct calls between the functions of a listing.
+
+    A function is known when it is defined exactly once, at module level,
+    has no nested definitions and its name is never assigned or used as a
+    parameter anywhere: then `call f(...)` can only ever run that body, or
+    fail because the definition has not run yet. Calls through any other
+    name are left out of the graph.
+
+    `escaping` holds the known functions that may be called from outside
+    the graph: their name is read as a value, is one of the module's
+    output variables or is read by code after the listing
+    (`live_on_exit`). `recursive` holds the functions that can reach
+    themselves through direct calls, and `order` lists the known functions
+    callees first, so each one comes after everything it calls unless they
+    are mutually recursive.
+    """
+
+    def __init__(self, code, live_on_exit=()):
+        self.code = code
+        self.functions = {}
+        self.sites = []
+        # Position of the `function` instruction enclosing each instruction, None for module code
+        self.owners = []
+        self.escaping = set()
+        self.recursive = set()
+        self.order = []
+        self._build(live_on_exit)
+
+    def region_name(self, region):
+        """Return the known function a region belongs to, None for module code or other bodies"""
+        if region is None:
+            return None
+        function = self.functions.get(self.code[region].arg1)
+        if function is not None and function.start == region:
+            return function.name
+        return None
+
+    def _build(self, live_on_exit):
+        code = self.code
+        definitions = {}
+        candidates = []
+        bound = set()
+        read = set()
+        labels = {}
+        open_functions = []
+        nested = set()
+
+        for i, ins in enumerate(code):
+            op = ins.op
+            if op == FUNCTION:
+                if open_functions:
+                    nested.add(open_functions[-1])
+                else:
+                    candidates.append(i)
+                definitions[ins.arg1] = definitions.get(ins.arg1, 0) + 1
+                open_functions.append(i)
+            self.owners.append(open_functions[-1] if open_functions else None)
+            if op == END_FUNCTION and open_functions:
+                start = open_functions.pop()
+                if not open_functions and start not in nested:
+                    name = code[start].arg1
+                    body_start = start + 2 if code[start + 1].op == PARAMS else start + 1
+                    params = code[start + 1].arg1 if body_start == start + 2 else ()
+                    self.functions[name] = FunctionInfo(name, start, i, params, body_start)
+            elif op == LABEL:
+                labels[ins.arg1] = i
+            bound.update(block_defs(ins))
+            read.update(ins.uses())
+
+        for name in list(self.functions):
+            if definitions[name] != 1 or name in bound:
+                del self.functions[name]
+        functions = self.functions
+
+        self._mark_conditional(labels)
+        self.escaping = {name for name in functions
+                         if name in read or name in OUTPUT_VARS or name in live_on_exit}
+
+        for i, ins in enumerate(code):
+            if ins.op == CALL and ins.arg1 in functions:
+                region = self.owners[i]
+                self.sites.append(CallSite(i, region, ins.arg1))
+                caller = self.region_name(region)
+                if caller is not None and ins.arg1 not in functions[caller].callees:
+                    functions[caller].callees.append(ins.arg1)
+
+        self._find_recursion()
+
+    def _mark_conditional(self, labels):
+        """Flag definitions that some module-level jump from before them lands after"""
+        starts = sorted((function.start, function) for function in self.functions.values())
+        if not starts:
+            return
+        reach = -1
+        k = 0
+        for i, ins in enumerate(self.code):
+            while k < len(starts) and starts[k][0] == i:
+                starts[k][1].unconditional = reach <= i
+                k += 1
+            if k == len(starts):
+                break
+            if self.owners[i] is not None:
+                continue
+            if ins.op == GOTO:
+                target = labels.get(ins.arg1, -1)
+            elif ins.op == IF_FALSE:
+                target = labels.get(ins.arg2, -1)
+            else:
+                continue
+            if target > reach:
+                reach = target
+
+    def _find_recursion(self):
+        """Tarjan's strongly connected components; emits them callees first"""
+        functions = self.functions
+        index = {}
+        lowlink = {}
+        stack = []
+        on_stack = set()
+
+        for root in functions:
+            if root in index:
+                continue
+            work = [(root, 0)]
+            while work:
+                node, k = work.pop()
+                if k == 0:
+                    index[node] = lowlink[node] = len(index)
+                    stack.append(node)
+                    on_stack.add(node)
+                callees = functions[node].callees
+                if k < len(callees):
+                    work.append((node, k + 1))
+                    callee = callees[k]
+                    if callee not in index:
+                        work.append((callee, 0))
+                    elif callee in on_stack:
+                        lowlink[node] = min(lowlink[node], index[callee])
+                    continue
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    if len(component) > 1 or node in functions[node].callees:
+                        self.recursive.update(component)
+                    self.order.extend(component)
+
+
+def build_call_graph(code, live_on_exit=()):
+    """
+    Find the known functions of a listing and the direct calls between them.
+
+    Args:
+        code (list): List of Instruction objects
+        live_on_exit (iterable): Names read after the end of `code`
+
+    Returns:
+        CallGraph: Known functions, call sites, recursion and a callees-first order
+    """
+    return CallGraph(code, live_on_exit)
@@ -0,0 +1,329 @@
+from src.ir import (
+    LABEL, GOTO, IF_FALSE, RETURN, FUNCTION, END_FUNCTION,
+)
+
+# Instructions that end a basic block
+TERMINATOR_OPS = frozenset([GOTO, IF_FALSE, RETURN, END_FUNCTION])
+
+
+class BasicBlock:
+    """A maximal run of instructions entered only at the top and left only at the bottom"""
+    __slots__ = ('index', 'instructions', 'successors', 'predecessors', 'function')
+
+    def __init__(self, index, instructions, function=None):
+        self.index = index
+        self.instructions = instructions
+        self.successors = []
+        self.predecessors = []
+        self.function = function
+
+    @property
+    def label(self):
+        """Return the label that starts this block, if any"""
+        if self.instructions and self.instructions[0].op == LABEL:
+            return self.instructions[0].arg1
+        return None
+
+    @property
+    def terminator(self):
+        """Return the last instruction of the block"""
+        return self.instructions[-1] if self.instructions else None
+
+    def __repr__(self):
+        return f"BasicBlock({self.index}, {len(self.instructions)} instructions, succ={self.successors})"
+
+
+class ControlFlowGraph:
+    """
+    Basic blocks of an instruction listing with successor/predecessor edges.
+
+    Blocks are kept in listing order so the program can be rebuilt with
+    to_code(). Module-level code and every function body are separate
+    regions: the module entry falls through past a function definition to
+    the block after its `end function`, and the `end function` block is the
+    single exit of its function that every `return` jumps to.
+    """
+
+    def __init__(self, blocks, entries):
+        self.blocks = blocks
+        self.entries = entries
+        self._idom = None
+        self._preorder = None
+        self._postorder = None
+
+    def __iter__(self):
+        return iter(self.blocks)
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def to_code(self):
+        """Flatten the blocks back into an instruction list"""
+        code = []
+        for block in self.blocks:
+            code.extend(block.instructions)
+        return code
+
+    def reverse_postorder(self, entry):
+        """Return the blocks reachable from `entry` in reverse postorder"""
+        blocks = self.blocks
+        visited = {entry}
+        order = []
+        stack = [(entry, iter(blocks[entry].successors))]
+
+        while stack:
+            node, successors = stack[-1]
+            for succ in successors:
+                if succ not in visited:
+                    visited.add(succ)
+                    stack.append((succ, iter(blocks[succ].successors)))
+                    break
+            else:
+                stack.pop()
+                order.append(node)
+
+        order.reverse()
+        return order
+
+    def reachable(self):
+        """Return the set of block indices reachable from any entry"""
+        seen = set()
+        for entry in self.entries:
+            stack = [entry]
+            seen.add(entry)
+            while stack:
+                node = stack.pop()
+                for succ in self.blocks[node].successors:
+                    if succ not in seen:
+                        seen.add(succ)
+                        stack.append(succ)
+        return seen
+
+    def remove_unreachable(self):
+        """
+        Drop every block that cannot be reached from an entry.
+
+        Function exit blocks are always kept so `function`/`end function`
+        stay balanced. Returns the number of instructions removed.
+        """
+        live = self.reachable()
+        kept = []
+        removed = 0
+
+        for block in self.blocks:
+            if block.index in live or _is_function_exit(block):
+                kept.append(block)
+            else:
+                removed += len(block.instructions)
+
+        if removed:
+            self._renumber(kept)
+        return removed
+
+    def dominators(self):
+        """
+        Return the immediate dominator of every reachable block.
+
+        Uses the iterative algorithm of Cooper, Harvey and Kennedy over
+        reverse postorder, run separately from each entry. Entries map to
+        themselves.
+        """
+        if self._idom is not None:
+            return self._idom
+
+        idom = {}
+        blocks = self.blocks
+        for entry in self.entries:
+            order = self.reverse_postorder(entry)
+            position = {node: i for i, node in enumerate(order)}
+            idom[entry] = entry
+
+            changed = True
+            while changed:
+                changed = False
+                for node in order[1:]:
+                    new_idom = None
+                    for pred in blocks[node].predecessors:
+                        if pred not in idom or pred not in position:
+                            continue
+                        if new_idom is None:
+                            new_idom = pred
+                        else:
+                            new_idom = _intersect(idom, position, pred, new_idom)
+                    if new_idom is not None and idom.get(node) != new_idom:
+                        idom[node] = new_idom
+                        changed = True
+
+        self._idom = idom
+        return idom
+
+    def dominates(self, a, b):
+        """Check whether block `a` dominates block `b`, in constant time"""
+        if self._preorder is None:
+            self._number_dominator_tree()
+        pre = self._preorder
+        if pre[a] < 0 or pre[b] < 0:
+            return False
+        return pre[a] <= pre[b] and self._postorder[b] <= self._postorder[a]
+
+    def _number_dominator_tree(self):
+        """
+        Number the dominator tree in preorder and postorder.
+
+        `a` dominates `b` exactly when b's subtree numbers fall inside a's,
+        so dominates() does not have to walk idom chains. Unreachable
+        blocks are numbered -1.
+        """
+        idom = self.dominators()
+        count = len(self.blocks)
+        children = [[] for _ in range(count)]
+        for node, parent in idom.items():
+            if node != parent:
+                children[parent].append(node)
+        pre = [-1] * count
+        post = [-1] * count
+        counter = 0
+        for entry in self.entries:
+            if pre[entry] >= 0:
+                continue
+            pre[entry] = counter
+            counter += 1
+            stack = [(entry, iter(children[entry]))]
+            while stack:
+                node, rest = stack[-1]
+                child = next(rest, None)
+                if child is None:
+                    stack.pop()
+                    post[node] = counter
+                    counter += 1
+                else:
+                    pre[child] = counter
+                    counter += 1
+                    stack.append((child, iter(children[child])))
+        self._preorder = pre
+        self._postorder = post
+
+    def _renumber(self, blocks):
+        """Rebuild indices and edges after blocks were removed"""
+        mapping = {block.index: i for i, block in enumerate(blocks)}
+        for i, block in enumerate(blocks):
+            block.index = i
+            block.successors = [mapping[s] for s in block.successors if s in mapping]
+            block.predecessors = [mapping[p] for p in block.predecessors if p in mapping]
+        self.blocks = blocks
+        self.entries = [mapping[e] for e in self.entries if e in mapping]
+        self._idom = None
+        self._preorder = None
+        self._postorder = None
+
+
+def _intersect(idom, position, a, b):
+    """Walk two dominator chains up to their closest common ancestor"""
+    while a != b:
+        while position[a] > position[b]:
+            a = idom[a]
+        while position[b] > position[a]:
+            b = idom[b]
+    return a
+
+
+def _is_function_exit(block):
+    return block.instructions and block.instructions[0].op == END_FUNCTION
+
+
+def _split_blocks(code):
+    """Split an instruction list into basic blocks at labels, jumps and function boundaries"""
+    blocks = []
+    current = []
+    functions = []
+    function = None
+
+    for ins in code:
+        op = ins.op
+        if (op == LABEL or op == FUNCTION or op == END_FUNCTION) and current:
+            blocks.append(BasicBlock(len(blocks), current, function))
+            current = []
+        if op == FUNCTION:
+            functions.append(function)
+            function = ins.arg1
+        current.append(ins)
+        if op in TERMINATOR_OPS:
+            blocks.append(BasicBlock(len(blocks), current, function))
+            current = []
+            if op == END_FUNCTION and functions:
+                function = functions.pop()
+
+    if current:
+        blocks.append(BasicBlock(len(blocks), current, function))
+    return blocks
+
+
+def build_cfg(code):
+    """
+    Build a control-flow graph for a list of instructions.
+
+    Args:
+        code (list): List of Instruction objects
+
+    Returns:
+        ControlFlowGraph: Blocks in listing order with edges and entries
+    """
+    blocks = _split_blocks(code)
+    count = len(blocks)
+
+    label_blocks = {}
+    for block in blocks:
+        label = block.label
+        if label is not None:
+            label_blocks[label] = block.index
+
+    # Match every function header with the block holding its `end function`
+    function_end = {}
+    open_functions = []
+    for block in blocks:
+        first = block.instructions[0].op
+        if first == FUNCTION:
+            open_functions.append(block.index)
+        elif first == END_FUNCTION and open_functions:
+            function_end[open_functions.pop()] = block.index
+
+    def fallthrough(i):
+        # Module-level flow steps over nested function definitions
+        while i < count and i in function_end:
+            i = function_end[i] + 1
+        return i if i < count else None
+
+    exits = []
+    entries = []
+    top = fallthrough(0)
+    if top is not None:
+        entries.append(top)
+
+    for block in blocks:
+        first = block.instructions[0].op
+        if first == FUNCTION:
+            entries.append(block.index)
+            exits.append(function_end.get(block.index))
+
+        last = block.terminator
+        op = last.op
+        targets = []
+        if op == GOTO:
+            targets.append(label_blocks.get(last.arg1))
+        elif op == IF_FALSE:
+            targets.append(label_blocks.get(last.arg2))
+            targets.append(fallthrough(block.index + 1))
+        elif op == RETURN:
+            targets.append(exits[-1] if exits else None)
+        elif op == END_FUNCTION:
+            if exits:
+                exits.pop()
+        else:
+            targets.append(fallthrough(block.index + 1))
+
+        for target in targets:
+            if target is not None and target not in block.successors:
+                block.successors.append(target)
+                blocks[target].predecessors.append(block.index)
+
+    return ControlFlowGraph(blocks, entries)
@@ -0,0 +1,66 @@
+import signal
+import threading
+import time
+from contextlib import contextmanager
+
+
+class CompileTimeout(Exception):
+    """Raised inside a compilation that ran past its deadline"""
+
+
+@contextmanager
+def compile_deadline(seconds):
+    """
+    Interrupt the enclosed block with CompileTimeout after `seconds`.
+
+    Uses a SIGALRM interval timer, so it only takes effect on the main
+    thread of a POSIX process, which is where pre-forked sync workers run
+    requests. Elsewhere (threaded dev server, Windows) it does nothing and
+    the server's own worker timeout is the only limit.
+
+    Args:
+        seconds (float): Time limit; 0 or None disables it
+    """
+    if (not seconds or not hasattr(signal, 'setitimer')
+            or threading.current_thread() is not threading.main_thread()):
+        yield
+        return
+
+    def expire(signum, frame):
+        raise CompileTimeout(f"compilation exceeded {seconds:g} seconds")
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def iter_with_deadline(iterable, seconds):
+    """
+    Yield from `iterable`, raising CompileTimeout once producing its items took `seconds`.
+
+    Only the time spent inside `iterable` counts: the clock is stopped
+    while the consumer holds an item (e.g. while a streamed response
+    line is written to the client), so the alarm never fires in code
+    that does not expect it.
+
+    Args:
+        iterable: Items to produce, typically a generator doing the compilation
+        seconds (float): Time limit; 0 or None disables it
+    """
+    iterator = iter(iterable)
+    remaining = seconds or 0
+    while True:
+        if seconds and remaining <= 0:
+            raise CompileTimeout(f"compilation exceeded {seconds:g} seconds")
+        start = time.perf_counter()
+        with compile_deadline(remaining):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        remaining -= time.perf_counter() - start
+        yield item
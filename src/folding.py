@@ -0,0 +1,156 @@
+import math
+import operator
+
+from src.ir import Instruction, Const, COPY, BINARY_OPS, UNARY_OPS
+
+# Literal types the folder evaluates. Anything else (bytes, None, ...) is left alone.
+FOLDABLE_TYPES = frozenset([int, float, bool, str])
+
+# Results larger than these are left for run time rather than written into the code
+MAX_INT_BITS = 4096
+MAX_STR_LENGTH = 4096
+
+# Binary opcode -> Python operator. 'is' and 'in' depend on object identity and
+# containers, so they are never folded.
+BINARY_FOLDERS = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.truediv,
+    '//': operator.floordiv,
+    '%': operator.mod,
+    '**': operator.pow,
+    '<<': operator.lshift,
+    '>>': operator.rshift,
+    '&': operator.and_,
+    '|': operator.or_,
+    '^': operator.xor,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+UNARY_FOLDERS = {
+    'neg': operator.neg,
+    'pos': operator.pos,
+    'not': operator.not_,
+    'invert': operator.invert,
+}
+
+# Operators defined on strings. '%' is string formatting and '*' is only
+# repetition by an integer, both handled below.
+STRING_OPS = frozenset(['+', '==', '!=', '<', '<=', '>', '>='])
+
+# Errors that mean "this would fail at run time", so the instruction is kept
+FOLD_ERRORS = (ArithmeticError, TypeError, ValueError)
+
+
+def fold_binary(op, left, right):
+    """
+    Evaluate a binary operator on two literal values.
+
+    Args:
+        op (str): Binary opcode
+        left: Left operand value
+        right: Right operand value
+
+    Returns:
+        Const: The folded result, or None when it cannot be folded safely
+    """
+    fold = BINARY_FOLDERS.get(op)
+    if fold is None:
+        return None
+    left_type = type(left)
+    right_type = type(right)
+    if left_type not in FOLDABLE_TYPES or right_type not in FOLDABLE_TYPES:
+        return None
+
+    if left_type is str or right_type is str:
+        if op == '*':
+            # Repetition: exactly one side is a string, the other an integer
+            text, count = (left, right) if left_type is str else (right, left)
+            if type(text) is not str or type(count) is not int:
+                return None
+            if len(text) * max(count, 0) > MAX_STR_LENGTH:
+                return None
+        elif left_type is right_type:
+            if op not in STRING_OPS:
+                return None
+        elif op not in ('==', '!='):
+            return None
+    elif not within_limits(op, left, right):
+        return None
+
+    try:
+        result = fold(left, right)
+    except FOLD_ERRORS:
+        # Division by zero, overflow, negative shift counts, ...
+        return None
+    return _checked(result)
+
+
+def fold_unary(op, value):
+    """
+    Evaluate a unary operator on a literal value.
+
+    Returns:
+        Const: The folded result, or None when it cannot be folded safely
+    """
+    fold = UNARY_FOLDERS.get(op)
+    if fold is None or type(value) not in FOLDABLE_TYPES:
+        return None
+    try:
+        result = fold(value)
+    except FOLD_ERRORS:
+        return None
+    return _checked(result)
+
+
+def fold_instruction(ins):
+    """Return the folded form of an instruction, or the instruction itself"""
+    op = ins.op
+    if op in BINARY_OPS:
+        left = ins.arg1
+        right = ins.arg2
+        if type(left) is Const and type(right) is Const:
+            result = fold_binary(op, left.value, right.value)
+            if result is not None:
+                return Instruction(COPY, ins.dest, result)
+    elif op in UNARY_OPS:
+        if type(ins.arg1) is Const:
+            result = fold_unary(op, ins.arg1.value)
+            if result is not None:
+                return Instruction(COPY, ins.dest, result)
+    return ins
+
+
+def within_limits(op, left, right):
+    """Reject integer operations whose result would be too large to write out"""
+    if op == '**':
+        if type(left) in (int, bool) and type(right) in (int, bool) and right >= 0:
+            return abs(left) < 2 or abs(left).bit_length() * right <= MAX_INT_BITS
+        return True
+    if op == '<<':
+        return type(right) not in (int, bool) or right <= MAX_INT_BITS
+    if op == '*':
+        if type(left) in (int, bool) and type(right) in (int, bool):
+            return left.bit_length() + right.bit_length() <= MAX_INT_BITS
+        return True
+    return True
+
+
+def _checked(result):
+    """Wrap a folded value, rejecting complex, non-finite and oversized results"""
+    result_type = type(result)
+    if result_type not in FOLDABLE_TYPES:
+        return None
+    if result_type is int and result.bit_length() > MAX_INT_BITS:
+        return None
+    if result_type is str and len(result) > MAX_STR_LENGTH:
+        return None
+    if result_type is float and not math.isfinite(result):
+        return None
+    return Const(result)
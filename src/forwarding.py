@@ -0,0 +1,136 @@
+from collections import Counter
+
+from src.ir import (
+    Instruction, is_temp, COPY, UNSUPPORTED, CALL, METHOD_CALL, LABEL, GOTO, IF_FALSE,
+    FUNCTION, END_FUNCTION, RETURN,
+)
+
+# Instructions that start or end a basic block; nothing is forwarded across them
+BOUNDARY_OPS = frozenset([LABEL, GOTO, IF_FALSE, FUNCTION, END_FUNCTION, RETURN])
+
+# Instructions that may rebind global names behind the block's back
+CALL_OPS = frozenset([CALL, METHOD_CALL])
+
+
+class Forwarder:
+    """
+    Inline single-use temporaries into the instruction that reads them.
+
+    A temporary qualifies when it is read exactly once in the whole
+    listing and that read is in the same basic block after the
+    assignment, so no other path can observe the value. Two rewrites keep
+    every instruction a single quadruple:
+
+    - `t = <operand>` is a plain copy, so the operand is substituted into
+      the reader wherever it sits in the block and the copy is dropped, as
+      long as nothing assigns the operand (or, for a global, calls
+      something that might) in between
+    - `t = a + b` (any computation) followed directly by `x = t` is
+      computed straight into `x`
+
+    Instructions are emitted into a fresh list in one pass; a dropped copy
+    leaves a hole that is compacted at the end, so the pass is linear in
+    the length of the listing.
+    """
+
+    def __init__(self, code, live_on_exit=()):
+        self.dropped = 0
+        uses = Counter(var for ins in code for var in ins.uses())
+        uses.update(live_on_exit)
+        self.candidates = {var for var, count in uses.items() if count == 1 and is_temp(var)}
+        self.reset()
+
+    def reset(self):
+        # Forwardable copy temp -> (its slot in the output, the copied operand)
+        self.copies = {}
+        # Copied name -> temps holding it, so an assignment to the name can kill them
+        self.sources = {}
+
+    def run(self, code):
+        """Return the rewritten listing and the number of instructions removed"""
+        out = []
+        copies = self.copies
+        candidates = self.candidates
+
+        for ins in code:
+            op = ins.op
+            if op == LABEL or op == FUNCTION:
+                self.reset()
+                copies = self.copies
+
+            if copies:
+                ins = self._substitute(ins, out)
+                if ins.op == COPY and ins.arg1 == ins.dest and type(ins.arg1) is str:
+                    # `x = t` where `t = x` was forwarded: nothing left to do
+                    continue
+
+            dest = ins.dest
+            if dest is not None:
+                self._kill(dest)
+            if op in CALL_OPS:
+                self._kill_globals()
+
+            if (op == COPY and out and type(ins.arg1) is str and ins.arg1 in candidates
+                    and out[-1] is not None and out[-1].dest == ins.arg1
+                    and out[-1].op != UNSUPPORTED):
+                computed = out[-1]
+                out[-1] = ins = Instruction(computed.op, dest, computed.arg1, computed.arg2)
+            else:
+                out.append(ins)
+
+            if op in BOUNDARY_OPS:
+                self.reset()
+                copies = self.copies
+            elif ins.op == COPY and dest in candidates:
+                copies[dest] = (len(out) - 1, ins.arg1)
+                if type(ins.arg1) is str:
+                    self.sources.setdefault(ins.arg1, []).append(dest)
+
+        if self.dropped:
+            out = [ins for ins in out if ins is not None]
+        return out, len(code) - len(out)
+
+    def _substitute(self, ins, out):
+        """Read forwarded copies' operands directly, dropping the copies from `out`"""
+        operands = ins.operands()
+        if not operands:
+            return ins
+        replaced = None
+        for k, operand in enumerate(operands):
+            if type(operand) is str and operand in self.copies:
+                slot, value = self.copies.pop(operand)
+                out[slot] = None
+                self.dropped += 1
+                if replaced is None:
+                    replaced = list(operands)
+                replaced[k] = value
+        if replaced is None:
+            return ins
+        return ins.with_operands(replaced)
+
+    def _kill(self, name):
+        """`name` is being assigned: it and copies of its old value can no longer be forwarded"""
+        self.copies.pop(name, None)
+        temps = self.sources.pop(name, None)
+        if temps:
+            for temp in temps:
+                self.copies.pop(temp, None)
+
+    def _kill_globals(self):
+        """A call may rebind any global, so only copies of literals and temps survive it"""
+        for name in [name for name in self.sources if not is_temp(name)]:
+            self._kill(name)
+
+
+def forward_temporaries(code, live_on_exit=()):
+    """
+    Inline single-use temporaries into their reader.
+
+    Args:
+        code (list): List of Instruction objects
+        live_on_exit (iterable): Names read after the end of `code`
+
+    Returns:
+        tuple: (new list of Instruction objects, number of instructions removed)
+    """
+    return Forwarder(code, live_on_exit).run(code)
@@ -0,0 +1,266 @@
+import ast
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from src.parser import IntermediateCodeGenerator
+from src.optimizer import CodeOptimizer, DEFAULT_PIPELINE
+from src.pass_manager import PassManager
+from src.ir import Instruction, ERROR, FUNCTION, is_temp, format_code
+from src.metrics import NULL_TIMER
+
+DEFAULT_MAX_UNITS = 4096
+
+# Column-0 keywords that continue the statement above instead of starting one
+CONTINUATION_KEYWORDS = frozenset(['else', 'elif', 'except', 'finally'])
+
+
+class CompilationUnit:
+    """One top-level statement of a module, with the key its results are cached under"""
+    __slots__ = ('node', 'namespace', 'key')
+
+    def __init__(self, node, namespace, key):
+        self.node = node
+        self.namespace = namespace
+        self.key = key
+
+
+class IncrementalCompiler:
+    """
+    Compile a module one top-level statement at a time, reusing unchanged units.
+
+    Every top-level statement is a unit keyed by a hash of its source text.
+    Units get their own temp and label namespace (the function name for a
+    `def`, a hash of the text otherwise), so a unit lowers to the same
+    instructions wherever it sits in the file and cached results can be
+    spliced together verbatim. After an edit only the units whose text
+    changed are lowered and optimized again, and the source is cut into
+    top-level segments that are parsed separately so only edited segments
+    are parsed again.
+
+    Units are optimized in isolation. Variables a module-level unit assigns
+    are kept live on exit because later units or functions may read them,
+    and constants are not propagated from one unit into the next.
+    """
+
+    def __init__(self, max_units=DEFAULT_MAX_UNITS):
+        self.max_units = max_units
+        self._parsed = OrderedDict()
+        self._lowered = OrderedDict()
+        self._optimized = OrderedDict()
+        self._lock = threading.Lock()
+
+    def compile(self, source_code, optimize=True, pipeline=None, timer=NULL_TIMER, time_budget=None):
+        """
+        Compile a module, recompiling only units not seen before.
+
+        Args:
+            source_code (str): Python source code
+            optimize (bool): Whether to run the optimizer
+            pipeline (list): Technique names, defaults to DEFAULT_PIPELINE
+            timer (StageTimer): Receives the time spent parsing, lowering,
+                optimizing and formatting units that were not cached
+            time_budget (float): Seconds after which no further optimizer pass
+                is started, over all units; units cut short are not cached
+
+        Returns:
+            dict: intermediate_code (and optimized_code) lines and the matching
+                *_instructions lists, plus unit counts and budget_exhausted
+        """
+        pipeline = tuple(pipeline if pipeline is not None else DEFAULT_PIPELINE)
+        start = time.perf_counter()
+        try:
+            with timer.stage('parse'):
+                units = make_units(self._parse(source_code))
+        except SyntaxError as e:
+            code = [Instruction(ERROR, arg1=str(e))]
+            lines = format_code(code)
+            result = {'intermediate_code': lines, 'intermediate_instructions': code,
+                      'units': 0, 'units_compiled': 0}
+            if optimize:
+                result['optimized_code'] = list(lines)
+                result['optimized_instructions'] = list(code)
+                result['budget_exhausted'] = False
+            return result
+
+        generator = IntermediateCodeGenerator()
+        intermediate_code = []
+        optimized_code = []
+        intermediate_instructions = []
+        optimized_instructions = []
+        compiled = 0
+        exhausted = False
+        deadline = start + time_budget if time_budget is not None else None
+
+        for unit in units:
+            lowered = self._get(self._lowered, unit.key)
+            if lowered is None:
+                with timer.stage('lower'):
+                    code = generator.generate_statement(unit.node, unit.namespace)
+                with timer.stage('format'):
+                    lowered = (code, format_code(code))
+                self._put(self._lowered, unit.key, lowered)
+                compiled += 1
+            intermediate_instructions.extend(lowered[0])
+            intermediate_code.extend(lowered[1])
+
+            if optimize:
+                optimized_key = (unit.key, pipeline)
+                optimized = self._get(self._optimized, optimized_key)
+                if optimized is None:
+                    remaining = None if deadline is None else max(0.0, deadline - time.perf_counter())
+                    with timer.stage('optimize'):
+                        code, cut_short = optimize_unit(lowered[0], unit.node, pipeline, remaining)
+                    with timer.stage('format'):
+                        optimized = (code, format_code(code))
+                    # How far a unit got within the budget depends on load
+                    if cut_short:
+                        exhausted = True
+                    else:
+                        self._put(self._optimized, optimized_key, optimized)
+                optimized_instructions.extend(optimized[0])
+                optimized_code.extend(optimized[1])
+
+        result = {
+            'intermediate_code': intermediate_code,
+            'intermediate_instructions': intermediate_instructions,
+            'units': len(units),
+            'units_compiled': compiled,
+            'compile_time_ms': round((time.perf_counter() - start) * 1000, 3),
+        }
+        if optimize:
+            result['optimized_code'] = optimized_code
+            result['optimized_instructions'] = optimized_instructions
+            result['budget_exhausted'] = exhausted
+        return result
+
+    def clear(self):
+        """Drop every cached unit"""
+        with self._lock:
+            self._parsed.clear()
+            self._lowered.clear()
+            self._optimized.clear()
+
+    def _parse(self, source_code):
+        """Parse segment by segment, reusing the statements of unchanged segments"""
+        statements = []
+        for segment in split_segments(source_code):
+            key = hashlib.sha1(segment.encode('utf-8')).hexdigest()
+            parsed = self._get(self._parsed, key)
+            if parsed is None:
+                try:
+                    parsed = parse_statements(segment)
+                except SyntaxError:
+                    # The segment was cut in the wrong place; parse the module as a whole
+                    return parse_statements(source_code)
+                self._put(self._parsed, key, parsed)
+            statements.extend(parsed)
+        return statements
+
+    def _get(self, table, key):
+        with self._lock:
+            value = table.get(key)
+            if value is not None:
+                table.move_to_end(key)
+            return value
+
+    def _put(self, table, key, value):
+        with self._lock:
+            table[key] = value
+            table.move_to_end(key)
+            while len(table) > self.max_units:
+                table.popitem(last=False)
+
+
+def split_segments(source_code):
+    """
+    Cut source text into runs of lines that each start a new top-level statement.
+
+    A segment starts at every line that begins in column 0 with a name or a
+    decorator, except `else`/`elif`/`except`/`finally` clauses and the
+    definition a decorator applies to. This is a guess made without
+    tokenizing: a cut inside a string or bracket leaves a segment that does
+    not parse, and callers fall back to parsing the whole module.
+    """
+    segments = []
+    current = []
+    decorated = False
+    for line in source_code.splitlines(keepends=True):
+        first = line[:1]
+        if (first.isalpha() or first == '_' or first == '@') and current and not decorated:
+            word = line.split(None, 1)[0].rstrip(':')
+            if word not in CONTINUATION_KEYWORDS:
+                segments.append(''.join(current))
+                current = []
+        if first and not first.isspace() and first != '#':
+            decorated = first == '@'
+        current.append(line)
+    if current:
+        segments.append(''.join(current))
+    return segments
+
+
+def parse_statements(source_code):
+    """
+    Parse source text into (statement, digest) pairs.
+
+    The digest hashes the statement's whole lines plus its column offsets,
+    which identifies it exactly even when several statements share a line.
+
+    Raises:
+        SyntaxError: If the source does not parse
+    """
+    tree = ast.parse(source_code)
+    lines = source_code.splitlines(keepends=True)
+    statements = []
+    for node in tree.body:
+        text = ''.join(lines[node.lineno - 1:node.end_lineno])
+        digest = hashlib.sha1(
+            f"{node.col_offset}:{node.end_col_offset}:".encode('utf-8') + text.encode('utf-8')
+        ).hexdigest()
+        statements.append((node, digest))
+    return statements
+
+
+def make_units(statements):
+    """
+    Give every statement a namespace and cache key.
+
+    Functions are namespaced by name and other statements by their digest,
+    so a unit's namespace does not change when code around it is edited.
+    Repeats get a numeric suffix.
+    """
+    units = []
+    seen = {}
+    for node, digest in statements:
+        if isinstance(node, ast.FunctionDef):
+            namespace = node.name
+        else:
+            namespace = 's' + digest[:8]
+        count = seen.get(namespace, 0)
+        seen[namespace] = count + 1
+        if count:
+            namespace = f"{namespace}_{count}"
+        units.append(CompilationUnit(node, namespace, f"{namespace}:{digest}"))
+    return units
+
+
+def optimize_unit(code, node, pipeline, time_budget=None):
+    """
+    Optimize one unit's code to a fixed point on its own.
+
+    Returns:
+        tuple: (optimized code, whether the time budget ran out first)
+    """
+    optimizer = CodeOptimizer()
+    # Later units may read what this one binds, the functions it defines included,
+    # so interprocedural passes must not assume they see every call
+    if isinstance(node, ast.FunctionDef):
+        optimizer.live_on_exit = [node.name]
+    else:
+        optimizer.live_on_exit = [ins.arg1 if ins.op == FUNCTION else ins.dest for ins in code
+                                  if ins.op == FUNCTION
+                                  or ins.dest is not None and not is_temp(ins.dest)]
+    manager = PassManager(list(pipeline), optimizer, time_budget=time_budget)
+    return manager.run(code), manager.budget_exhausted
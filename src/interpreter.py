@@ -0,0 +1,385 @@
+import operator
+
+from src.cfg import build_cfg
+from src.folding import BINARY_FOLDERS, UNARY_FOLDERS, within_limits
+from src.ir import (
+    Const, COPY, INDEX, GET_ATTR, SET_INDEX, SET_ATTR, BUILD_LIST, BUILD_TUPLE, CALL,
+    METHOD_CALL, IF_FALSE, GOTO, LABEL, FUNCTION, PARAMS, END_FUNCTION, RETURN, PRINT,
+    COMMENT, UNSUPPORTED, ERROR, UNARY_OPS, format_code,
+)
+
+DEFAULT_MAX_STEPS = 1_000_000
+
+# Largest list, tuple or string a program may build by repetition, concatenation or range()
+MAX_SEQUENCE_LENGTH = 1_000_000
+
+# Sequences whose `+` builds a new one as long as both operands together
+CONCATENATED_TYPES = (str, list, tuple, bytes)
+
+# Binary opcode -> implementation. Arithmetic and comparisons share the folder's table.
+BINARY_IMPLEMENTATIONS = dict(BINARY_FOLDERS)
+BINARY_IMPLEMENTATIONS.update({
+    '@': operator.matmul,
+    'is': operator.is_,
+    'is not': operator.is_not,
+    'in': lambda item, container: item in container,
+    'not in': lambda item, container: item not in container,
+})
+
+
+def bounded_range(*args):
+    """range() that refuses ranges too long to iterate within the step limit"""
+    result = range(*args)
+    if len(result) > MAX_SEQUENCE_LENGTH:
+        raise InterpreterError(f"range of {len(result)} items is too long")
+    return result
+
+
+# Builtins a program may call. Anything else that is not an IR function is an error,
+# so the interpreter can run code submitted to the web endpoint.
+SAFE_BUILTINS = {
+    'abs': abs, 'all': all, 'any': any, 'bool': bool, 'chr': chr, 'dict': dict,
+    'enumerate': enumerate, 'float': float, 'int': int, 'len': len, 'list': list,
+    'max': max, 'min': min, 'ord': ord, 'range': bounded_range, 'reversed': reversed,
+    'round': round, 'set': set, 'slice': slice, 'sorted': sorted, 'str': str,
+    'sum': sum, 'tuple': tuple, 'zip': zip,
+}
+
+# Instructions that only mark positions and are not counted as executed
+MARKER_OPS = frozenset([LABEL, COMMENT])
+
+# Attributes that could reach interpreter internals (str.format can walk attributes)
+BLOCKED_ATTRIBUTES = frozenset(['format', 'format_map'])
+
+# Methods a program may call. None of them can build a result much larger than
+# their receiver and arguments, except the few checked by _within_method_length.
+# Left out are those that grow without such a check (expandtabs, translate,
+# to_bytes) as well as format and format_map.
+ALLOWED_METHODS = frozenset([
+    # str and bytes
+    'capitalize', 'casefold', 'center', 'count', 'decode', 'encode', 'endswith', 'find',
+    'hex', 'index', 'isalnum', 'isalpha', 'isascii', 'isdecimal', 'isdigit',
+    'isidentifier', 'islower', 'isnumeric', 'isspace', 'istitle', 'isupper', 'join',
+    'ljust', 'lower', 'lstrip', 'partition', 'removeprefix', 'removesuffix', 'replace',
+    'rfind', 'rindex', 'rjust', 'rpartition', 'rsplit', 'rstrip', 'split', 'splitlines',
+    'startswith', 'strip', 'swapcase', 'title', 'upper', 'zfill',
+    # list, dict and set
+    'append', 'clear', 'copy', 'extend', 'insert', 'pop', 'remove', 'reverse', 'sort',
+    'get', 'items', 'keys', 'values', 'popitem', 'setdefault', 'update',
+    'add', 'discard', 'difference', 'intersection', 'isdisjoint', 'issubset',
+    'issuperset', 'symmetric_difference', 'union',
+    # numbers
+    'bit_length', 'conjugate', 'is_integer',
+])
+
+# Methods that pad to the width given as their first argument
+PADDING_METHODS = frozenset(['center', 'ljust', 'rjust', 'zfill'])
+
+
+class InterpreterError(Exception):
+    """Raised when the program fails, uses an unsupported construct or runs too long"""
+
+
+class IRFunction:
+    """A function defined by `function name:` ... `end function`"""
+    __slots__ = ('name', 'start', 'end', 'params')
+
+    def __init__(self, name, start, end, params):
+        self.name = name
+        self.start = start
+        self.end = end
+        self.params = params
+
+    def __repr__(self):
+        return f"<function {self.name}>"
+
+
+class Profile:
+    """Dynamic instruction counts of one run"""
+
+    def __init__(self, code, line_counts):
+        self.code = code
+        self.line_counts = line_counts
+        self.total = sum(line_counts)
+
+    def block_counts(self):
+        """
+        Return (first line, label, count) for every basic block.
+
+        A block runs exactly as often as its first instruction, so its count
+        is read off the per-line counts.
+        """
+        counts = []
+        line = 0
+        for block in build_cfg(self.code).blocks:
+            first = line
+            line += len(block.instructions)
+            # Labels are not counted, so use the first counted instruction of the block
+            count = 0
+            for i in range(first, line):
+                if self.code[i].op not in MARKER_OPS:
+                    count = self.line_counts[i]
+                    break
+            counts.append((first, block.label, count))
+        return counts
+
+    def as_dict(self, hottest=10):
+        blocks = sorted(self.block_counts(), key=lambda entry: -entry[2])[:hottest]
+        return {
+            'instructions': self.total,
+            'line_counts': self.line_counts,
+            'hottest_blocks': [{'line': line, 'label': label, 'count': count}
+                               for line, label, count in blocks if count],
+        }
+
+
+class Interpreter:
+    """
+    Execute a list of IR instructions.
+
+    Module-level code runs from the top; `function` ... `end function`
+    ranges are skipped there and bind a callable name instead. Calls to IR
+    functions run their body in a new frame whose names fall back to the
+    module's. Calls to anything else go to SAFE_BUILTINS, and attribute
+    access is limited to public attributes, so untrusted programs cannot
+    reach the host. `print` output is collected rather than written out.
+
+    With `profile=True` every executed instruction is counted per line.
+    """
+
+    def __init__(self, code, max_steps=DEFAULT_MAX_STEPS, profile=False):
+        self.code = code
+        self.max_steps = max_steps
+        self.profile = profile
+        self.steps = 0
+        self.output = []
+        self.globals = {}
+        self.line_counts = [0] * len(code) if profile else None
+        self.labels = {}
+        self.function_end = {}
+
+        open_functions = []
+        for i, ins in enumerate(code):
+            if ins.op == LABEL:
+                self.labels[ins.arg1] = i
+            elif ins.op == FUNCTION:
+                open_functions.append(i)
+            elif ins.op == END_FUNCTION and open_functions:
+                self.function_end[open_functions.pop()] = i
+
+    def run(self):
+        """
+        Run the module.
+
+        Returns:
+            dict: Module variables after the run
+
+        Raises:
+            InterpreterError: If the program fails or exceeds max_steps
+        """
+        try:
+            self._execute(0, len(self.code), self.globals)
+        except InterpreterError:
+            raise
+        except RecursionError:
+            raise InterpreterError("maximum recursion depth exceeded") from None
+        except Exception as e:
+            raise InterpreterError(f"{type(e).__name__}: {e}") from None
+        return self.globals
+
+    def get_profile(self):
+        """Return the Profile of the last run (requires profile=True)"""
+        return Profile(self.code, self.line_counts)
+
+    def _execute(self, pc, end, frame):
+        """Run instructions from `pc` until `end`, a return or `end function`"""
+        code = self.code
+        counts = self.line_counts
+        value = self._value
+
+        while pc < end:
+            ins = code[pc]
+            op = ins.op
+            if op in MARKER_OPS:
+                pc += 1
+                continue
+
+            self.steps += 1
+            if self.steps > self.max_steps:
+                raise InterpreterError(f"step limit of {self.max_steps} exceeded")
+            if counts is not None:
+                counts[pc] += 1
+
+            if op == COPY:
+                frame[ins.dest] = value(ins.arg1, frame)
+            elif op in BINARY_IMPLEMENTATIONS:
+                left = value(ins.arg1, frame)
+                right = value(ins.arg2, frame)
+                if not within_limits(op, left, right) or not _within_length(op, left, right):
+                    raise InterpreterError(f"result of {op} is too large")
+                frame[ins.dest] = BINARY_IMPLEMENTATIONS[op](left, right)
+            elif op == IF_FALSE:
+                if not value(ins.arg1, frame):
+                    pc = self.labels[ins.arg2]
+                    continue
+            elif op == GOTO:
+                pc = self.labels[ins.arg1]
+                continue
+            elif op in UNARY_OPS:
+                frame[ins.dest] = UNARY_FOLDERS[op](value(ins.arg1, frame))
+            elif op == CALL:
+                callee = self._lookup(ins.arg1, frame)
+                args = [value(arg, frame) for arg in ins.arg2]
+                frame[ins.dest] = self._call(callee, args)
+            elif op == METHOD_CALL:
+                receiver = value(ins.arg2[0], frame)
+                args = [value(arg, frame) for arg in ins.arg2[1:]]
+                frame[ins.dest] = self._call_method(receiver, ins.arg1, args)
+            elif op == INDEX:
+                frame[ins.dest] = value(ins.arg1, frame)[value(ins.arg2, frame)]
+            elif op == GET_ATTR:
+                attribute = self._attribute(value(ins.arg1, frame), ins.arg2)
+                if callable(attribute):
+                    raise InterpreterError(f"method {ins.arg2} can only be called directly")
+                frame[ins.dest] = attribute
+            elif op == SET_INDEX:
+                value(ins.arg1, frame)[value(ins.arg2[0], frame)] = value(ins.arg2[1], frame)
+            elif op == SET_ATTR:
+                raise InterpreterError(f"cannot set attribute {ins.arg2[0]}")
+            elif op == BUILD_LIST:
+                frame[ins.dest] = [value(item, frame) for item in ins.arg1]
+            elif op == BUILD_TUPLE:
+                frame[ins.dest] = tuple(value(item, frame) for item in ins.arg1)
+            elif op == PRINT:
+                self._print([value(item, frame) for item in ins.arg1])
+            elif op == RETURN:
+                return value(ins.arg1, frame) if ins.arg1 is not None else None
+            elif op == FUNCTION:
+                function_end = self.function_end.get(pc)
+                if function_end is None:
+                    raise InterpreterError(f"function {ins.arg1} has no end")
+                params = code[pc + 1].arg1 if code[pc + 1].op == PARAMS else ()
+                frame[ins.arg1] = IRFunction(ins.arg1, pc, function_end, params)
+                pc = function_end + 1
+                continue
+            elif op == END_FUNCTION:
+                return None
+            elif op == PARAMS:
+                pass
+            elif op == UNSUPPORTED or op == ERROR:
+                raise InterpreterError(str(ins.arg1))
+            else:
+                raise InterpreterError(f"unknown instruction {format_code([ins])[0]}")
+            pc += 1
+        return None
+
+    def _call(self, callee, args):
+        if type(callee) is IRFunction:
+            if len(args) != len(callee.params):
+                raise InterpreterError(
+                    f"{callee.name}() takes {len(callee.params)} arguments but {len(args)} were given")
+            frame = dict(zip(callee.params, args))
+            return self._execute(callee.start + 1, callee.end + 1, frame)
+        if callee is print:
+            self._print(args)
+            return None
+        return callee(*args)
+
+    def _print(self, values):
+        self.output.append(' '.join(str(item) for item in values))
+
+    def _value(self, operand, frame):
+        if type(operand) is Const:
+            return operand.value
+        return self._lookup(operand, frame)
+
+    def _lookup(self, var, frame):
+        if var in frame:
+            return frame[var]
+        if var in self.globals:
+            return self.globals[var]
+        if var == 'print':
+            return print
+        if var in SAFE_BUILTINS:
+            return SAFE_BUILTINS[var]
+        raise InterpreterError(f"name '{var}' is not defined")
+
+    def _attribute(self, obj, attr):
+        if attr.startswith('_') or attr in BLOCKED_ATTRIBUTES:
+            raise InterpreterError(f"cannot access attribute {attr}")
+        return getattr(obj, attr)
+
+    def _call_method(self, receiver, name, args):
+        if name not in ALLOWED_METHODS:
+            raise InterpreterError(f"cannot call method {name}")
+        method = self._attribute(receiver, name)
+        if name == 'join' or name == 'extend' or name == 'update':
+            # Materialize iterators so their length can be checked
+            args = [arg if hasattr(arg, '__len__') else list(arg) for arg in args]
+        if not _within_method_length(receiver, name, args):
+            raise InterpreterError(f"result of {name}() is too large")
+        result = method(*args)
+        if hasattr(result, '__len__') and len(result) > MAX_SEQUENCE_LENGTH:
+            raise InterpreterError(f"result of {name}() is too large")
+        return result
+
+
+def _within_length(op, left, right):
+    """Reject sequence repetition or concatenation that would build something huge"""
+    if op == '+':
+        if isinstance(left, CONCATENATED_TYPES) and isinstance(right, CONCATENATED_TYPES):
+            return len(left) + len(right) <= MAX_SEQUENCE_LENGTH
+        return True
+    if op != '*':
+        return True
+    if type(left) is int and hasattr(right, '__len__'):
+        left, right = right, left
+    if type(right) is int and hasattr(left, '__len__'):
+        return len(left) * right <= MAX_SEQUENCE_LENGTH
+    return True
+
+
+def _within_method_length(receiver, name, args):
+    """Reject a method call that would build a string or collection longer than MAX_SEQUENCE_LENGTH"""
+    if name in PADDING_METHODS:
+        return not args or type(args[0]) is not int or args[0] <= MAX_SEQUENCE_LENGTH
+    if name == 'replace' and len(args) >= 2 and isinstance(receiver, (str, bytes)):
+        old, new = args[0], args[1]
+        if type(old) is not type(receiver) or type(new) is not type(receiver):
+            return True
+        count = receiver.count(old)
+        if len(args) > 2 and type(args[2]) is int and 0 <= args[2] < count:
+            count = args[2]
+        return len(receiver) + count * (len(new) - len(old)) <= MAX_SEQUENCE_LENGTH
+    if name == 'join' and args and isinstance(receiver, (str, bytes)):
+        items = args[0]
+        length = len(receiver) * max(len(items) - 1, 0)
+        return length + sum(len(item) for item in items if hasattr(item, '__len__')) <= MAX_SEQUENCE_LENGTH
+    if (name == 'extend' or name == 'update') and args and hasattr(receiver, '__len__'):
+        return len(receiver) + sum(len(arg) for arg in args if hasattr(arg, '__len__')) <= MAX_SEQUENCE_LENGTH
+    return True
+
+
+def run_code(code, max_steps=DEFAULT_MAX_STEPS, profile=False):
+    """
+    Execute IR and return what it did.
+
+    Args:
+        code (list): List of Instruction objects
+        max_steps (int): Instructions to execute before giving up
+        profile (bool): Whether to count executions per line
+
+    Returns:
+        dict: steps, output and (with profile) the Profile; `error` if the run failed
+    """
+    interpreter = Interpreter(code, max_steps, profile)
+    result = {}
+    try:
+        interpreter.run()
+    except InterpreterError as e:
+        result['error'] = str(e)
+    result['steps'] = interpreter.steps
+    result['output'] = interpreter.output
+    if profile:
+        result['profile'] = interpreter.get_profile()
+    return result
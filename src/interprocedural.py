@@ -0,0 +1,331 @@
+from collections import Counter
+
+from src.callgraph import CallGraph
+from src.folding import FOLDABLE_TYPES
+from src.liveness import block_defs, block_uses
+from src.ir import (
+    Instruction, Const, is_temp, name, COPY, CALL, LABEL, GOTO, IF_FALSE, RETURN, COMMENT,
+    NAMESPACE_SEPARATOR,
+)
+
+# Largest function body, in instructions, that is copied into its callers
+INLINE_SIZE = 24
+
+# Instructions one inlining pass may add, as a multiple of the listing's length,
+# and the smallest budget any listing gets
+INLINE_GROWTH = 1.0
+MIN_INLINE_BUDGET = 256
+
+# Instructions that do not count towards a function's size
+MARKER_OPS = frozenset([LABEL, COMMENT])
+
+
+class Inliner:
+    """
+    Replace calls to small non-recursive functions with a copy of their body.
+
+    Bodies are processed callees first (CallGraph.order), so a function is
+    copied with the calls it makes already inlined. At each call site
+    every `return v` becomes an assignment to the call's destination
+    followed by a jump past the copy. Reads of a parameter the body never
+    reassigns read the argument itself; other parameters get a copy of
+    it. Those, the other names the callee assigns and its labels are
+    renamed into a namespace of their own (`f$i0$x`), so copies never
+    clash with each other or with the caller.
+
+    A call is inlined when the callee is known (see CallGraph), is not
+    recursive, has a body of at most INLINE_SIZE instructions, is called
+    with the right number of arguments, does not call one of its own
+    locals and is defined unconditionally (before the call, for module
+    code). Inside a function, the names the
+    callee reads from the module must not be local to the caller. A
+    function whose every call site was inlined, and that is not
+    referenced any other way, is removed.
+    """
+
+    def __init__(self, code, live_on_exit=()):
+        self.code = code
+        self.graph = CallGraph(code, live_on_exit)
+        self.bodies = {}
+        self.assigned = {}
+        self.budget = max(int(len(code) * INLINE_GROWTH), MIN_INLINE_BUDGET)
+        self.inlined = Counter()
+        self.namespaces = _namespaces(code)
+        for function in self.graph.functions.values():
+            self.bodies[function.name] = code[function.body_start:function.end]
+
+    def run(self):
+        """Return the rewritten listing and the number of calls inlined"""
+        graph = self.graph
+        code = self.code
+        functions = graph.functions
+
+        for callee in graph.order:
+            function = functions[callee]
+            locals_ = self._locals(callee)
+            body = []
+            for ins in self.bodies[callee]:
+                if ins.op == CALL:
+                    body.extend(self._expand(ins, function.start, locals_))
+                else:
+                    body.append(ins)
+            self.bodies[callee] = body
+            self.assigned.pop(callee, None)
+
+        expansions = {}
+        for site in graph.sites:
+            if site.region is None:
+                expansions[site.position] = self._expand(code[site.position], None, (), site.position)
+
+        sites = Counter(site.callee for site in graph.sites)
+        removed = {callee for callee, count in sites.items()
+                   if self.inlined[callee] == count and callee not in graph.escaping}
+
+        out = []
+        i = 0
+        while i < len(code):
+            ins = code[i]
+            if graph.owners[i] == i and graph.region_name(i) is not None:
+                function = functions[ins.arg1]
+                if function.name not in removed:
+                    out.extend(code[i:function.body_start])
+                    out.extend(self.bodies[function.name])
+                    out.append(code[function.end])
+                i = function.end + 1
+                continue
+            expansion = expansions.get(i)
+            if expansion is not None:
+                out.extend(expansion)
+            else:
+                out.append(ins)
+            i += 1
+        return out, sum(self.inlined.values())
+
+    def _locals(self, function):
+        """Names a known function assigns, its parameters included"""
+        names = self.assigned.get(function)
+        if names is None:
+            names = set(self.graph.functions[function].params)
+            for ins in self.bodies[function]:
+                names.update(block_defs(ins))
+            self.assigned[function] = names
+        return names
+
+    def _can_inline(self, ins, region, caller_locals, position):
+        callee = ins.arg1
+        function = self.graph.functions.get(callee)
+        if (function is None or callee in self.graph.recursive
+                or not function.unconditional or len(ins.arg2) != len(function.params)):
+            return False
+        if region is None and (position is None or position < function.start):
+            return False
+        if _size(self.bodies[callee]) > min(INLINE_SIZE, self.budget):
+            return False
+        callee_locals = self._locals(callee)
+        for body_ins in self.bodies[callee]:
+            # Call targets are not operands, so a local one would look dead once copied
+            if body_ins.op == CALL and body_ins.arg1 in callee_locals:
+                return False
+            if caller_locals:
+                for var in block_uses(body_ins):
+                    if var in caller_locals and var not in callee_locals:
+                        return False
+        return True
+
+    def _expand(self, ins, region, caller_locals, position=None):
+        """Return the instructions replacing a call: a copy of the callee's body, or the call itself"""
+        if not self._can_inline(ins, region, caller_locals, position):
+            return [ins]
+
+        callee = ins.arg1
+        function = self.graph.functions[callee]
+        body = self.bodies[callee]
+        prefix = self._namespace(callee)
+        local_names = self._locals(callee)
+        # Parameters the body never reassigns read the argument directly
+        copied = set()
+        for body_ins in body:
+            copied.update(block_defs(body_ins))
+        renamed = {param: arg for param, arg in zip(function.params, ins.arg2)
+                   if param not in copied}
+
+        def rename(operand):
+            if type(operand) is not str or operand not in local_names:
+                return operand
+            new = renamed.get(operand)
+            if new is None:
+                new = renamed[operand] = name(prefix + operand)
+            return new
+
+        def label(text):
+            return name(prefix + text)
+
+        exit_label = label('return')
+        result = ins.dest
+        out = [Instruction(COPY, rename(param), arg)
+               for param, arg in zip(function.params, ins.arg2) if param in copied]
+        jumps_to_exit = False
+
+        for k, body_ins in enumerate(body):
+            op = body_ins.op
+            if op == RETURN:
+                value = Const(None) if body_ins.arg1 is None else rename(body_ins.arg1)
+                if result is not None:
+                    out.append(Instruction(COPY, result, value))
+                if k < len(body) - 1:
+                    out.append(Instruction(GOTO, arg1=exit_label))
+                    jumps_to_exit = True
+                continue
+            if op == LABEL or op == GOTO:
+                out.append(Instruction(op, arg1=label(body_ins.arg1)))
+                continue
+            if op == IF_FALSE:
+                out.append(Instruction(op, arg1=rename(body_ins.arg1), arg2=label(body_ins.arg2)))
+                continue
+            new = body_ins.with_operands([rename(operand) for operand in body_ins.operands()])
+            if new is body_ins and body_ins.dest is None:
+                out.append(body_ins)
+                continue
+            out.append(Instruction(op, rename(new.dest), new.arg1, new.arg2))
+
+        if not body or body[-1].op != RETURN:
+            # Falling off the end returns None
+            if result is not None:
+                out.append(Instruction(COPY, result, Const(None)))
+        if jumps_to_exit:
+            out.append(Instruction(LABEL, arg1=exit_label))
+
+        self.inlined[callee] += 1
+        self.budget -= _size(body)
+        return out
+
+    def _namespace(self, callee):
+        """Return a prefix no name in the listing starts with"""
+        k = self.inlined[callee]
+        while True:
+            prefix = f"{callee}{NAMESPACE_SEPARATOR}i{k}{NAMESPACE_SEPARATOR}"
+            if prefix not in self.namespaces:
+                self.namespaces.add(prefix)
+                return prefix
+            k += 1
+
+
+def _namespaces(code):
+    """Every prefix ending in a namespace separator of the names and labels in a listing"""
+    prefixes = set()
+    seen = set()
+    for ins in code:
+        for text in (ins.dest, ins.arg1):
+            if type(text) is str and NAMESPACE_SEPARATOR in text and text not in seen:
+                seen.add(text)
+                end = text.find(NAMESPACE_SEPARATOR)
+                while end != -1:
+                    prefixes.add(text[:end + 1])
+                    end = text.find(NAMESPACE_SEPARATOR, end + 1)
+    return prefixes
+
+
+def _size(body):
+    return sum(1 for ins in body if ins.op not in MARKER_OPS)
+
+
+def _is_propagatable(operand):
+    return type(operand) is Const and type(operand.value) in FOLDABLE_TYPES
+
+
+def inline_functions(code, live_on_exit=()):
+    """
+    Inline calls to small non-recursive functions.
+
+    Args:
+        code (list): List of Instruction objects
+        live_on_exit (iterable): Names read after the end of `code`
+
+    Returns:
+        tuple: (new list of Instruction objects, number of calls inlined)
+    """
+    return Inliner(code, live_on_exit).run()
+
+
+def propagate_interprocedural_constants(code, live_on_exit=()):
+    """
+    Push constant arguments into callees and constant results back into callers.
+
+    When every call to a function that cannot be called from anywhere
+    else passes the same literal for a parameter, and the body never
+    reassigns that parameter, the body starts with `param = literal` so
+    constant propagation can specialize it; the parameter list itself is
+    unchanged. When every return of a known function (falling off the end
+    included) gives the same literal, reads of the result of a call to it
+    are replaced by the literal. The calls are kept for their side
+    effects; dead code elimination drops their unused results.
+
+    Args:
+        code (list): List of Instruction objects
+        live_on_exit (iterable): Names read after the end of `code`
+
+    Returns:
+        tuple: (new list of Instruction objects, number of parameters and reads replaced)
+    """
+    graph = CallGraph(code, live_on_exit)
+    functions = graph.functions
+    changes = 0
+
+    calls = {}
+    for site in graph.sites:
+        calls.setdefault(site.callee, []).append(code[site.position])
+
+    # Constant arguments, inserted after each callee's parameter list
+    entries = {}
+    for callee, instructions in calls.items():
+        function = functions[callee]
+        if callee in graph.escaping or any(len(ins.arg2) != len(function.params)
+                                           for ins in instructions):
+            continue
+        body = code[function.body_start:function.end]
+        assigned = set()
+        read = set()
+        for ins in body:
+            assigned.update(block_defs(ins))
+            read.update(ins.uses())
+        for k, param in enumerate(function.params):
+            value = instructions[0].arg2[k]
+            if (not _is_propagatable(value) or param in assigned or param not in read
+                    or any(ins.arg2[k] != value for ins in instructions)):
+                continue
+            entries.setdefault(function.body_start, []).append(Instruction(COPY, param, value))
+
+    # Constant results, substituted for the single definition of each call's temp
+    definitions = Counter(var for ins in code for var in block_defs(ins) if is_temp(var))
+    results = {}
+    for callee, instructions in calls.items():
+        function = functions[callee]
+        body = code[function.body_start:function.end]
+        returned = [Const(None) if ins.arg1 is None else ins.arg1
+                    for ins in body if ins.op == RETURN]
+        if not body or body[-1].op not in (RETURN, GOTO):
+            returned.append(Const(None))
+        value = returned[0]
+        if not _is_propagatable(value) or any(other != value for other in returned):
+            continue
+        for ins in instructions:
+            if is_temp(ins.dest) and definitions[ins.dest] == 1:
+                results[ins.dest] = value
+
+    if not entries and not results:
+        return code, 0
+
+    out = []
+    for i, ins in enumerate(code):
+        inserted = entries.get(i)
+        if inserted:
+            out.extend(inserted)
+            changes += len(inserted)
+        if results:
+            operands = ins.operands()
+            if any(type(operand) is str and operand in results for operand in operands):
+                ins = ins.with_operands([results.get(operand, operand) if type(operand) is str
+                                         else operand for operand in operands])
+                changes += 1
+        out.append(ins)
+    return out, changes
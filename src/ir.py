@@ -0,0 +1,251 @@
+from sys import intern
+
+# Opcodes. Binary operators use their source symbol as the opcode.
+COPY = '='
+INDEX = '[]'
+GET_ATTR = 'getattr'
+SET_INDEX = 'setitem'
+SET_ATTR = 'setattr'
+BUILD_LIST = 'list'
+BUILD_TUPLE = 'tuple'
+CALL = 'call'
+METHOD_CALL = 'callm'
+IF_FALSE = 'iffalse'
+GOTO = 'goto'
+LABEL = 'label'
+FUNCTION = 'function'
+PARAMS = 'params'
+END_FUNCTION = 'endfunction'
+RETURN = 'return'
+PRINT = 'print'
+COMMENT = 'comment'
+UNSUPPORTED = 'unsupported'
+ERROR = 'error'
+
+ARITHMETIC_OPS = frozenset(['+', '-', '*', '/', '//', '%', '**', '<<', '>>', '&', '|', '^', '@'])
+COMPARISON_OPS = frozenset(['==', '!=', '<', '<=', '>', '>=', 'is', 'is not', 'in', 'not in'])
+BINARY_OPS = ARITHMETIC_OPS | COMPARISON_OPS
+
+# Unary opcode -> prefix used when printing
+UNARY_OPS = {
+    'neg': '-',
+    'pos': '+',
+    'not': 'not ',
+    'invert': '~',
+}
+
+BUILD_OPS = frozenset([BUILD_LIST, BUILD_TUPLE])
+
+# Separates a namespace from a temp or label number (f$t0, f$L0). It cannot
+# appear in a Python identifier, so namespaced names never clash with user names.
+NAMESPACE_SEPARATOR = '$'
+
+
+class Const:
+    """A literal operand. Names are plain interned strings, literals are wrapped."""
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return (isinstance(other, Const)
+                and type(self.value) is type(other.value)
+                and self.value == other.value)
+
+    def __hash__(self):
+        return hash((type(self.value), self.value))
+
+    def __str__(self):
+        if isinstance(self.value, str):
+            return f'"{self.value}"'
+        if isinstance(self.value, bytes):
+            return repr(self.value)
+        return str(self.value)
+
+    def __repr__(self):
+        return f"Const({self.value!r})"
+
+
+class Instruction:
+    """
+    A single quadruple (op, dest, arg1, arg2).
+
+    Field usage per opcode:
+        COPY            dest = arg1
+        binary op       dest = arg1 <op> arg2
+        unary op        dest = <op> arg1
+        INDEX           dest = arg1[arg2]
+        GET_ATTR        dest = arg1.<arg2>, arg2 is the attribute name
+        SET_INDEX       arg1[arg2[0]] = arg2[1]
+        SET_ATTR        arg1.<arg2[0]> = arg2[1], arg2[0] is the attribute name
+        BUILD_LIST      dest = [*arg1]
+        BUILD_TUPLE     dest = (*arg1,)
+        CALL            dest = call arg1(*arg2)
+        METHOD_CALL     dest = call arg2[0].arg1(*arg2[1:])
+        IF_FALSE        if arg1 == False goto arg2
+        GOTO / LABEL    arg1 is the label name
+        FUNCTION        arg1 is the function name
+        PARAMS          arg1 is a tuple of parameter names
+        RETURN          arg1 is the returned operand (or None)
+        PRINT           arg1 is a tuple of operands
+        COMMENT / ERROR arg1 is the message text
+        UNSUPPORTED     dest = <placeholder>, arg1 is the message text
+
+    Instructions are treated as immutable once emitted: passes build
+    replacement instructions instead of editing them in place, so lists
+    can be shared between the generator and the optimizer.
+    """
+    __slots__ = ('op', 'dest', 'arg1', 'arg2')
+
+    def __init__(self, op, dest=None, arg1=None, arg2=None):
+        self.op = op
+        self.dest = dest
+        self.arg1 = arg1
+        self.arg2 = arg2
+
+    def __eq__(self, other):
+        return (isinstance(other, Instruction)
+                and self.op == other.op
+                and self.dest == other.dest
+                and self.arg1 == other.arg1
+                and self.arg2 == other.arg2)
+
+    def __hash__(self):
+        return hash((self.op, self.dest, self.arg1, self.arg2))
+
+    def __str__(self):
+        return format_instruction(self)
+
+    def __repr__(self):
+        return f"Instruction({format_instruction(self)!r})"
+
+    def operands(self):
+        """Return the operands read by this instruction"""
+        op = self.op
+        if op in BINARY_OPS or op == INDEX:
+            return (self.arg1, self.arg2)
+        if op == COPY or op == IF_FALSE or op == GET_ATTR or op in UNARY_OPS:
+            return (self.arg1,)
+        if op == CALL or op == METHOD_CALL:
+            return self.arg2
+        if op == RETURN:
+            return (self.arg1,) if self.arg1 is not None else ()
+        if op == PRINT or op in BUILD_OPS:
+            return self.arg1
+        if op == SET_INDEX:
+            return (self.arg1, self.arg2[0], self.arg2[1])
+        if op == SET_ATTR:
+            return (self.arg1, self.arg2[1])
+        return ()
+
+    def uses(self):
+        """Return the variable names read by this instruction"""
+        return [operand for operand in self.operands() if type(operand) is str]
+
+    def with_operands(self, operands):
+        """Return a copy of this instruction reading the given operands instead"""
+        op = self.op
+        if op in BINARY_OPS or op == INDEX:
+            return Instruction(op, self.dest, operands[0], operands[1])
+        if op == COPY or op == IF_FALSE or op == GET_ATTR or op in UNARY_OPS:
+            return Instruction(op, self.dest, operands[0], self.arg2)
+        if op == CALL or op == METHOD_CALL:
+            return Instruction(op, self.dest, self.arg1, tuple(operands))
+        if op == RETURN:
+            return Instruction(op, None, operands[0] if operands else None)
+        if op == PRINT or op in BUILD_OPS:
+            return Instruction(op, self.dest, tuple(operands))
+        if op == SET_INDEX:
+            return Instruction(op, None, operands[0], (operands[1], operands[2]))
+        if op == SET_ATTR:
+            return Instruction(op, None, operands[0], (self.arg2[0], operands[1]))
+        return self
+
+
+def is_name(operand):
+    """Check whether an operand refers to a variable rather than a literal"""
+    return type(operand) is str
+
+
+def is_temp(name):
+    """Check whether a name is a generator temporary (t0, t1, ... or namespaced f$t0)"""
+    if type(name) is not str:
+        return False
+    if NAMESPACE_SEPARATOR in name:
+        name = name.rpartition(NAMESPACE_SEPARATOR)[2]
+    return len(name) > 1 and name[0] == 't' and name[1:].isdigit()
+
+
+def name(text):
+    """Intern a variable, temporary or label name"""
+    return intern(text)
+
+
+def format_instruction(instruction):
+    """Render an instruction in the textual three-address form"""
+    op = instruction.op
+    dest = instruction.dest
+    arg1 = instruction.arg1
+    arg2 = instruction.arg2
+
+    if op == COPY:
+        return f"{dest} = {arg1}"
+    if op in BINARY_OPS:
+        return f"{dest} = {arg1} {op} {arg2}"
+    if op in UNARY_OPS:
+        return f"{dest} = {UNARY_OPS[op]}{arg1}"
+    if op == INDEX:
+        return f"{dest} = {arg1}[{arg2}]"
+    if op == GET_ATTR:
+        return f"{dest} = {arg1}.{arg2}"
+    if op == SET_INDEX:
+        return f"{arg1}[{arg2[0]}] = {arg2[1]}"
+    if op == SET_ATTR:
+        return f"{arg1}.{arg2[0]} = {arg2[1]}"
+    if op == BUILD_LIST:
+        return f"{dest} = [{', '.join(map(str, arg1))}]"
+    if op == BUILD_TUPLE:
+        if len(arg1) == 1:
+            return f"{dest} = ({arg1[0]},)"
+        return f"{dest} = ({', '.join(map(str, arg1))})"
+    if op == CALL:
+        return f"{dest} = call {arg1}({', '.join(map(str, arg2))})"
+    if op == METHOD_CALL:
+        return f"{dest} = call {arg2[0]}.{arg1}({', '.join(map(str, arg2[1:]))})"
+    if op == IF_FALSE:
+        return f"if {arg1} == False goto {arg2}"
+    if op == GOTO:
+        return f"goto {arg1}"
+    if op == LABEL:
+        return f"{arg1}:"
+    if op == FUNCTION:
+        return f"function {arg1}:"
+    if op == PARAMS:
+        return f"  params: {', '.join(arg1)}"
+    if op == END_FUNCTION:
+        return "end function"
+    if op == RETURN:
+        return "return" if arg1 is None else f"return {arg1}"
+    if op == PRINT:
+        return f"print {', '.join(map(str, arg1))}"
+    if op == COMMENT:
+        return f"# {arg1}"
+    if op == UNSUPPORTED:
+        return f"{dest} = # {arg1}"
+    if op == ERROR:
+        return f"Error: {arg1}"
+    return f"# Unknown instruction: {op}"
+
+
+def format_code(code):
+    """
+    Render a list of instructions as text.
+
+    Args:
+        code (list): List of Instruction objects
+
+    Returns:
+        list: List of intermediate code lines
+    """
+    return [format_instruction(instruction) for instruction in code]
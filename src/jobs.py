@@ -0,0 +1,224 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MAX_WORKERS = 2
+DEFAULT_MAX_PENDING = 64
+DEFAULT_TTL_SECONDS = 300
+DEFAULT_TIMEOUT_SECONDS = 120
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+FINISHED_STATES = frozenset([DONE, FAILED, CANCELLED])
+
+
+class QueueFull(Exception):
+    """Raised by submit when max_pending jobs are already waiting or running"""
+
+
+class JobStopped(Exception):
+    """Raised by Job.update when the job was cancelled or ran out of time"""
+
+
+class Job:
+    """
+    One submitted compilation and what is known about it so far.
+
+    The function running the job reports progress through `update`, which
+    raises JobStopped once the job is cancelled or past its deadline, and
+    checks `stopped` at other points where it can stop cleanly. A thread
+    cannot be interrupted, so a job only ends at those points.
+    """
+
+    def __init__(self, job_id):
+        self.id = job_id
+        self.status = QUEUED
+        self.stage = None
+        self.partial = None
+        self.progress = None
+        self.result = None
+        self.error = None
+        self.created = time.monotonic()
+        self.finished = None
+        self.future = None
+        self.deadline = None
+        self._cancel = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def timed_out(self):
+        return self.deadline is not None and time.monotonic() > self.deadline
+
+    @property
+    def stopped(self):
+        return self.cancelled or self.timed_out
+
+    def update(self, stage, partial=None, progress=None):
+        """
+        Record the stage the job reached.
+
+        Args:
+            stage (str): Name of the stage now running
+            partial (dict): Results available so far, returned by polls
+            progress (callable): Returns extra status (e.g. passes run) when polled
+
+        Raises:
+            JobStopped: If the job was cancelled or is past its deadline
+        """
+        if self.stopped:
+            raise JobStopped(self.id)
+        self.stage = stage
+        if partial is not None:
+            self.partial = partial
+        self.progress = progress
+
+    def as_dict(self):
+        """JSON-serializable status for a poll"""
+        state = {'job_id': self.id, 'status': self.status, 'stage': self.stage}
+        if self.status == DONE:
+            state['result'] = self.result
+        elif self.status == FAILED:
+            state['error'] = self.error
+        elif self.partial is not None:
+            state['partial'] = self.partial
+        progress = self.progress
+        if self.status == RUNNING and progress is not None:
+            state['progress'] = progress()
+        return state
+
+
+class JobQueue:
+    """
+    Run compilations in the background on a bounded thread pool.
+
+    At most `max_pending` jobs may be queued or running; further submits
+    raise QueueFull so a burst of large requests cannot grow memory
+    without bound. A queued job is cancelled outright; a running one is
+    asked to stop and does so at its next check. A job still running
+    `timeout` seconds after it started fails at its next check.
+    Finished jobs are kept for `ttl` seconds after they finish and then
+    forgotten.
+
+    Jobs live in the memory of this process, so every request about a job
+    must reach the process that accepted it (see src.server).
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, max_pending=DEFAULT_MAX_PENDING,
+                 ttl=DEFAULT_TTL_SECONDS, timeout=DEFAULT_TIMEOUT_SECONDS):
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='compile-job')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args):
+        """
+        Queue `func(job, *args)`; its return value becomes the job's result.
+
+        Returns:
+            Job: The new job
+
+        Raises:
+            QueueFull: If max_pending jobs are unfinished
+        """
+        with self._lock:
+            self._expire()
+            pending = sum(1 for job in self._jobs.values() if job.status not in FINISHED_STATES)
+            if pending >= self.max_pending:
+                raise QueueFull(f"{pending} jobs are already pending")
+            job = Job(uuid.uuid4().hex)
+            self._jobs[job.id] = job
+            job.future = self._executor.submit(self._run, job, func, args)
+        return job
+
+    def complete(self, result):
+        """Register a job that is already done (e.g. answered from a cache)"""
+        with self._lock:
+            self._expire()
+            job = Job(uuid.uuid4().hex)
+            job.status = DONE
+            job.result = result
+            job.finished = time.monotonic()
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        """Return the job, or None if it is unknown or expired"""
+        with self._lock:
+            self._expire()
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """
+        Cancel a job.
+
+        Returns:
+            Job: The job, or None if it is unknown or expired
+        """
+        job = self.get(job_id)
+        if job is None or job.status in FINISHED_STATES:
+            return job
+        job._cancel.set()
+        if job.future.cancel():
+            self._finish(job, CANCELLED)
+        return job
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return counts
+
+    def _run(self, job, func, args):
+        if job.cancelled:
+            self._finish(job, CANCELLED)
+            return
+        job.deadline = time.monotonic() + self.timeout
+        job.status = RUNNING
+        try:
+            result = func(job, *args)
+        except JobStopped:
+            if job.cancelled:
+                self._finish(job, CANCELLED)
+            else:
+                job.error = f"job did not finish within {self.timeout:g} seconds"
+                self._finish(job, FAILED)
+            return
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            self._finish(job, FAILED)
+            return
+        if job.cancelled:
+            self._finish(job, CANCELLED)
+        else:
+            job.result = result
+            self._finish(job, DONE)
+
+    def _finish(self, job, status):
+        # Failed and cancelled jobs keep the stage they stopped in
+        if status == DONE:
+            job.stage = None
+        job.finished = time.monotonic()
+        job.partial = None
+        job.progress = None
+        job.status = status
+
+    def _expire(self):
+        """Drop finished jobs older than the TTL (caller holds the lock)"""
+        cutoff = time.monotonic() - self.ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished is not None and job.finished < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -0,0 +1,362 @@
+from src.cfg import build_cfg
+from src.ir import (
+    Const, BINARY_OPS, UNARY_OPS, BUILD_OPS, BUILD_LIST, BUILD_TUPLE, COPY, INDEX, GET_ATTR,
+    CALL, METHOD_CALL, PARAMS, FUNCTION, END_FUNCTION,
+)
+from src.value_numbering import SCALAR_TYPES, SCALAR_CALLS, rebound_names
+
+# Instructions that only compute their destination, though most of them may raise
+COMPUTE_OPS = BINARY_OPS | frozenset(UNARY_OPS) | BUILD_OPS | frozenset([COPY, INDEX, GET_ATTR])
+
+# Instructions that cannot raise whatever their operands hold
+SAFE_OPS = frozenset([COPY, BUILD_LIST, BUILD_TUPLE, 'is', 'is not', 'not'])
+
+# Operators that cannot raise on scalars (see scalar_names)
+SCALAR_SAFE_OPS = frozenset(['==', '!='])
+
+# Operators that cannot raise on integers
+INTEGER_SAFE_OPS = frozenset([
+    '+', '-', '*', '&', '|', '^', '<', '<=', '>', '>=', '==', '!=', 'neg', 'pos', 'invert',
+])
+
+# Operators that cannot raise on an integer and a nonzero, or non-negative, integer literal
+DIVISION_OPS = frozenset(['//', '%'])
+SHIFT_OPS = frozenset(['<<', '>>'])
+
+INTEGER_TYPES = frozenset([int, bool])
+
+# Builtin calls and operators whose result is an integer when their operands are
+INTEGER_CALLS = frozenset(['len', 'int', 'bool', 'ord'])
+INTEGER_OPS = (BINARY_OPS - frozenset(['/', '**'])) | frozenset(UNARY_OPS)
+
+# Module-level variables treated as program output
+OUTPUT_VARS = frozenset(['result'])
+
+CALL_OPS = frozenset([CALL, METHOD_CALL])
+
+
+class LivenessAnalysis:
+    """
+    Backward liveness over a ControlFlowGraph using integer bitsets.
+
+    Only names that are live across a block boundary (read in some block
+    before being written there) are numbered; temporaries that live and die
+    inside one block are tracked with a small local set during the block
+    walk and never enter the bitsets, which keeps them as small as the set
+    of user variables. Live-in/live-out are solved with a worklist that only
+    revisits predecessors of blocks whose live-in changed.
+
+    With `strong=True` the analysis computes strong liveness: a pure
+    instruction (see is_pure) only makes its operands live if its own
+    result is live. Solving that once gives dead code elimination its final
+    answer, without re-running the analysis after every removal.
+
+    Names read inside a function body but never assigned there are treated
+    as globals: they are live at every call and at every exit, since any
+    call may run the function that reads them. `live_on_exit` adds names
+    that code after this listing may read, for listings that are only one
+    piece of a module.
+    """
+
+    def __init__(self, cfg, strong=False, live_on_exit=()):
+        self.cfg = cfg
+        self.strong = strong
+        self.live_on_exit = frozenset(live_on_exit)
+        self.variables = []
+        self.index = {}
+        self.live_in = []
+        self.live_out = []
+        self.global_names = frozenset()
+        self._entries = []
+        self._analyze()
+
+    def mask(self, names):
+        """Return the bitset for the numbered variables among `names`"""
+        index = self.index
+        bits = 0
+        for var in names:
+            i = index.get(var)
+            if i is not None:
+                bits |= 1 << i
+        return bits
+
+    def names(self, bits):
+        """Return the variable names in a bitset"""
+        result = []
+        i = 0
+        while bits:
+            if bits & 1:
+                result.append(self.variables[i])
+            bits >>= 1
+            i += 1
+        return result
+
+    def is_live_out(self, block, var):
+        """Check whether `var` is live on exit from the given block index"""
+        i = self.index.get(var)
+        return i is not None and (self.live_out[block] >> i) & 1 == 1
+
+    def is_live_in(self, block, var):
+        """Check whether `var` is live on entry to the given block index"""
+        i = self.index.get(var)
+        return i is not None and (self.live_in[block] >> i) & 1 == 1
+
+    def walk(self, block, live, kept=None):
+        """
+        Apply a block's transfer function backwards from the bitset `live`.
+
+        Instructions that stay live are appended to `kept` (in reverse
+        order) when a list is given. Returns the live-in bitset.
+        """
+        local = set()
+        strong = self.strong
+        instructions = self.cfg.blocks[block].instructions
+        entries = self._entries[block]
+
+        for k in range(len(entries) - 1, -1, -1):
+            pure, def_bits, def_local, use_bits, use_local = entries[k]
+            if strong and pure:
+                if def_bits:
+                    if not live & def_bits:
+                        continue
+                elif def_local[0] not in local:
+                    continue
+            if def_bits:
+                live &= ~def_bits
+            for var in def_local:
+                local.discard(var)
+            live |= use_bits
+            local.update(use_local)
+            if kept is not None:
+                kept.append(instructions[k])
+        return live
+
+    def _collect_globals(self):
+        """Find names that some function reads without assigning"""
+        read = []
+        assigned = []
+        names = set(OUTPUT_VARS)
+        for block in self.cfg.blocks:
+            for ins in block.instructions:
+                op = ins.op
+                if op == FUNCTION:
+                    read.append(set())
+                    assigned.append(set())
+                elif op == END_FUNCTION and read:
+                    names.update(read.pop() - assigned.pop())
+                elif read:
+                    read[-1].update(block_uses(ins))
+                    if ins.dest is not None:
+                        assigned[-1].add(ins.dest)
+                    elif op == PARAMS:
+                        assigned[-1].update(ins.arg1)
+        self.global_names = frozenset(names)
+
+    def _analyze(self):
+        blocks = self.cfg.blocks
+        self._collect_globals()
+        global_names = self.global_names
+
+        # Number the names that are read in some block before being written there
+        uses = []
+        crossing = set(global_names)
+        crossing.update(self.live_on_exit)
+        for block in blocks:
+            upward = set()
+            block_reads = []
+            for ins in reversed(block.instructions):
+                for var in block_defs(ins):
+                    upward.discard(var)
+                read = block_uses(ins)
+                if ins.op in CALL_OPS:
+                    read = read + list(global_names)
+                upward.update(read)
+                block_reads.append(read)
+            block_reads.reverse()
+            uses.append(block_reads)
+            crossing.update(upward)
+
+        for var in crossing:
+            self.index[var] = len(self.variables)
+            self.variables.append(var)
+
+        # Names whose values are known to be scalars or integers, for is_pure
+        if self.strong:
+            code = [ins for block in blocks for ins in block.instructions]
+            rebound = rebound_names(code)
+            scalars = scalar_names(code, SCALAR_CALLS - rebound)
+            integers = scalar_names(code, INTEGER_CALLS - rebound, INTEGER_TYPES, INTEGER_OPS)
+
+        # Pre-split every instruction into numbered bits and block-local names
+        index = self.index
+        for block, block_reads in zip(blocks, uses):
+            entries = []
+            for ins, read in zip(block.instructions, block_reads):
+                defs = block_defs(ins)
+                def_bits = self.mask(defs)
+                def_local = tuple(var for var in defs if var not in index)
+                use_bits = self.mask(read)
+                use_local = tuple(var for var in read if var not in index)
+                pure = self.strong and is_pure(ins, scalars, integers)
+                entries.append((pure, def_bits, def_local, use_bits, use_local))
+            self._entries.append(entries)
+
+        count = len(blocks)
+        self.live_in = [0] * count
+        self.live_out = [0] * count
+        exit_mask = self.mask(global_names) | self.mask(self.live_on_exit)
+
+        # Seed in reverse listing order so most blocks see their successors first
+        worklist = list(range(count))
+        pending = [True] * count
+        while worklist:
+            b = worklist.pop()
+            pending[b] = False
+            block = blocks[b]
+
+            if block.successors:
+                out = 0
+                for succ in block.successors:
+                    out |= self.live_in[succ]
+            else:
+                out = exit_mask
+            self.live_out[b] = out
+
+            new_in = self.walk(b, out)
+            if new_in != self.live_in[b]:
+                self.live_in[b] = new_in
+                for pred in block.predecessors:
+                    if not pending[pred]:
+                        pending[pred] = True
+                        worklist.append(pred)
+
+
+def is_pure(ins, scalars=frozenset(), integers=frozenset()):
+    """
+    Whether an instruction only computes its destination and cannot raise.
+
+    Removing or moving an instruction that may raise would hide the error,
+    and nearly every operator raises on some operands ('x' + 1, 1 < 'x',
+    L[10], 1 // 0), so those count only when their operands are known to
+    be safe: scalars for == and !=, integers for arithmetic, and for `//`,
+    `%` and shifts also a nonzero or non-negative literal right operand.
+
+    Args:
+        ins (Instruction): Instruction to check
+        scalars (set): Names known to hold scalars (see scalar_names)
+        integers (set): Names known to hold integers
+    """
+    op = ins.op
+    if op in SAFE_OPS:
+        return ins.dest is not None
+    if op in INTEGER_SAFE_OPS and all(_holds(operand, integers, INTEGER_TYPES)
+                                      for operand in ins.operands()):
+        return True
+    if op in SCALAR_SAFE_OPS:
+        return all(_holds(operand, scalars, SCALAR_TYPES) or _holds(operand, integers, INTEGER_TYPES)
+                   for operand in ins.operands())
+    if op in DIVISION_OPS or op in SHIFT_OPS:
+        right = ins.arg2
+        if type(right) is not Const or type(right.value) not in INTEGER_TYPES:
+            return False
+        if right.value < 0 or (op in DIVISION_OPS and right.value == 0):
+            return False
+        return _holds(ins.arg1, integers, INTEGER_TYPES)
+    return False
+
+
+def _holds(operand, names, types):
+    """Whether an operand is a literal of one of `types` or one of `names`"""
+    if type(operand) is Const:
+        return type(operand.value) in types
+    return operand in names
+
+
+def scalar_names(code, scalar_calls, types=SCALAR_TYPES, ops=None):
+    """
+    Return the names every assignment of which gives an immutable scalar.
+
+    An assignment gives a scalar when it copies a scalar literal or name,
+    applies an operator to scalars only, or calls one of `scalar_calls`.
+    Parameters, names never assigned and anything else may hold a mutable
+    object, and so may every name computed from one.
+
+    With `types` and `ops`, return the names that only ever hold values of
+    those types instead, counting only the operators in `ops` as giving
+    such a value when their operands are.
+    """
+    dependents = {}
+    defined = set()
+    mutable = set()
+    for ins in code:
+        op = ins.op
+        dest = ins.dest
+        if dest is not None and (op == COPY or ((op in BINARY_OPS or op in UNARY_OPS)
+                                                and (ops is None or op in ops))):
+            defined.add(dest)
+            for operand in ins.operands():
+                if type(operand) is Const:
+                    if type(operand.value) not in types:
+                        mutable.add(dest)
+                elif type(operand) is str:
+                    dependents.setdefault(operand, []).append(dest)
+        elif dest is not None and op == CALL and ins.arg1 in scalar_calls:
+            defined.add(dest)
+        else:
+            mutable.update(block_defs(ins))
+
+    mutable.update(var for var in dependents if var not in defined)
+    stack = list(mutable)
+    while stack:
+        for dependent in dependents.get(stack.pop(), ()):
+            if dependent not in mutable:
+                mutable.add(dependent)
+                stack.append(dependent)
+    return defined - mutable
+
+
+def block_defs(ins):
+    """Return the variables written by an instruction"""
+    if ins.dest is not None:
+        return (ins.dest,)
+    if ins.op == PARAMS:
+        return ins.arg1
+    return ()
+
+
+def block_uses(ins):
+    """Return the variables read by an instruction, including the name a call goes through"""
+    read = ins.uses()
+    if ins.op == CALL and type(ins.arg1) is str:
+        read.append(ins.arg1)
+    return read
+
+
+def eliminate_dead_code(code, live_on_exit=()):
+    """
+    Remove pure instructions whose result is never read afterwards.
+
+    Strong liveness is solved once over the CFG, then each block is swept
+    backwards from its live-out set. Chains of dead instructions, including
+    ones that only feed each other around a loop, go in a single pass.
+
+    Args:
+        code (list): List of Instruction objects
+        live_on_exit (iterable): Names still needed after the end of `code`
+
+    Returns:
+        tuple: (new instruction list, number of instructions removed)
+    """
+    cfg = build_cfg(code)
+    liveness = LivenessAnalysis(cfg, strong=True, live_on_exit=live_on_exit)
+    removed = 0
+
+    for block in cfg.blocks:
+        kept = []
+        liveness.walk(block.index, liveness.live_out[block.index], kept)
+        if len(kept) != len(block.instructions):
+            removed += len(block.instructions) - len(kept)
+            kept.reverse()
+            block.instructions = kept
+
+    return cfg.to_code(), removed
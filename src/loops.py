@@ -0,0 +1,399 @@
+from collections import Counter
+
+from src.cfg import build_cfg
+from src.liveness import (
+    LivenessAnalysis, COMPUTE_OPS, INTEGER_TYPES, INTEGER_CALLS, INTEGER_OPS, block_defs,
+    is_pure, scalar_names,
+)
+from src.value_numbering import (
+    PURE_CALLS, MEMORY_OPS, SCALAR_TYPES, SCALAR_CALLS, rebound_names,
+)
+from src.ir import (
+    Instruction, Const, name, is_temp, NAMESPACE_SEPARATOR, COPY, BUILD_LIST,
+    CALL, METHOD_CALL, SET_INDEX, SET_ATTR, LABEL, GOTO, IF_FALSE,
+)
+
+# Builtin calls that never write through their arguments
+HARMLESS_CALLS = PURE_CALLS | frozenset(['print'])
+
+
+
+class Loop:
+    """A natural loop: its header block and the set of block indices in its body"""
+    __slots__ = ('header', 'blocks')
+
+    def __init__(self, header, blocks):
+        self.header = header
+        self.blocks = blocks
+
+    def __repr__(self):
+        return f"Loop(header={self.header}, blocks={sorted(self.blocks)})"
+
+
+def find_loops(cfg):
+    """
+    Find the natural loops of a control-flow graph, innermost first.
+
+    An edge b -> h is a back edge when h dominates b. The loop of that edge
+    is h plus every block that reaches b without going through h. Back
+    edges to the same header share one loop.
+
+    Args:
+        cfg (ControlFlowGraph): Graph to search
+
+    Returns:
+        list: Loop objects ordered from smallest to largest body
+    """
+    bodies = {}
+    for block in cfg.blocks:
+        for succ in block.successors:
+            if not cfg.dominates(succ, block.index):
+                continue
+            body = bodies.setdefault(succ, {succ})
+            stack = [block.index]
+            while stack:
+                node = stack.pop()
+                if node not in body and cfg.dominates(succ, node):
+                    body.add(node)
+                    stack.extend(cfg.blocks[node].predecessors)
+
+    loops = [Loop(header, body) for header, body in bodies.items()]
+    loops.sort(key=lambda loop: len(loop.blocks))
+    return loops
+
+
+class TempAllocator:
+    """Hand out temporaries numbered after the highest one already in the code"""
+
+    def __init__(self, code):
+        self.next = {}
+        for ins in code:
+            dest = ins.dest
+            if is_temp(dest):
+                prefix, number = _split_temp(dest)
+                if number >= self.next.get(prefix, 0):
+                    self.next[prefix] = number + 1
+
+    def new(self, prefix=''):
+        number = self.next.get(prefix, 0)
+        self.next[prefix] = number + 1
+        return name(f"{prefix}t{number}")
+
+
+class LoopOptimizer:
+    """
+    Loop-invariant code motion and strength reduction over natural loops.
+
+    Each loop whose header is only entered by falling through from one
+    block outside the loop gets a preheader: instructions placed right
+    before the header's label, which run once on the way into the loop.
+
+    An instruction is invariant when every operand is a literal, a name the
+    loop never assigns, or the result of an instruction already hoisted.
+    A temporary that is assigned once in the loop, not live on entry to the
+    header and not live where the loop exits is moved as a whole; anything
+    else is computed into a fresh temporary in the preheader and replaced by
+    a copy. Reads through references (indexing, attributes, `len`, ...) are
+    only hoisted from loops that contain no stores or impure calls, and
+    only from blocks that run on every trip. So is anything that may
+    raise: from a block that may not run, for instance the body of a loop
+    that runs zero times, only instructions that cannot raise (see
+    liveness.is_pure) are moved. Loops with stores or impure calls keep every
+    operator whose operands may be mutable objects (see scalar_names), as
+    `L == M` or `L * 2` read the objects the loop may change.
+
+    Strength reduction finds basic induction variables, names whose only
+    assignment in the loop is `i = i + c` and which start from an integer
+    literal, and replaces `i * k` with a temporary that is initialized in
+    the preheader and advanced by `c * k` right after `i` is.
+    """
+
+    def __init__(self, code):
+        self.code = code
+        self.cfg = build_cfg(code)
+        self.liveness = None
+        self.pure_calls = None
+        self.scalars = None
+        self.integers = None
+        self.harmless_calls = None
+        self.temps = None
+        self.preheaders = {}
+        self.entries = {}
+        self.rewrites = {}
+        self.hoisted = 0
+        self.reduced = 0
+
+    def run(self):
+        """
+        Optimize every loop, innermost first.
+
+        Returns:
+            list: The rewritten instruction list
+        """
+        loops = find_loops(self.cfg)
+        if not loops:
+            return self.code
+
+        self.liveness = LivenessAnalysis(self.cfg)
+        rebound = rebound_names(self.code)
+        self.pure_calls = PURE_CALLS - rebound
+        self.harmless_calls = HARMLESS_CALLS - rebound
+        self.scalars = scalar_names(self.code, SCALAR_CALLS - rebound)
+        self.integers = scalar_names(self.code, INTEGER_CALLS - rebound, INTEGER_TYPES, INTEGER_OPS)
+        self.temps = TempAllocator(self.code)
+
+        for loop in loops:
+            entry = self._entry(loop)
+            if entry is not False:
+                self._optimize(loop, entry)
+
+        if not self.preheaders and not self.rewrites:
+            return self.code
+
+        code = []
+        for block in self.cfg.blocks:
+            for ins in self.preheaders.get(block.index, ()):
+                if ins is not None:
+                    code.append(ins)
+            for i, ins in enumerate(block.instructions):
+                replacement = self.rewrites.get((block.index, i))
+                if replacement is None:
+                    code.append(ins)
+                else:
+                    code.extend(replacement)
+        return code
+
+    def _entry(self, loop):
+        """
+        Return the block that falls through into the loop header.
+
+        Returns None when the header is the start of the code, and False
+        when the loop cannot get a preheader (it is jumped into, or entered
+        from several places).
+        """
+        header = self.cfg.blocks[loop.header]
+        label = header.label
+        outside = [p for p in header.predecessors if p not in loop.blocks]
+        if len(outside) > 1 or label is None:
+            return False
+        for pred in outside:
+            last = self.cfg.blocks[pred].terminator
+            if ((last.op == GOTO and last.arg1 == label)
+                    or (last.op == IF_FALSE and last.arg2 == label)):
+                return False
+        return outside[0] if outside else None
+
+    def _optimize(self, loop, entry):
+        blocks = self.cfg.blocks
+        positions = []
+        candidates = []
+        current = []
+        for b in sorted(loop.blocks):
+            # Code inner loops already hoisted sits in their preheaders and may
+            # move further out; code they rewrote stays where it is
+            inner = self.preheaders.get(b)
+            if inner is not None:
+                inner_entry = self.entries[b]
+                for j, ins in enumerate(inner):
+                    if ins is not None:
+                        candidates.append(((b, j, 'preheader'), inner_entry, ins))
+                        current.append(ins)
+            for i, ins in enumerate(blocks[b].instructions):
+                replacement = self.rewrites.get((b, i))
+                if replacement is None:
+                    positions.append((b, i, ins))
+                    candidates.append(((b, i), b, ins))
+                    current.append(ins)
+                else:
+                    current.extend(replacement)
+
+        defs = Counter()
+        clobbers = False
+        for ins in current:
+            defs.update(block_defs(ins))
+            op = ins.op
+            if (op == METHOD_CALL or op == SET_INDEX or op == SET_ATTR
+                    or (op == CALL and ins.arg1 not in self.harmless_calls)):
+                clobbers = True
+
+        exits = set()
+        exiting = []
+        for b in loop.blocks:
+            outside = [s for s in blocks[b].successors if s not in loop.blocks]
+            if outside:
+                exits.update(outside)
+                exiting.append(b)
+        always = {b for b in loop.blocks
+                  if all(self.cfg.dominates(b, e) for e in exiting)}
+
+        prefix = _namespace(blocks[loop.header].label)
+        preheader = []
+        self._hoist(loop, candidates, defs, clobbers, exits, always, prefix, preheader)
+        self._reduce_strength(positions, defs, entry, prefix, preheader)
+        if preheader:
+            self.preheaders[loop.header] = preheader
+            self.entries[loop.header] = entry
+
+    def _hoist(self, loop, candidates, defs, clobbers, exits, always, prefix, preheader):
+        """Move invariant computations into the preheader"""
+        invariant = set()
+        moved = set()
+
+        def is_invariant(operand):
+            return type(operand) is not str or defs[operand] == 0 or operand in invariant
+
+        changed = True
+        while changed:
+            changed = False
+            for key, block, ins in candidates:
+                if key in moved or not self._hoistable(ins, clobbers, block in always):
+                    continue
+                if not all(is_invariant(operand) for operand in ins.operands()):
+                    continue
+
+                dest = ins.dest
+                movable = (is_temp(dest) and defs[dest] == 1
+                           and not self.liveness.is_live_in(loop.header, dest)
+                           and not any(self.liveness.is_live_in(e, dest) for e in exits))
+                if movable:
+                    preheader.append(ins)
+                    invariant.add(dest)
+                    if len(key) == 3:
+                        self.preheaders[key[0]][key[1]] = None
+                    else:
+                        self.rewrites[key] = []
+                elif len(key) == 2:
+                    temp = self.temps.new(prefix)
+                    preheader.append(Instruction(ins.op, temp, ins.arg1, ins.arg2))
+                    self.rewrites[key] = [Instruction(COPY, dest, temp)]
+                else:
+                    continue
+                moved.add(key)
+                self.hoisted += 1
+                changed = True
+
+    def _hoistable(self, ins, clobbers, always):
+        op = ins.op
+        if ins.dest is None or op == COPY or op == BUILD_LIST:
+            return False
+        if op == CALL:
+            if ins.arg1 not in self.pure_calls:
+                return False
+        elif op not in COMPUTE_OPS:
+            return False
+        if op in MEMORY_OPS:
+            return always and not clobbers
+        if clobbers and not all(self._is_scalar(operand) for operand in ins.operands()):
+            return False
+        return always or is_pure(ins, self.scalars, self.integers)
+
+    def _is_scalar(self, operand):
+        if type(operand) is Const:
+            return type(operand.value) in SCALAR_TYPES
+        return operand in self.scalars
+
+    def _reduce_strength(self, positions, defs, entry, prefix, preheader):
+        """Replace multiplications of induction variables by running sums"""
+        steps = {}
+        for b, i, ins in positions:
+            step = _induction_step(ins)
+            if step is not None and defs[ins.dest] == 1 and (b, i) not in self.rewrites:
+                if self._starts_from_int(ins.dest, entry):
+                    steps[ins.dest] = (step, (b, i), ins)
+        if not steps:
+            return
+
+        reduced = {}
+        for b, i, ins in positions:
+            if ins.op != '*' or (b, i) in self.rewrites or ins.dest in steps:
+                continue
+            if ins.arg1 in steps and _is_int_const(ins.arg2):
+                var, factor = ins.arg1, ins.arg2.value
+            elif ins.arg2 in steps and _is_int_const(ins.arg1):
+                var, factor = ins.arg2, ins.arg1.value
+            else:
+                continue
+
+            temp = reduced.get((var, factor))
+            if temp is None:
+                temp = self.temps.new(prefix)
+                reduced[(var, factor)] = temp
+                step, position, update = steps[var]
+                preheader.append(Instruction('*', temp, var, Const(factor)))
+                advance = Instruction('+', temp, temp, Const(step * factor))
+                self.rewrites.setdefault(position, [update]).append(advance)
+            self.rewrites[(b, i)] = [Instruction(COPY, ins.dest, temp)]
+            self.reduced += 1
+
+    def _starts_from_int(self, var, entry):
+        """Check that the last assignment to `var` before the loop is an integer literal"""
+        if entry is None:
+            return False
+        for ins in reversed(self.cfg.blocks[entry].instructions):
+            if ins.dest == var:
+                return ins.op == COPY and _is_int_const(ins.arg1)
+        return False
+
+
+def _induction_step(ins):
+    """Return c for `i = i + c` or `i = i - c` with an integer literal c, else None"""
+    dest = ins.dest
+    if ins.op == '+':
+        if ins.arg1 == dest and _is_int_const(ins.arg2):
+            return ins.arg2.value
+        if ins.arg2 == dest and _is_int_const(ins.arg1):
+            return ins.arg1.value
+    elif ins.op == '-' and ins.arg1 == dest and _is_int_const(ins.arg2):
+        return -ins.arg2.value
+    return None
+
+
+def _is_int_const(operand):
+    return type(operand) is Const and type(operand.value) is int
+
+
+def _namespace(label):
+    """Return the namespace prefix of a label (`f$` for `f$L0`, '' for `L0`)"""
+    if label and NAMESPACE_SEPARATOR in label:
+        return label[:label.rindex(NAMESPACE_SEPARATOR) + 1]
+    return ''
+
+
+def _split_temp(temp):
+    prefix = _namespace(temp)
+    return prefix, int(temp[len(prefix) + 1:])
+
+
+def has_back_jumps(code):
+    """
+    Check whether some jump goes to a label at or before it.
+
+    Every other edge of the CFG leads further down the listing, and a
+    cycle needs at least one edge that does not, so without such a jump
+    the code has no loops.
+    """
+    seen = set()
+    for ins in code:
+        op = ins.op
+        if op == LABEL:
+            seen.add(ins.arg1)
+        elif (op == GOTO and ins.arg1 in seen) or (op == IF_FALSE and ins.arg2 in seen):
+            return True
+    return False
+
+
+def optimize_loops(code):
+    """
+    Hoist loop-invariant code and strength-reduce induction variables.
+
+    Args:
+        code (list): List of Instruction objects
+
+    Returns:
+        tuple: (new instruction list, number of instructions hoisted or reduced)
+    """
+    if not has_back_jumps(code):
+        return code, 0
+    optimizer = LoopOptimizer(code)
+    new_code = optimizer.run()
+    return new_code, optimizer.hoisted + optimizer.reduced
@@ -0,0 +1,214 @@
+from src.regalloc import allocate_registers, DEFAULT_REGISTERS
+from src.ir import (
+    Const, COPY, INDEX, GET_ATTR, SET_INDEX, SET_ATTR, BUILD_LIST, BUILD_TUPLE, CALL,
+    METHOD_CALL, IF_FALSE, GOTO, LABEL, FUNCTION, PARAMS, END_FUNCTION, RETURN, PRINT,
+    COMMENT, UNSUPPORTED, ERROR, BINARY_OPS, UNARY_OPS,
+)
+
+# The target is a load/store pseudo-assembly. Operands are registers (r0, r1, ...
+# allocated, s0-s2 scratch for spill reloads), immediates (#5, #"text") or, for
+# call targets, symbols (@print). Memory is only reached through
+#
+#   load rD, [fp+N] / store [fp+N], rS      spill slot N of the current frame
+#   ldg rD, @name / stg @name, rS           module variable `name`
+#
+# Arguments are passed with `arg` before call/callm/list/tuple/print. Registers
+# are callee-saved: a function's prologue saves the ones it uses, `ret` restores
+# them, so values in registers survive calls.
+SCRATCH_REGISTERS = ('s0', 's1', 's2')
+
+# Binary opcode -> mnemonic
+BINARY_MNEMONICS = {
+    '+': 'add', '-': 'sub', '*': 'mul', '/': 'div', '//': 'idiv', '%': 'mod', '**': 'pow',
+    '<<': 'shl', '>>': 'shr', '&': 'and', '|': 'or', '^': 'xor', '@': 'matmul',
+    '==': 'eq', '!=': 'ne', '<': 'lt', '<=': 'le', '>': 'gt', '>=': 'ge',
+    'is': 'is', 'is not': 'isnot', 'in': 'in', 'not in': 'notin',
+}
+
+INDENT = '  '
+
+
+class Lowering:
+    """
+    Translate an allocated listing into pseudo-assembly.
+
+    Every region becomes its own section (`main` for the module body, then
+    one per function in listing order), so module code no longer jumps over
+    function bodies. Reads of spilled variables load them into scratch
+    registers and writes to them go through s0 and a store; these are the
+    spill loads and stores counted in stats().
+    """
+
+    def __init__(self, allocation):
+        self.allocation = allocation
+        self.sections = [[] for _ in allocation.regions]
+        self.spill_loads = 0
+        self.spill_stores = 0
+        self.region = None
+        self.out = None
+
+    def lower(self):
+        """Return the target listing as a list of lines"""
+        allocation = self.allocation
+        module = allocation.regions[0]
+        self.sections[0].extend(['main:', f"{INDENT}enter {module.stack_slots}"])
+        for ins, owner in zip(allocation.code, allocation.instruction_regions):
+            self.region = allocation.regions[owner]
+            self.out = self.sections[owner]
+            self._lower(ins)
+        self.sections[0].append(f"{INDENT}halt")
+
+        lines = []
+        for section in self.sections:
+            lines.extend(section)
+        return lines
+
+    def stats(self):
+        """Allocation statistics plus the spill code inserted"""
+        stats = self.allocation.stats()
+        stats['spill_loads'] = self.spill_loads
+        stats['spill_stores'] = self.spill_stores
+        return stats
+
+    def _emit(self, text):
+        self.out.append(INDENT + text)
+
+    def _read(self, operand, scratch=0):
+        """Return an operand's register or immediate, loading it into a scratch register if needed"""
+        if isinstance(operand, Const):
+            return f"#{operand}"
+        interval = self.region.location(operand)
+        if interval is not None and interval.register is not None:
+            return interval.register
+        register = SCRATCH_REGISTERS[scratch]
+        if interval is not None:
+            self._emit(f"load {register}, [fp+{interval.slot}]")
+            self.spill_loads += 1
+        else:
+            self._emit(f"ldg {register}, @{operand}")
+        return register
+
+    def _target(self, name):
+        """Return the register an instruction writing `name` should use"""
+        interval = self.region.location(name)
+        if interval is not None and interval.register is not None:
+            return interval.register
+        return SCRATCH_REGISTERS[0]
+
+    def _store(self, name, register):
+        """Write `register` back to `name` when it is not kept in a register"""
+        interval = self.region.location(name)
+        if interval is None:
+            self._emit(f"stg @{name}, {register}")
+        elif interval.register is None:
+            self._emit(f"store [fp+{interval.slot}], {register}")
+            self.spill_stores += 1
+
+    def _define(self, name, mnemonic, *operands):
+        """Emit an instruction writing `name`, then store the result if it lives in memory"""
+        register = self._target(name)
+        self._emit(f"{mnemonic} {', '.join((register,) + operands)}")
+        self._store(name, register)
+
+    def _arguments(self, operands):
+        for operand in operands:
+            self._emit(f"arg {self._read(operand)}")
+        return len(operands)
+
+    def _callee(self, name):
+        """Calls to names the region keeps in registers go through the register, others to the symbol"""
+        if self.region.location(name) is not None:
+            return self._read(name)
+        return f"@{name}"
+
+    def _lower(self, ins):
+        op = ins.op
+        dest = ins.dest
+
+        if op == COPY:
+            source = self._read(ins.arg1)
+            register = self._target(dest)
+            if register == SCRATCH_REGISTERS[0] and not source.startswith('#'):
+                # Store straight from the source instead of copying it to s0 first
+                register = source
+            elif register != source:
+                self._emit(f"mov {register}, {source}")
+            self._store(dest, register)
+        elif op in BINARY_OPS:
+            left = self._read(ins.arg1, 0)
+            right = self._read(ins.arg2, 1)
+            self._define(dest, BINARY_MNEMONICS[op], left, right)
+        elif op in UNARY_OPS:
+            self._define(dest, op, self._read(ins.arg1))
+        elif op == INDEX:
+            container = self._read(ins.arg1, 0)
+            index = self._read(ins.arg2, 1)
+            self._define(dest, 'index', container, index)
+        elif op == GET_ATTR:
+            self._define(dest, 'getattr', self._read(ins.arg1), f".{ins.arg2}")
+        elif op == SET_INDEX:
+            container = self._read(ins.arg1, 0)
+            index = self._read(ins.arg2[0], 1)
+            value = self._read(ins.arg2[1], 2)
+            self._emit(f"setitem {container}, {index}, {value}")
+        elif op == SET_ATTR:
+            obj = self._read(ins.arg1, 0)
+            value = self._read(ins.arg2[1], 1)
+            self._emit(f"setattr {obj}, .{ins.arg2[0]}, {value}")
+        elif op == BUILD_LIST or op == BUILD_TUPLE:
+            count = self._arguments(ins.arg1)
+            self._define(dest, op, str(count))
+        elif op == CALL:
+            count = self._arguments(ins.arg2)
+            self._define(dest, 'call', self._callee(ins.arg1), str(count))
+        elif op == METHOD_CALL:
+            count = self._arguments(ins.arg2[1:])
+            obj = self._read(ins.arg2[0])
+            self._define(dest, 'callm', obj, f".{ins.arg1}", str(count))
+        elif op == IF_FALSE:
+            self._emit(f"jf {self._read(ins.arg1)}, {ins.arg2}")
+        elif op == GOTO:
+            self._emit(f"jmp {ins.arg1}")
+        elif op == LABEL:
+            self.out.append(f"{ins.arg1}:")
+        elif op == FUNCTION:
+            self.out.append(f"{ins.arg1}:")
+            self._emit(f"enter {self.region.stack_slots}")
+            saved = sorted({interval.register for interval in self.region.intervals.values()
+                            if interval.register is not None}, key=lambda r: int(r[1:]))
+            if saved:
+                self._emit(f"save {', '.join(saved)}")
+        elif op == PARAMS:
+            for i, param in enumerate(ins.arg1):
+                self._define(param, 'param', str(i))
+        elif op == RETURN:
+            self._emit("ret" if ins.arg1 is None else f"ret {self._read(ins.arg1)}")
+        elif op == END_FUNCTION:
+            if not (self.out and self.out[-1].startswith(INDENT + 'ret')):
+                self._emit("ret")
+        elif op == PRINT:
+            self._emit(f"print {self._arguments(ins.arg1)}")
+        elif op == UNSUPPORTED:
+            self._emit(f"; {ins.arg1}")
+            self._define(dest, 'undef')
+        elif op == COMMENT:
+            self._emit(f"; {ins.arg1}")
+        elif op == ERROR:
+            self._emit(f"; Error: {ins.arg1}")
+        else:
+            self._emit(f"; Unknown instruction: {op}")
+
+
+def lower_to_assembly(code, registers=DEFAULT_REGISTERS):
+    """
+    Allocate registers for a listing and lower it to pseudo-assembly.
+
+    Args:
+        code (list): List of Instruction objects
+        registers (int): Number of allocatable registers
+
+    Returns:
+        tuple: (list of target lines, dict of register pressure and spill statistics)
+    """
+    lowering = Lowering(allocate_registers(code, registers))
+    return lowering.lower(), lowering.stats()
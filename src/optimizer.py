@@ -1,218 +1,320 @@
+from src.cfg import build_cfg
+from src.liveness import eliminate_dead_code
+from src.value_numbering import number_values
+from src.loops import optimize_loops
+from src.ssa import propagate_constants
+from src.forwarding import forward_temporaries
+from src.interprocedural import inline_functions, propagate_interprocedural_constants
+from src.parallel import ParallelPassManager
+from src.folding import fold_instruction, FOLDABLE_TYPES
+from src.ir import (
+    Instruction, Const, is_temp, COPY, COMMENT, LABEL, FUNCTION,
+    END_FUNCTION, GOTO, IF_FALSE,
+)
+
+# Instructions where control from other paths can join
+JOIN_OPS = frozenset([LABEL, FUNCTION, END_FUNCTION])
+
+# Technique name -> method implementing it. Every pass returns whether it changed the code.
+PASSES = {
+    'remove_comments': '_remove_comments',
+    'constant_folding': '_constant_folding',
+    'constant_propagation': '_constant_propagation',
+    'interprocedural_constant_propagation': '_interprocedural_constant_propagation',
+    'inlining': '_inline_functions',
+    'unreachable_code_elimination': '_unreachable_code_elimination',
+    'common_subexpression_elimination': '_common_subexpression_elimination',
+    'dead_code_elimination': '_dead_code_elimination',
+    'combine_assignments': '_combine_consecutive_assignments',
+    'loop_optimization': '_loop_optimization',
+}
+
+# Passes StreamingOptimizer can apply while code is still being generated
+STREAMING_PASSES = frozenset(['remove_comments', 'constant_folding', 'constant_propagation'])
+
+# Order used by optimize(); the pass manager repeats it until nothing changes
+DEFAULT_PIPELINE = [
+    'remove_comments',
+    'constant_folding',
+    'constant_propagation',
+    'interprocedural_constant_propagation',
+    'inlining',
+    'unreachable_code_elimination',
+    'common_subexpression_elimination',
+    'dead_code_elimination',
+    'combine_assignments',
+    'loop_optimization',
+]
+
+
 class CodeOptimizer:
-    def __init__(self):
+    def __init__(self, executor=None):
+        # Process pool the functions of large modules are optimized on, see src.parallel
+        self.executor = executor
+        self.reset()
+
+    def reset(self):
+        """Forget the previous program so the optimizer can be reused"""
         self.code = []
-        self.variable_values = {}
-        self.used_vars = set()
-        self.defined_vars = set()
+        self.pass_stats = []
+        # Names read after the end of self.code, when it is only part of a module
+        self.live_on_exit = ()
 
-    def optimize(self, intermediate_code):
+    def optimize(self, intermediate_code, pipeline=None):
         """
         Apply optimization techniques to the intermediate code.
         
+        Large modules are optimized one function at a time, on
+        self.executor when there is one (see ParallelPassManager).
+        
         Args:
-            intermediate_code (list): List of intermediate code instructions
+            intermediate_code (list): List of Instruction objects
+            pipeline (list): Technique names to run, defaults to DEFAULT_PIPELINE
             
         Returns:
             list: Optimized intermediate code
         """
-        self.code = intermediate_code.copy()
-        
-        # Apply multiple optimization passes
-        self._remove_comments()
-        self._constant_folding()
-        self._constant_propagation()
-        self._dead_code_elimination()
-        self._combine_consecutive_assignments()
-        
+        manager = ParallelPassManager(pipeline or DEFAULT_PIPELINE, self, self.executor)
+        manager.run(intermediate_code)
+        self.pass_stats = manager.report()
         return self.code
 
+    def run_pass(self, technique):
+        """
+        Run one pass over self.code in place.
+        
+        Args:
+            technique (str): Name of the optimization technique to apply
+            
+        Returns:
+            bool: Whether the pass changed the code
+        """
+        method = PASSES.get(technique)
+        if method is None:
+            return False
+        return bool(getattr(self, method)())
+
     def optimize_with_technique(self, intermediate_code, technique):
         """
         Apply a specific optimization technique to the intermediate code.
         
         Args:
-            intermediate_code (list): List of intermediate code instructions
+            intermediate_code (list): List of Instruction objects
             technique (str): Name of the optimization technique to apply
             
         Returns:
             list: Optimized intermediate code after applying the specific technique
         """
-        self.code = intermediate_code.copy()
+        self.code = list(intermediate_code)
         
         # Apply the specified optimization technique
-        if technique == 'constant_folding':
-            self._constant_folding()
-        elif technique == 'constant_propagation':
-            self._constant_propagation()
-        elif technique == 'dead_code_elimination':
-            self._analyze_variable_usage()
-            self._dead_code_elimination()
-        elif technique == 'combine_assignments':
-            self._combine_consecutive_assignments()
-        elif technique == 'remove_comments':
-            self._remove_comments()
+        self.run_pass(technique)
         
         return self.code
     
     def _remove_comments(self):
         """Remove comment lines from the code"""
-        self.code = [line for line in self.code if not line.strip().startswith('#')]
+        before = len(self.code)
+        self.code = [ins for ins in self.code if ins.op != COMMENT]
+        return len(self.code) != before
     
     def _constant_folding(self):
-        """Apply constant folding optimization"""
-        for i in range(len(self.code)):
-            line = self.code[i]
-            
-            # Look for arithmetic operations with constants
-            if '=' in line and any(op in line.split('=')[1] for op in ['+', '-', '*', '/', '%']):
-                parts = line.split('=', 1)
-                result_var = parts[0].strip()
-                expr = parts[1].strip()
-                
-                try:
-                    # Try to evaluate the expression if it contains only constants
-                    if all(token.isdigit() or token in ['+', '-', '*', '/', '%', ' '] 
-                           for token in expr.split()):
-                        # Replace multiple spaces with a single space
-                        expr = ' '.join(expr.split())
-                        # Evaluate the expression
-                        result = eval(expr)
-                        self.code[i] = f"{result_var} = {result}"
-                except:
-                    # If evaluation fails, keep the original line
-                    pass
+        """
+        Apply constant folding optimization.
+        
+        Operators are evaluated with the table in src.folding, never eval().
+        Folded temporaries are substituted into the instructions that read
+        them during the same scan, so a chain like `t0 = 2 * 3; t1 = t0 + 1`
+        folds completely in one pass. User variables are left to constant
+        propagation.
+        """
+        temps = ConstantPropagator(temps_only=True)
+        code = self.code
+        changed = False
+        
+        for i in range(len(code)):
+            ins = code[i]
+            folded = fold_instruction(temps.substitute(ins))
+            if folded is not ins:
+                code[i] = folded
+                changed = True
+            temps.record(folded)
+        
+        return changed
     
     def _constant_propagation(self):
-        """Apply constant propagation optimization"""
-        # First pass: identify constants
-        constants = {}
-        for line in self.code:
-            if '=' in line:
-                parts = line.split('=', 1)
-                var = parts[0].strip()
-                value = parts[1].strip()
-                
-                # Check if the right side is a constant
-                try:
-                    if value.isdigit() or (value.startswith('"') and value.endswith('"')):
-                        constants[var] = value
-                except:
-                    pass
+        """
+        Apply constant propagation optimization.
         
-        # Second pass: propagate constants
-        for i in range(len(self.code)):
-            line = self.code[i]
-            
-            # Skip lines that define constants
-            if '=' in line:
-                parts = line.split('=', 1)
-                var = parts[0].strip()
-                if var in constants and parts[1].strip() == constants[var]:
-                    continue
-            
-            # Replace variables with their constant values
-            for var, value in constants.items():
-                # Make sure we're replacing whole variable names, not parts
-                line = self._replace_var_with_value(line, var, value)
-            
-            self.code[i] = line
+        Sparse conditional constant propagation over an SSA view of the
+        code (see src.ssa). Constants flow across joins when every path
+        that can actually run agrees on them, branches on a condition
+        proven constant are resolved and the arms they skip are removed.
+        """
+        self.code, changes = propagate_constants(self.code)
+        return changes > 0
+    
+    def _interprocedural_constant_propagation(self):
+        """Push constant arguments into callees and constant results into callers (see src.interprocedural)"""
+        self.code, changes = propagate_interprocedural_constants(self.code, self.live_on_exit)
+        return changes > 0
     
-    def _replace_var_with_value(self, line, var, value):
-        """Replace a variable with its value, ensuring we don't replace parts of other variables"""
-        tokens = []
-        current_token = ""
-        i = 0
+    def _inline_functions(self):
+        """Replace calls to small non-recursive functions with their body (see src.interprocedural)"""
+        self.code, inlined = inline_functions(self.code, self.live_on_exit)
+        return inlined > 0
+    
+    def _unreachable_code_elimination(self):
+        """Resolve constant branches, drop basic blocks that can never run and labels never jumped to"""
+        # Branches on a literal condition become an unconditional jump or nothing
+        before = len(self.code)
+        code = []
+        changed = False
+        for ins in self.code:
+            if ins.op == IF_FALSE and isinstance(ins.arg1, Const):
+                if not ins.arg1.value:
+                    code.append(Instruction(GOTO, arg1=ins.arg2))
+                changed = True
+                continue
+            code.append(ins)
         
-        while i < len(line):
-            if line[i].isalnum() or line[i] == '_':
-                current_token += line[i]
-            else:
-                if current_token == var:
-                    tokens.append(value)
-                elif current_token:
-                    tokens.append(current_token)
-                tokens.append(line[i])
-                current_token = ""
-            i += 1
+        cfg = build_cfg(code)
+        if cfg.remove_unreachable():
+            changed = True
+        code = cfg.to_code()
         
-        if current_token == var:
-            tokens.append(value)
-        elif current_token:
-            tokens.append(current_token)
+        # Drop jumps to a label that only other labels separate them from
+        kept = []
+        following = set()
+        for ins in reversed(code):
+            if ins.op == LABEL:
+                following.add(ins.arg1)
+            elif ins.op == GOTO and ins.arg1 in following:
+                continue
+            else:
+                following = set()
+            kept.append(ins)
+        kept.reverse()
+        code = kept
         
-        return "".join(tokens)
+        # Then labels nothing jumps to, which would only split blocks for later passes
+        targets = {ins.arg1 if ins.op == GOTO else ins.arg2
+                   for ins in code if ins.op == GOTO or ins.op == IF_FALSE}
+        self.code = [ins for ins in code if ins.op != LABEL or ins.arg1 in targets]
+        return changed or len(self.code) != before
     
-    def _analyze_variable_usage(self):
-        """Analyze which variables are used after being defined"""
-        self.used_vars = set()
-        self.defined_vars = set()
-        
-        # First pass: collect variable definitions
-        for line in self.code:
-            if '=' in line and not line.strip().startswith('if') and 'goto' not in line:
-                var = line.split('=', 1)[0].strip()
-                self.defined_vars.add(var)
-        
-        # Second pass: collect variable uses
-        for line in self.code:
-            if '=' in line and not line.strip().startswith('if') and 'goto' not in line:
-                # Right side of assignment
-                expr = line.split('=', 1)[1].strip()
-                # Add all defined variables that appear in the expression
-                for var in self.defined_vars:
-                    if var in expr.split():
-                        self.used_vars.add(var)
-            elif 'if' in line:
-                # Condition in if statements
-                for var in self.defined_vars:
-                    if var in line.split():
-                        self.used_vars.add(var)
-            elif 'goto' not in line and ':' not in line:
-                # Other statements
-                for var in self.defined_vars:
-                    if var in line.split():
-                        self.used_vars.add(var)
+    def _common_subexpression_elimination(self):
+        """Reuse values computed earlier in the same block (see src.value_numbering)"""
+        self.code, replaced = number_values(self.code)
+        return replaced > 0
     
     def _dead_code_elimination(self):
-        """Eliminate assignments to variables that are never used"""
-        self._analyze_variable_usage()
-        
-        new_code = []
-        for line in self.code:
-            if '=' in line and not line.strip().startswith('if') and 'goto' not in line:
-                var = line.split('=', 1)[0].strip()
-                if var in self.used_vars or var.startswith('t') or var == "result":
-                    new_code.append(line)
-            else:
-                new_code.append(line)
-        
-        self.code = new_code
+        """Eliminate pure assignments whose value is never read (see src.liveness)"""
+        self.code, removed = eliminate_dead_code(self.code, self.live_on_exit)
+        return removed > 0
+    
+    def _loop_optimization(self):
+        """Hoist loop-invariant code and strength-reduce induction variables (see src.loops)"""
+        self.code, changes = optimize_loops(self.code)
+        return changes > 0
     
     def _combine_consecutive_assignments(self):
-        """Combine consecutive assignments where possible"""
-        i = 0
-        while i < len(self.code) - 1:
-            curr_line = self.code[i]
-            next_line = self.code[i+1]
-            
-            # Check if current line assigns to a temp variable and next line uses only that temp
-            if '=' in curr_line and '=' in next_line:
-                curr_parts = curr_line.split('=', 1)
-                next_parts = next_line.split('=', 1)
-                
-                temp_var = curr_parts[0].strip()
-                
-                # If the temp var is only used once in the next line's right side
-                if temp_var in next_parts[1].split() and next_parts[1].count(temp_var) == 1:
-                    # Replace the temp var in the next line with its value
-                    new_expr = next_parts[1].replace(temp_var, '(' + curr_parts[1].strip() + ')')
-                    self.code[i+1] = f"{next_parts[0]} {new_expr}"
-                    
-                    # Remove the current line (temp var assignment)
-                    self.code.pop(i)
-                    continue
-            
-            i += 1
+        """Inline single-use temporaries into the instruction that reads them (see src.forwarding)"""
+        self.code, removed = forward_temporaries(self.code, self.live_on_exit)
+        return removed > 0
+
+
+class ConstantPropagator:
+    """
+    Forward constant propagation state for one scan over the instructions.
+    
+    The map holds the constants that reach the current instruction. A
+    redefinition kills the variable's entry, and labels and function
+    boundaries clear the whole map because other paths can join there.
+    Substitution and recording are separate steps so other rewrites (such
+    as folding) can run in between and have their results propagated.
+    With `temps_only=True` only generator temporaries are tracked.
+    """
+    __slots__ = ('constants', 'temps_only')
+    
+    def __init__(self, temps_only=False):
+        self.constants = {}
+        self.temps_only = temps_only
+    
+    def substitute(self, ins):
+        """Replace variables with the constants that reach this instruction"""
+        constants = self.constants
+        if not constants:
+            return ins
+        operands = ins.operands()
+        if not operands:
+            return ins
+        replaced = [constants.get(operand, operand) if type(operand) is str else operand
+                    for operand in operands]
+        for new, old in zip(replaced, operands):
+            if new is not old:
+                return ins.with_operands(replaced)
+        return ins
+    
+    def record(self, ins):
+        """Record or kill the definition made by this instruction"""
+        if ins.op in JOIN_OPS:
+            if self.constants:
+                self.constants = {}
+            return
+        dest = ins.dest
+        if dest is not None:
+            if self.temps_only and not is_temp(dest):
+                return
+            if ins.op == COPY and isinstance(ins.arg1, Const) and _is_propagatable(ins.arg1):
+                self.constants[dest] = ins.arg1
+            else:
+                self.constants.pop(dest, None)
+
+
+class StreamingOptimizer:
+    """
+    Apply the passes that only look backwards to a stream of instructions.
+    
+    Comment removal, constant folding and the forward-scan form of
+    constant propagation (ConstantPropagator) never need to see
+    instructions that come later, so they can run while the generator is
+    still producing code. Each instruction goes through
+    propagation and then folding, and the folded result is recorded, so
+    constants flow through chains of temporaries in a single pass. Passes
+    that need the whole program (sparse conditional constant propagation,
+    unreachable and dead code elimination, assignment combination) are not
+    applied here.
+    """
+    
+    def __init__(self, pipeline=None):
+        pipeline = set(pipeline or DEFAULT_PIPELINE)
+        self.remove_comments = 'remove_comments' in pipeline
+        self.fold = 'constant_folding' in pipeline
+        self.propagator = ConstantPropagator() if 'constant_propagation' in pipeline else None
+    
+    def feed(self, instructions):
+        """Optimize the next chunk of the stream and return it as a list"""
+        return list(self.stream(instructions))
+    
+    def stream(self, instructions):
+        """Yield optimized instructions as the input iterable produces them"""
+        propagator = self.propagator
+        for ins in instructions:
+            if self.remove_comments and ins.op == COMMENT:
+                continue
+            if propagator is not None:
+                ins = propagator.substitute(ins)
+            if self.fold:
+                ins = fold_instruction(ins)
+            if propagator is not None:
+                propagator.record(ins)
+            yield ins
+
+
+def _is_propagatable(const):
+    """Only literals the folder understands are propagated"""
+    return type(const.value) in FOLDABLE_TYPES
 
 
 def optimize_intermediate_code(intermediate_code):
@@ -220,7 +322,7 @@ def optimize_intermediate_code(intermediate_code):
     Optimize the intermediate code.
     
     Args:
-        intermediate_code (list): List of intermediate code instructions
+        intermediate_code (list): List of Instruction objects
         
     Returns:
         list: Optimized intermediate code
@@ -0,0 +1,378 @@
+import os
+import time
+from concurrent.futures import wait, FIRST_COMPLETED
+
+from src.pass_manager import PassManager, DEFAULT_MAX_ITERATIONS
+from src.loops import HARMLESS_CALLS
+from src.liveness import block_uses
+from src.value_numbering import rebound_names
+from src.serialize import encode_listings, decode_listings
+from src.ir import Instruction, FUNCTION, END_FUNCTION, PARAMS, PRINT
+
+# Listings shorter than this, in instructions, are optimized whole like before
+PARALLEL_MIN_INSTRUCTIONS = 20_000
+
+# Pending units are only sent to the pool when they add up to at least this many instructions
+POOL_MIN_INSTRUCTIONS = 5_000
+
+# Aim for this many tasks per worker so a few large functions do not leave workers idle
+CHUNKS_PER_WORKER = 4
+
+# Passes that need every function of the module at once; they run between rounds
+WHOLE_PROGRAM_PASSES = frozenset(['interprocedural_constant_propagation', 'inlining'])
+
+# How often a wait on the pool checks should_stop, in seconds
+STOP_POLL_SECONDS = 0.05
+
+
+class ParallelPassManager(PassManager):
+    """
+    Run a pipeline over a module's functions separately, on a process pool.
+
+    Every top-level function is an optimization unit of its own, and the
+    module code is one more unit in which each function is replaced by a
+    stub: its `function` and `params` instructions and a `print` of the
+    names the body reads without assigning, so liveness still sees what
+    the function may read at every call. Function units start with empty
+    definitions of the builtins the module rebinds, so value numbering and
+    the loop optimizer do not take them for pure calls. Each round runs the
+    pipeline minus WHOLE_PROGRAM_PASSES on every unit to a fixed point,
+    puts the units back in their original order and then runs the whole
+    program passes on the joined listing; rounds repeat while those change
+    it. Optimized units are remembered, so a later round only optimizes
+    again the functions that inlining or constant propagation rewrote.
+
+    Units travel to the workers in the src.serialize encoding and share
+    nothing; the result depends on the listing alone, not on the pool or
+    its size. Without an `executor`, or when the units left add up to
+    fewer than POOL_MIN_INSTRUCTIONS, they are optimized in this process.
+    Listings shorter than `min_instructions`, or with fewer than two
+    functions, are optimized whole as by PassManager.
+
+    Pass statistics add up the work of every unit, so their times are
+    CPU time summed over the workers; total_seconds() is the wall-clock
+    time of the run.
+    """
+
+    def __init__(self, pipeline, optimizer, executor=None, workers=None,
+                 max_iterations=DEFAULT_MAX_ITERATIONS, time_budget=None, should_stop=None,
+                 min_instructions=PARALLEL_MIN_INSTRUCTIONS):
+        super().__init__(pipeline, optimizer, max_iterations, time_budget, should_stop)
+        self.executor = executor
+        self.workers = workers or os.cpu_count() or 1
+        self.min_instructions = min_instructions
+        self.units = 0
+        self.units_optimized = 0
+        self.seconds = None
+
+    def run(self, intermediate_code):
+        """
+        Optimize a copy of the given instructions.
+
+        Args:
+            intermediate_code (list): List of Instruction objects
+
+        Returns:
+            list: Optimized intermediate code
+        """
+        start = time.perf_counter()
+        try:
+            if len(intermediate_code) < self.min_instructions:
+                return super().run(intermediate_code)
+            if len(split_units(intermediate_code)[1]) < 2:
+                return super().run(intermediate_code)
+            return self._run_units(intermediate_code)
+        finally:
+            self.seconds = time.perf_counter() - start
+
+    def total_seconds(self):
+        if self.seconds is not None:
+            return self.seconds
+        return super().total_seconds()
+
+    def _run_units(self, code):
+        optimizer = self.optimizer
+        local = [name for name in self.pipeline if name not in WHOLE_PROGRAM_PASSES]
+        whole = [name for name in self.pipeline if name in WHOLE_PROGRAM_PASSES]
+        deadline = None
+        if self.time_budget is not None:
+            deadline = time.time() + self.time_budget
+        optimized = {}
+        optimizer.code = code = list(code)
+
+        for iteration in range(self.max_iterations):
+            self.iterations = iteration + 1
+            code = self._optimize_units(code, local, deadline, optimized)
+            optimizer.code = code
+            if not whole or self.budget_exhausted or self._stopped(deadline):
+                break
+
+            changed = False
+            for name in whole:
+                if self._stopped(deadline):
+                    return optimizer.code
+                if self.run_pass(name):
+                    changed = True
+            code = optimizer.code
+            if not changed:
+                break
+
+        return optimizer.code
+
+    def _stopped(self, deadline):
+        if deadline is not None and time.time() >= deadline:
+            self.budget_exhausted = True
+            return True
+        return self.should_stop is not None and self.should_stop()
+
+    def _optimize_units(self, code, pipeline, deadline, optimized):
+        """Optimize every unit of `code` not already optimized, returning the joined listing"""
+        module, functions = split_units(code)
+        context = context_stubs(module)
+        units = [module] + [context + function for function in functions]
+        keys = [(True, tuple(unit)) for unit in units[:1]] + [(False, tuple(unit)) for unit in units[1:]]
+        self.units = len(units)
+
+        results = [optimized.get(key) for key in keys]
+        pending = [k for k, result in enumerate(results) if result is None]
+        self.units_optimized += len(pending)
+        if pending:
+            done = self._run_pending(units, pending, pipeline, deadline)
+            for k, result in done.items():
+                results[k] = result
+                optimized[keys[k]] = result
+                optimized[(k == 0, tuple(result))] = result
+            for k in pending:
+                if results[k] is None:
+                    # Stopped before this unit was optimized
+                    results[k] = units[k]
+
+        bodies = [strip_context(result, function[0].arg1)
+                  for result, function in zip(results[1:], functions)]
+        return join_units(results[0], bodies)
+
+    def _run_pending(self, units, pending, pipeline, deadline):
+        live_on_exit = tuple(self.optimizer.live_on_exit)
+        size = sum(len(units[k]) for k in pending)
+        if self.executor is None or size < POOL_MIN_INSTRUCTIONS:
+            results, summary = optimize_units([units[k] for k in pending], pipeline,
+                                              live_on_exit if pending[0] == 0 else (),
+                                              deadline, self.should_stop, first_is_module=pending[0] == 0)
+            self._merge(pipeline, summary)
+            return dict(zip(pending, results))
+
+        futures = {}
+        for chunk in chunk_units(units, pending, self.workers * CHUNKS_PER_WORKER):
+            data = encode_listings([units[k] for k in chunk])
+            module = chunk[0] == 0
+            future = self.executor.submit(optimize_chunk, data, pipeline,
+                                          live_on_exit if module else (), deadline, module)
+            futures[future] = chunk
+
+        done = {}
+        remaining = set(futures)
+        while remaining:
+            finished, remaining = wait(remaining, timeout=STOP_POLL_SECONDS, return_when=FIRST_COMPLETED)
+            for future in finished:
+                data, summary = future.result()
+                self._merge(pipeline, summary)
+                done.update(zip(futures[future], decode_listings(data)))
+            if remaining and self.should_stop is not None and self.should_stop():
+                for future in remaining:
+                    future.cancel()
+                break
+        return done
+
+    def _merge(self, pipeline, summary):
+        """Add the statistics of a batch of units to this manager's"""
+        for name, (runs, skipped, changes, seconds, removed) in zip(pipeline, summary['passes']):
+            stats = self.stats[name]
+            stats.runs += runs
+            stats.skipped += skipped
+            stats.changes += changes
+            stats.seconds += seconds
+            stats.instructions_removed += removed
+        if summary['budget_exhausted']:
+            self.budget_exhausted = True
+
+
+def split_units(code):
+    """
+    Cut a listing into its module code and its top-level functions.
+
+    Args:
+        code (list): List of Instruction objects
+
+    Returns:
+        tuple: (module code with a stub in place of each function, list of function listings)
+    """
+    module = []
+    functions = []
+    depth = 0
+    start = None
+    for i, ins in enumerate(code):
+        op = ins.op
+        if op == FUNCTION:
+            if depth == 0:
+                start = i
+            depth += 1
+        elif op == END_FUNCTION and depth:
+            depth -= 1
+            if depth == 0:
+                function = code[start:i + 1]
+                functions.append(function)
+                module.extend(function_stub(function))
+        elif depth == 0:
+            module.append(ins)
+    if depth:
+        # An unterminated definition stays in the module code as it is
+        module.extend(code[start:])
+    return module, functions
+
+
+def function_stub(function):
+    """Return the instructions standing in for a function in the module unit"""
+    stub = [function[0]]
+    if len(function) > 2 and function[1].op == PARAMS:
+        stub.append(function[1])
+    free = free_names(function)
+    if free:
+        stub.append(Instruction(PRINT, arg1=tuple(sorted(free))))
+    stub.append(function[-1])
+    return stub
+
+
+def free_names(function):
+    """Names the function, or a function nested in it, reads without assigning (see LivenessAnalysis)"""
+    names = set()
+    read = []
+    assigned = []
+    for ins in function:
+        op = ins.op
+        if op == FUNCTION:
+            read.append(set())
+            assigned.append(set())
+        elif op == END_FUNCTION and read:
+            names.update(read.pop() - assigned.pop())
+        elif read:
+            read[-1].update(block_uses(ins))
+            if ins.dest is not None:
+                assigned[-1].add(ins.dest)
+            elif op == PARAMS:
+                assigned[-1].update(ins.arg1)
+    return names
+
+
+def context_stubs(module):
+    """Empty definitions of the builtins the module code rebinds, for function units"""
+    stubs = []
+    for builtin in sorted(rebound_names(module) & HARMLESS_CALLS):
+        stubs.append(Instruction(FUNCTION, arg1=builtin))
+        stubs.append(Instruction(END_FUNCTION))
+    return stubs
+
+
+def strip_context(unit, function_name):
+    """Drop the context stubs in front of an optimized function unit"""
+    for i, ins in enumerate(unit):
+        if ins.op == FUNCTION and ins.arg1 == function_name:
+            return unit[i:]
+    return unit
+
+
+def join_units(module, functions):
+    """Put the optimized functions back in place of the stubs of the module code"""
+    out = []
+    k = 0
+    depth = 0
+    for ins in module:
+        op = ins.op
+        if op == FUNCTION:
+            if depth == 0:
+                out.extend(functions[k])
+                k += 1
+            depth += 1
+        elif op == END_FUNCTION and depth:
+            depth -= 1
+        elif depth == 0:
+            out.append(ins)
+    return out
+
+
+def chunk_units(units, pending, chunks):
+    """
+    Group pending unit indexes into about `chunks` runs of similar size.
+
+    The module unit, index 0, always gets a chunk of its own since it is
+    optimized with the module's live_on_exit.
+    """
+    chunk = []
+    if pending[0] == 0:
+        yield [0]
+        pending = pending[1:]
+    target = max(1, sum(len(units[k]) for k in pending) // max(1, chunks))
+    size = 0
+    for k in pending:
+        chunk.append(k)
+        size += len(units[k])
+        if size >= target:
+            yield chunk
+            chunk = []
+            size = 0
+    if chunk:
+        yield chunk
+
+
+def optimize_units(units, pipeline, live_on_exit=(), deadline=None, should_stop=None,
+                   first_is_module=False):
+    """
+    Run a pipeline to a fixed point over each listing on its own.
+
+    Args:
+        units (list): Lists of Instruction objects
+        pipeline (list): Technique names
+        live_on_exit (iterable): Names read after the module unit
+        deadline (float): time.time() after which no pass is started
+        should_stop (callable): Asked before every pass, stops the rest when true
+        first_is_module (bool): Whether units[0] is the module unit, which
+            alone is optimized with `live_on_exit`
+
+    Returns:
+        tuple: (optimized listings, summary dict with per-pass counters in
+            pipeline order and whether the deadline was reached)
+    """
+    from src.optimizer import CodeOptimizer
+
+    optimizer = CodeOptimizer()
+    totals = [[0, 0, 0, 0.0, 0] for _ in pipeline]
+    exhausted = False
+    results = []
+    for k, unit in enumerate(units):
+        budget = None
+        if deadline is not None:
+            budget = max(0.0, deadline - time.time())
+        optimizer.reset()
+        if k == 0 and first_is_module:
+            optimizer.live_on_exit = live_on_exit
+        manager = PassManager(pipeline, optimizer, time_budget=budget, should_stop=should_stop)
+        results.append(manager.run(unit))
+        for total, stats in zip(totals, (manager.stats[name] for name in pipeline)):
+            total[0] += stats.runs
+            total[1] += stats.skipped
+            total[2] += stats.changes
+            total[3] += stats.seconds
+            total[4] += stats.instructions_removed
+        exhausted = exhausted or manager.budget_exhausted
+    return results, {'passes': totals, 'budget_exhausted': exhausted}
+
+
+def optimize_chunk(data, pipeline, live_on_exit=(), deadline=None, first_is_module=False):
+    """
+    Optimize a chunk of encoded units inside a worker process.
+
+    Returns:
+        tuple: (optimized listings in the src.serialize encoding, summary of optimize_units)
+    """
+    results, summary = optimize_units(decode_listings(data), pipeline, live_on_exit, deadline,
+                                      first_is_module=first_is_module)
+    return encode_listings(results), summary
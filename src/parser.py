@@ -1,11 +1,90 @@
 import ast
 import symtable
 
+from src.ir import (
+    Instruction, Const, name, COPY, INDEX, GET_ATTR, SET_INDEX, SET_ATTR,
+    BUILD_LIST, BUILD_TUPLE, CALL, METHOD_CALL, IF_FALSE, GOTO, LABEL, FUNCTION,
+    PARAMS, END_FUNCTION, RETURN, COMMENT, UNSUPPORTED, ERROR, NAMESPACE_SEPARATOR,
+)
+from src.metrics import NULL_TIMER
+
+# AST operator node -> IR opcode
+BINARY_OPERATORS = {
+    ast.Add: '+',
+    ast.Sub: '-',
+    ast.Mult: '*',
+    ast.Div: '/',
+    ast.FloorDiv: '//',
+    ast.Mod: '%',
+    ast.Pow: '**',
+    ast.LShift: '<<',
+    ast.RShift: '>>',
+    ast.BitAnd: '&',
+    ast.BitOr: '|',
+    ast.BitXor: '^',
+    ast.MatMult: '@',
+}
+
+COMPARISON_OPERATORS = {
+    ast.Eq: '==',
+    ast.NotEq: '!=',
+    ast.Lt: '<',
+    ast.LtE: '<=',
+    ast.Gt: '>',
+    ast.GtE: '>=',
+    ast.Is: 'is',
+    ast.IsNot: 'is not',
+    ast.In: 'in',
+    ast.NotIn: 'not in',
+}
+
+UNARY_OPERATORS = {
+    ast.USub: 'neg',
+    ast.UAdd: 'pos',
+    ast.Not: 'not',
+    ast.Invert: 'invert',
+}
+
+
 class IntermediateCodeGenerator:
-    def __init__(self):
+    # AST node type -> handler method. Lookups use the exact node type, so
+    # dispatch is a single dict access instead of a chain of isinstance checks.
+    STATEMENT_HANDLERS = {
+        ast.Assign: '_process_assignment',
+        ast.AugAssign: '_process_aug_assignment',
+        ast.Expr: '_process_expression_statement',
+        ast.If: '_process_if',
+        ast.While: '_process_while',
+        ast.For: '_process_for',
+        ast.FunctionDef: '_process_function_def',
+        ast.Return: '_process_return',
+        ast.Pass: '_process_pass',
+    }
+
+    EXPRESSION_HANDLERS = {
+        ast.BinOp: '_process_binary_operation',
+        ast.UnaryOp: '_process_unary_operation',
+        ast.BoolOp: '_process_bool_operation',
+        ast.Compare: '_process_compare',
+        ast.Call: '_process_call',
+        ast.Name: '_process_name',
+        ast.Constant: '_process_constant',
+        ast.Subscript: '_process_subscript',
+        ast.Attribute: '_process_attribute',
+        ast.List: '_process_list',
+        ast.Tuple: '_process_tuple',
+        ast.Slice: '_process_slice',
+    }
+
+    def __init__(self, namespace=None):
         self.code = []
         self.temp_counter = 0
         self.label_counter = 0
+        self.namespace = namespace
+        self._statement_handlers = {node_type: getattr(self, method)
+                                    for node_type, method in self.STATEMENT_HANDLERS.items()}
+        self._expression_handlers = {node_type: getattr(self, method)
+                                     for node_type, method in self.EXPRESSION_HANDLERS.items()}
     
     def reset(self):
         self.code = []
@@ -14,25 +93,74 @@ class IntermediateCodeGenerator:
 
     def get_temp(self):
         """Generate a new temporary variable name"""
-        temp = f"t{self.temp_counter}"
+        temp = name(f"{self._prefix()}t{self.temp_counter}")
         self.temp_counter += 1
         return temp
     
     def get_label(self):
         """Generate a new label"""
-        label = f"L{self.label_counter}"
+        label = name(f"{self._prefix()}L{self.label_counter}")
         self.label_counter += 1
         return label
     
-    def generate(self, source_code):
-        """Generate intermediate code from Python source code"""
+    def _prefix(self):
+        return f"{self.namespace}{NAMESPACE_SEPARATOR}" if self.namespace else ""
+    
+    def generate_statement(self, node, namespace=None):
+        """
+        Lower a single top-level statement with its own temp and label numbering.
+        
+        Args:
+            node (ast.stmt): Statement to lower
+            namespace (str): Prefix for temps and labels (f$t0, f$L0)
+            
+        Returns:
+            list: List of Instruction objects for this statement
+        """
+        self.reset()
+        self.namespace = namespace
+        self._process_node(node)
+        return self.code
+    
+    def generate(self, source_code, timer=NULL_TIMER):
+        """Generate intermediate code from Python source code, timing the 'parse' and 'lower' stages"""
         self.reset()
         try:
-            tree = ast.parse(source_code)
-            self._process_module(tree)
+            with timer.stage('parse'):
+                tree = ast.parse(source_code)
+            with timer.stage('lower'):
+                self._process_module(tree)
             return self.code
         except SyntaxError as e:
-            return [f"Error: {e}"]
+            return [Instruction(ERROR, arg1=str(e))]
+    
+    def generate_chunks(self, source_code):
+        """
+        Lower Python source one top-level statement at a time.
+        
+        Yields the instructions of each top-level statement as a list as
+        soon as it has been lowered, so callers can start consuming code
+        before the whole module is done. Temp and label numbering continue
+        across chunks exactly as in generate().
+        """
+        self.reset()
+        try:
+            tree = ast.parse(source_code)
+        except SyntaxError as e:
+            yield [Instruction(ERROR, arg1=str(e))]
+            return
+        
+        for statement in tree.body:
+            self._process_node(statement)
+            if self.code:
+                chunk = self.code
+                self.code = []
+                yield chunk
+    
+    def generate_stream(self, source_code):
+        """Yield instructions one by one as top-level statements are lowered"""
+        for chunk in self.generate_chunks(source_code):
+            yield from chunk
     
     def _process_module(self, node):
         """Process a module node"""
@@ -41,115 +169,214 @@ class IntermediateCodeGenerator:
     
     def _process_node(self, node):
         """Process an AST node and generate intermediate code"""
-        if isinstance(node, ast.Assign):
-            self._process_assignment(node)
-        elif isinstance(node, ast.Expr):
-            self._process_expression(node.value)
-        elif isinstance(node, ast.If):
-            self._process_if(node)
-        elif isinstance(node, ast.While):
-            self._process_while(node)
-        elif isinstance(node, ast.For):
-            self._process_for(node)
-        elif isinstance(node, ast.FunctionDef):
-            self._process_function_def(node)
-        elif isinstance(node, ast.Return):
-            self._process_return(node)
-        elif isinstance(node, ast.Call):
-            self._process_call(node)
-        elif isinstance(node, ast.Print):  # Python 2 compatibility
-            self._process_print(node)
+        handler = self._statement_handlers.get(type(node))
+        if handler is not None:
+            handler(node)
         else:
-            # Handle other node types or append a comment for unsupported types
-            self.code.append(f"# Unsupported node type: {type(node).__name__}")
+            # Append a comment for unsupported statement types
+            self.code.append(Instruction(COMMENT, arg1=f"Unsupported node type: {type(node).__name__}"))
     
     def _process_assignment(self, node):
         """Process assignment statements"""
-        if len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
-            # Simple assignment: x = expr
-            target = node.targets[0].id
-            value_temp = self._process_expression(node.value)
-            self.code.append(f"{target} = {value_temp}")
+        value_temp = self._process_expression(node.value)
+        
+        # Chained assignments (a = b = expr) evaluate the value once
+        for target in node.targets:
+            self._assign_to(target, value_temp)
+    
+    def _assign_to(self, target, value):
+        """Store an already evaluated value into an assignment target"""
+        target_type = type(target)
+        if target_type is ast.Name:
+            self.code.append(Instruction(COPY, target.id, value))
+        elif target_type is ast.Subscript:
+            container = self._process_expression(target.value)
+            index = self._process_expression(target.slice)
+            self.code.append(Instruction(SET_INDEX, None, container, (index, value)))
+        elif target_type is ast.Attribute:
+            obj = self._process_expression(target.value)
+            self.code.append(Instruction(SET_ATTR, None, obj, (name(target.attr), value)))
+        elif target_type is ast.Tuple or target_type is ast.List:
+            # Unpacking: a, b = value becomes a = value[0]; b = value[1]
+            if any(type(element) is ast.Starred for element in target.elts):
+                self.code.append(Instruction(COMMENT, arg1="Starred assignment not fully supported"))
+                return
+            for i, element in enumerate(target.elts):
+                item_temp = self.get_temp()
+                self.code.append(Instruction(INDEX, item_temp, value, Const(i)))
+                self._assign_to(element, item_temp)
+        else:
+            self.code.append(Instruction(COMMENT, arg1="Complex assignment pattern not fully supported"))
+    
+    def _process_aug_assignment(self, node):
+        """Process augmented assignments like x += 1"""
+        op = BINARY_OPERATORS[type(node.op)]
+        target = node.target
+        target_type = type(target)
+        
+        # Evaluate the target's container once so x[i] += 1 reads and writes the same slot
+        if target_type is ast.Subscript:
+            container = self._process_expression(target.value)
+            index = self._process_expression(target.slice)
+            current = self.get_temp()
+            self.code.append(Instruction(INDEX, current, container, index))
+        elif target_type is ast.Attribute:
+            obj = self._process_expression(target.value)
+            current = self.get_temp()
+            self.code.append(Instruction(GET_ATTR, current, obj, name(target.attr)))
+        elif target_type is ast.Name:
+            current = target.id
+        else:
+            self.code.append(Instruction(COMMENT, arg1="Complex assignment pattern not fully supported"))
+            return
+        
+        value = self._process_expression(node.value)
+        result_temp = self.get_temp()
+        self.code.append(Instruction(op, result_temp, current, value))
+        
+        if target_type is ast.Subscript:
+            self.code.append(Instruction(SET_INDEX, None, container, (index, result_temp)))
+        elif target_type is ast.Attribute:
+            self.code.append(Instruction(SET_ATTR, None, obj, (name(target.attr), result_temp)))
         else:
-            # More complex assignment patterns
-            for target in node.targets:
-                if isinstance(target, ast.Name):
-                    value_temp = self._process_expression(node.value)
-                    self.code.append(f"{target.id} = {value_temp}")
-                else:
-                    self.code.append(f"# Complex assignment pattern not fully supported")
+            self.code.append(Instruction(COPY, current, result_temp))
+    
+    def _process_expression_statement(self, node):
+        """Process an expression used as a statement, such as a call"""
+        self._process_expression(node.value)
+    
+    def _process_pass(self, node):
+        """A pass statement generates no code"""
     
     def _process_expression(self, node):
         """Process an expression and return a temporary variable with the result"""
-        if isinstance(node, ast.BinOp):
-            return self._process_binary_operation(node)
-        elif isinstance(node, ast.Name):
-            return node.id
-        elif isinstance(node, ast.Num):
-            return str(node.n)
-        elif isinstance(node, ast.Str):
-            return f'"{node.s}"'
-        elif isinstance(node, ast.Call):
-            return self._process_call(node)
-        elif isinstance(node, ast.Compare):
-            return self._process_compare(node)
-        else:
-            # For unsupported expressions, create a placeholder
-            temp = self.get_temp()
-            self.code.append(f"{temp} = # Unsupported expression: {type(node).__name__}")
-            return temp
+        handler = self._expression_handlers.get(type(node))
+        if handler is not None:
+            return handler(node)
+        
+        # For unsupported expressions, create a placeholder
+        temp = self.get_temp()
+        self.code.append(Instruction(UNSUPPORTED, temp, f"Unsupported expression: {type(node).__name__}"))
+        return temp
+    
+    def _process_name(self, node):
+        return node.id
+    
+    def _process_constant(self, node):
+        return Const(node.value)
     
     def _process_binary_operation(self, node):
         """Process binary operations like a + b, a - b, etc."""
         left_temp = self._process_expression(node.left)
         right_temp = self._process_expression(node.right)
         result_temp = self.get_temp()
+        op = BINARY_OPERATORS[type(node.op)]
         
-        if isinstance(node.op, ast.Add):
-            op = "+"
-        elif isinstance(node.op, ast.Sub):
-            op = "-"
-        elif isinstance(node.op, ast.Mult):
-            op = "*"
-        elif isinstance(node.op, ast.Div):
-            op = "/"
-        elif isinstance(node.op, ast.FloorDiv):
-            op = "//"
-        elif isinstance(node.op, ast.Mod):
-            op = "%"
-        else:
-            op = "?"  # Unsupported operator
+        self.code.append(Instruction(op, result_temp, left_temp, right_temp))
+        return result_temp
+    
+    def _process_unary_operation(self, node):
+        """Process unary operations like -x, not x and ~x"""
+        operand = self._process_expression(node.operand)
+        result_temp = self.get_temp()
         
-        self.code.append(f"{result_temp} = {left_temp} {op} {right_temp}")
+        self.code.append(Instruction(UNARY_OPERATORS[type(node.op)], result_temp, operand))
+        return result_temp
+    
+    def _process_bool_operation(self, node):
+        """
+        Process `and`/`or` with short-circuit evaluation.
+        
+        The result temp holds the last operand evaluated: `and` stops at the
+        first falsy value, `or` at the first truthy one.
+        """
+        result_temp = self.get_temp()
+        end_label = self.get_label()
+        is_and = type(node.op) is ast.And
+        
+        for i, value in enumerate(node.values):
+            value_temp = self._process_expression(value)
+            self.code.append(Instruction(COPY, result_temp, value_temp))
+            if i == len(node.values) - 1:
+                break
+            if is_and:
+                self.code.append(Instruction(IF_FALSE, arg1=result_temp, arg2=end_label))
+            else:
+                next_label = self.get_label()
+                self.code.append(Instruction(IF_FALSE, arg1=result_temp, arg2=next_label))
+                self.code.append(Instruction(GOTO, arg1=end_label))
+                self.code.append(Instruction(LABEL, arg1=next_label))
+        
+        self.code.append(Instruction(LABEL, arg1=end_label))
         return result_temp
     
     def _process_compare(self, node):
-        """Process comparison operations"""
+        """
+        Process comparison operations.
+        
+        Chains like a < b < c short-circuit like `and`: each comparator is
+        evaluated once and the chain stops at the first false comparison.
+        """
         left = self._process_expression(node.left)
         result_temp = self.get_temp()
         
-        if len(node.ops) == 1 and len(node.comparators) == 1:
+        if len(node.ops) == 1:
             right = self._process_expression(node.comparators[0])
-            
-            if isinstance(node.ops[0], ast.Eq):
-                op = "=="
-            elif isinstance(node.ops[0], ast.NotEq):
-                op = "!="
-            elif isinstance(node.ops[0], ast.Lt):
-                op = "<"
-            elif isinstance(node.ops[0], ast.LtE):
-                op = "<="
-            elif isinstance(node.ops[0], ast.Gt):
-                op = ">"
-            elif isinstance(node.ops[0], ast.GtE):
-                op = ">="
-            else:
-                op = "?"  # Unsupported operator
-            
-            self.code.append(f"{result_temp} = {left} {op} {right}")
-        else:
-            self.code.append(f"{result_temp} = # Complex comparison not fully supported")
+            op = COMPARISON_OPERATORS[type(node.ops[0])]
+            self.code.append(Instruction(op, result_temp, left, right))
+            return result_temp
+        
+        end_label = self.get_label()
+        for i, (op_node, comparator) in enumerate(zip(node.ops, node.comparators)):
+            right = self._process_expression(comparator)
+            op = COMPARISON_OPERATORS[type(op_node)]
+            self.code.append(Instruction(op, result_temp, left, right))
+            if i < len(node.ops) - 1:
+                self.code.append(Instruction(IF_FALSE, arg1=result_temp, arg2=end_label))
+            left = right
+        self.code.append(Instruction(LABEL, arg1=end_label))
+        return result_temp
+    
+    def _process_subscript(self, node):
+        """Process indexing like a[i] and slicing like a[1:2]"""
+        container = self._process_expression(node.value)
+        index = self._process_expression(node.slice)
+        result_temp = self.get_temp()
+        
+        self.code.append(Instruction(INDEX, result_temp, container, index))
+        return result_temp
+    
+    def _process_slice(self, node):
+        """Process a slice as a call to slice(lower, upper, step)"""
+        parts = []
+        for part in (node.lower, node.upper, node.step):
+            parts.append(Const(None) if part is None else self._process_expression(part))
+        result_temp = self.get_temp()
+        
+        self.code.append(Instruction(CALL, result_temp, name("slice"), tuple(parts)))
+        return result_temp
+    
+    def _process_attribute(self, node):
+        """Process attribute access like obj.attr"""
+        obj = self._process_expression(node.value)
+        result_temp = self.get_temp()
         
+        self.code.append(Instruction(GET_ATTR, result_temp, obj, name(node.attr)))
+        return result_temp
+    
+    def _process_list(self, node):
+        """Process list displays like [a, b]"""
+        return self._process_sequence(node, BUILD_LIST)
+    
+    def _process_tuple(self, node):
+        """Process tuple displays like (a, b)"""
+        return self._process_sequence(node, BUILD_TUPLE)
+    
+    def _process_sequence(self, node, op):
+        elements = tuple(self._process_expression(element) for element in node.elts)
+        result_temp = self.get_temp()
+        
+        self.code.append(Instruction(op, result_temp, elements))
         return result_temp
     
     def _process_if(self, node):
@@ -158,65 +385,74 @@ class IntermediateCodeGenerator:
         else_label = self.get_label()
         end_label = self.get_label()
         
-        self.code.append(f"if {condition_temp} == False goto {else_label}")
+        self.code.append(Instruction(IF_FALSE, arg1=condition_temp, arg2=else_label))
         
         # Process the body of the if statement
         for statement in node.body:
             self._process_node(statement)
         
-        self.code.append(f"goto {end_label}")
-        self.code.append(f"{else_label}:")
+        self.code.append(Instruction(GOTO, arg1=end_label))
+        self.code.append(Instruction(LABEL, arg1=else_label))
         
         # Process the else clause if it exists
         if node.orelse:
             for statement in node.orelse:
                 self._process_node(statement)
         
-        self.code.append(f"{end_label}:")
+        self.code.append(Instruction(LABEL, arg1=end_label))
     
     def _process_while(self, node):
         """Process while loops"""
         start_label = self.get_label()
         end_label = self.get_label()
         
-        self.code.append(f"{start_label}:")
+        self.code.append(Instruction(LABEL, arg1=start_label))
         condition_temp = self._process_expression(node.test)
-        self.code.append(f"if {condition_temp} == False goto {end_label}")
+        self.code.append(Instruction(IF_FALSE, arg1=condition_temp, arg2=end_label))
         
         # Process the body of the while loop
         for statement in node.body:
             self._process_node(statement)
         
-        self.code.append(f"goto {start_label}")
-        self.code.append(f"{end_label}:")
+        self.code.append(Instruction(GOTO, arg1=start_label))
+        self.code.append(Instruction(LABEL, arg1=end_label))
     
     def _process_for(self, node):
         """Process for loops (simplified)"""
         iter_temp = self.get_temp()
         idx_temp = self.get_temp()
-        target = node.target.id if isinstance(node.target, ast.Name) else "target"
         iterable = self._process_expression(node.iter)
         
         start_label = self.get_label()
         end_label = self.get_label()
         
-        self.code.append(f"{iter_temp} = {iterable}")
-        self.code.append(f"{idx_temp} = 0")
-        self.code.append(f"{start_label}:")
-        self.code.append(f"if {idx_temp} >= len({iter_temp}) goto {end_label}")
-        self.code.append(f"{target} = {iter_temp}[{idx_temp}]")
+        self.code.append(Instruction(COPY, iter_temp, iterable))
+        self.code.append(Instruction(COPY, idx_temp, Const(0)))
+        self.code.append(Instruction(LABEL, arg1=start_label))
+        # Loop header: leave the loop once idx_temp reaches len(iter_temp)
+        len_temp = self.get_temp()
+        self.code.append(Instruction(CALL, len_temp, name("len"), (iter_temp,)))
+        condition_temp = self.get_temp()
+        self.code.append(Instruction("<", condition_temp, idx_temp, len_temp))
+        self.code.append(Instruction(IF_FALSE, arg1=condition_temp, arg2=end_label))
+        if type(node.target) is ast.Name:
+            self.code.append(Instruction(INDEX, node.target.id, iter_temp, idx_temp))
+        else:
+            item_temp = self.get_temp()
+            self.code.append(Instruction(INDEX, item_temp, iter_temp, idx_temp))
+            self._assign_to(node.target, item_temp)
         
         # Process the body of the for loop
         for statement in node.body:
             self._process_node(statement)
         
-        self.code.append(f"{idx_temp} = {idx_temp} + 1")
-        self.code.append(f"goto {start_label}")
-        self.code.append(f"{end_label}:")
+        self.code.append(Instruction("+", idx_temp, idx_temp, Const(1)))
+        self.code.append(Instruction(GOTO, arg1=start_label))
+        self.code.append(Instruction(LABEL, arg1=end_label))
     
     def _process_function_def(self, node):
         """Process function definitions"""
-        self.code.append(f"function {node.name}:")
+        self.code.append(Instruction(FUNCTION, arg1=name(node.name)))
         
         # Process parameters
         params = []
@@ -226,26 +462,33 @@ class IntermediateCodeGenerator:
             elif hasattr(arg, 'arg'):  # Python 3.8+
                 params.append(arg.arg)
         
-        self.code.append(f"  params: {', '.join(params)}")
+        self.code.append(Instruction(PARAMS, arg1=tuple(params)))
         
         # Process function body
         for statement in node.body:
             self._process_node(statement)
         
-        self.code.append("end function")
+        self.code.append(Instruction(END_FUNCTION))
     
     def _process_return(self, node):
         """Process return statements"""
         if node.value:
             value_temp = self._process_expression(node.value)
-            self.code.append(f"return {value_temp}")
+            self.code.append(Instruction(RETURN, arg1=value_temp))
         else:
-            self.code.append("return")
+            self.code.append(Instruction(RETURN))
     
     def _process_call(self, node):
         """Process function calls"""
         temp = self.get_temp()
-        func_name = self._get_function_name(node.func)
+        
+        # Method calls keep the receiver as their first operand
+        receiver = None
+        if isinstance(node.func, ast.Attribute):
+            receiver = self._process_expression(node.func.value)
+            func_name = name(node.func.attr)
+        else:
+            func_name = self._get_function_name(node.func)
         
         # Process arguments
         args = []
@@ -253,27 +496,18 @@ class IntermediateCodeGenerator:
             arg_temp = self._process_expression(arg)
             args.append(arg_temp)
         
-        self.code.append(f"{temp} = call {func_name}({', '.join(args)})")
+        if receiver is not None:
+            self.code.append(Instruction(METHOD_CALL, temp, func_name, (receiver, *args)))
+        else:
+            self.code.append(Instruction(CALL, temp, func_name, tuple(args)))
         return temp
     
     def _get_function_name(self, node):
         """Get the name of a function from a function node"""
         if isinstance(node, ast.Name):
             return node.id
-        elif isinstance(node, ast.Attribute):
-            obj = self._process_expression(node.value)
-            return f"{obj}.{node.attr}"
         else:
-            return f"unknown_function"
-    
-    def _process_print(self, node):
-        """Process print statements (Python 2) or print function calls"""
-        values = []
-        for value in node.values:
-            value_temp = self._process_expression(value)
-            values.append(value_temp)
-        
-        self.code.append(f"print {', '.join(values)}")
+            return name("unknown_function")
 
 
 def generate_intermediate_code(source_code):
@@ -284,7 +518,21 @@ def generate_intermediate_code(source_code):
         source_code (str): Python source code
         
     Returns:
-        list: List of intermediate code instructions
+        list: List of Instruction objects (see src.ir.format_code for text)
+    """
+    generator = IntermediateCodeGenerator()
+    return generator.generate(source_code)
+
+
+def generate_intermediate_code_stream(source_code):
+    """
+    Generate intermediate code lazily from Python source code.
+    
+    Args:
+        source_code (str): Python source code
+        
+    Returns:
+        iterator: Instruction objects, produced as each top-level statement is lowered
     """
     generator = IntermediateCodeGenerator()
-    return generator.generate(source_code) 
\ No newline at end of file
+    return generator.generate_stream(source_code)
@@ -0,0 +1,120 @@
+import time
+
+DEFAULT_MAX_ITERATIONS = 8
+
+
+class PassStats:
+    """Accumulated cost and effect of one pass across a pass manager run"""
+    __slots__ = ('name', 'runs', 'skipped', 'changes', 'seconds', 'instructions_removed')
+
+    def __init__(self, name):
+        self.name = name
+        self.runs = 0
+        self.skipped = 0
+        self.changes = 0
+        self.seconds = 0.0
+        self.instructions_removed = 0
+
+    def as_dict(self):
+        return {
+            'pass': self.name,
+            'runs': self.runs,
+            'skipped': self.skipped,
+            'changes': self.changes,
+            'time_ms': round(self.seconds * 1000, 3),
+            'instructions_removed': self.instructions_removed,
+        }
+
+
+class PassManager:
+    """
+    Run a declarative pipeline of optimizer passes to a fixed point.
+
+    The pipeline is a list of technique names understood by
+    CodeOptimizer.run_pass. Each round runs the passes in order; rounds
+    repeat until none of them changes the code or `max_iterations` is
+    reached. The code carries a version number that is bumped on every
+    change, and a pass is skipped when the code has not changed since it
+    last ran, because running it again could not find anything new.
+
+    With a `time_budget` in seconds, no pass is started once the budget is
+    spent. Every pass leaves correct code behind, so the result is simply
+    less optimized; `budget_exhausted` says whether that happened. The
+    same goes for `should_stop`, a callable asked before every pass (used
+    to cancel background jobs).
+    """
+
+    def __init__(self, pipeline, optimizer, max_iterations=DEFAULT_MAX_ITERATIONS,
+                 time_budget=None, should_stop=None):
+        self.pipeline = list(pipeline)
+        self.optimizer = optimizer
+        self.max_iterations = max_iterations
+        self.time_budget = time_budget
+        self.should_stop = should_stop
+        self.iterations = 0
+        self.budget_exhausted = False
+        self.stats = {name: PassStats(name) for name in self.pipeline}
+
+    def run(self, intermediate_code):
+        """
+        Optimize a copy of the given instructions.
+
+        Args:
+            intermediate_code (list): List of Instruction objects
+
+        Returns:
+            list: Optimized intermediate code
+        """
+        optimizer = self.optimizer
+        optimizer.code = list(intermediate_code)
+        version = 0
+        last_run = {}
+        deadline = None
+        if self.time_budget is not None:
+            deadline = time.perf_counter() + self.time_budget
+
+        for iteration in range(self.max_iterations):
+            self.iterations = iteration + 1
+            changed = False
+
+            for name in self.pipeline:
+                stats = self.stats[name]
+                if last_run.get(name) == version:
+                    stats.skipped += 1
+                    continue
+                if deadline is not None and time.perf_counter() >= deadline:
+                    self.budget_exhausted = True
+                    return optimizer.code
+                if self.should_stop is not None and self.should_stop():
+                    return optimizer.code
+
+                if self.run_pass(name):
+                    version += 1
+                    changed = True
+                last_run[name] = version
+
+            if not changed:
+                break
+
+        return optimizer.code
+
+    def run_pass(self, name):
+        """Run one pass over the optimizer's code, recording its cost and effect"""
+        optimizer = self.optimizer
+        stats = self.stats[name]
+        before = len(optimizer.code)
+        start = time.perf_counter()
+        changed = optimizer.run_pass(name)
+        stats.seconds += time.perf_counter() - start
+        stats.runs += 1
+        stats.instructions_removed += before - len(optimizer.code)
+        if changed:
+            stats.changes += 1
+        return changed
+
+    def report(self):
+        """Return per-pass statistics in pipeline order"""
+        return [self.stats[name].as_dict() for name in self.pipeline]
+
+    def total_seconds(self):
+        return sum(stats.seconds for stats in self.stats.values())
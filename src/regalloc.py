@@ -0,0 +1,301 @@
+import bisect
+import heapq
+
+from src.cfg import build_cfg
+from src.liveness import LivenessAnalysis, block_defs, block_uses
+from src.ir import FUNCTION, END_FUNCTION
+
+DEFAULT_REGISTERS = 8
+MAX_REGISTERS = 64
+
+# Name of the module-level region in reports
+MODULE = '<module>'
+
+
+class LiveInterval:
+    """
+    The positions over which one variable of a region may hold a value.
+
+    Instruction i reads its operands at position 2i and writes its result
+    at 2i + 1, so a value whose last read is instruction i does not overlap
+    the result written there and both can share a register.
+    """
+    __slots__ = ('name', 'start', 'end', 'register', 'slot')
+
+    def __init__(self, name, start, end):
+        self.name = name
+        self.start = start
+        self.end = end
+        self.register = None
+        self.slot = None
+
+    def __repr__(self):
+        where = self.register if self.register is not None else f"slot {self.slot}"
+        return f"LiveInterval({self.name!r}, {self.start}, {self.end}, {where})"
+
+
+class Region:
+    """
+    The module body or one function body, allocated independently.
+
+    `intervals` maps every variable that lives in a register or spill slot
+    to its interval. Other names the region reads (globals, builtins and
+    functions) stay in memory under their own name.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.intervals = {}
+        self.max_pressure = 0
+        self.registers_used = 0
+        self.stack_slots = 0
+
+    def location(self, name):
+        """Return the interval holding `name`, or None when it lives in memory"""
+        return self.intervals.get(name)
+
+    @property
+    def spilled(self):
+        return sum(1 for interval in self.intervals.values() if interval.register is None)
+
+
+class Allocation:
+    """
+    Result of register allocation over a listing.
+
+    `code` is the listing the positions refer to and `instruction_regions`
+    holds the index in `regions` of the region each instruction belongs to.
+    """
+
+    def __init__(self, registers, code, regions, instruction_regions):
+        self.registers = registers
+        self.code = code
+        self.regions = regions
+        self.instruction_regions = instruction_regions
+
+    def stats(self):
+        """Register pressure and spill counts, overall and per function"""
+        regions = []
+        for region in self.regions:
+            regions.append({
+                'name': region.name,
+                'variables': len(region.intervals),
+                'max_pressure': region.max_pressure,
+                'registers_used': region.registers_used,
+                'spilled': region.spilled,
+                'stack_slots': region.stack_slots,
+            })
+        return {
+            'registers': self.registers,
+            'max_pressure': max((r.max_pressure for r in self.regions), default=0),
+            'spilled': sum(r.spilled for r in self.regions),
+            'regions': regions,
+        }
+
+
+def split_regions(code):
+    """
+    Assign every instruction to the module body or the function it belongs to.
+
+    Returns:
+        tuple: (list of Region, list holding the region index of each instruction)
+    """
+    regions = [Region(MODULE)]
+    owners = []
+    open_regions = [0]
+    for ins in code:
+        if ins.op == FUNCTION:
+            open_regions.append(len(regions))
+            regions.append(Region(ins.arg1))
+        owners.append(open_regions[-1])
+        if ins.op == END_FUNCTION and len(open_regions) > 1:
+            open_regions.pop()
+    return regions, owners
+
+
+def allocatable_names(code, regions, owners, global_names):
+    """
+    Find the names each region keeps in registers.
+
+    A function keeps every name it assigns, since those are its locals. The
+    module keeps the names it assigns that no function reads, because a
+    function can only see module variables through memory.
+    """
+    names = [set() for _ in regions]
+    for ins, owner in zip(code, owners):
+        names[owner].update(block_defs(ins))
+    names[0] -= global_names
+    return names
+
+
+def compute_intervals(cfg, liveness, owners, allocatable, regions):
+    """
+    Build one interval per allocatable variable, covering every position it is live.
+
+    Reads and writes extend the interval to their position, and a variable
+    live into or out of a basic block extends it to the block's first or
+    last instruction. The result is the hull of the live range, so values
+    carried around a loop stay in one place for the whole loop.
+
+    Only the first block a variable is live into and the last block it is
+    live out of can widen the hull (anywhere else it is also read, written
+    or live on the other side of the block), so the live sets are walked
+    forwards and backwards once, visiting each variable's bits only the
+    first time they show up.
+    """
+    def extend(region, name, position):
+        interval = region.intervals.get(name)
+        if interval is None:
+            region.intervals[name] = LiveInterval(name, position, position)
+        elif position < interval.start:
+            interval.start = position
+        elif position > interval.end:
+            interval.end = position
+
+    bounds = []
+    position = 0
+    for block in cfg.blocks:
+        first = position
+        owner = owners[first]
+        region = regions[owner]
+        names = allocatable[owner]
+        for ins in block.instructions:
+            for var in block_uses(ins):
+                if var in names:
+                    extend(region, var, 2 * position)
+            for var in block_defs(ins):
+                if var in names:
+                    extend(region, var, 2 * position + 1)
+            position += 1
+        bounds.append((owner, 2 * first, 2 * position - 1))
+
+    seen = {}
+    for block, (owner, start, _) in zip(cfg.blocks, bounds):
+        new = liveness.live_in[block.index] & ~seen.get(owner, 0)
+        if new:
+            seen[owner] = seen.get(owner, 0) | new
+            for var in live_names(liveness, new):
+                if var in allocatable[owner]:
+                    extend(regions[owner], var, start)
+
+    seen = {}
+    for block, (owner, _, end) in zip(reversed(cfg.blocks), reversed(bounds)):
+        new = liveness.live_out[block.index] & ~seen.get(owner, 0)
+        if new:
+            seen[owner] = seen.get(owner, 0) | new
+            for var in live_names(liveness, new):
+                if var in allocatable[owner]:
+                    extend(regions[owner], var, end)
+
+
+def live_names(liveness, bits):
+    """Yield the names in a liveness bitset, visiting only the bits that are set"""
+    variables = liveness.variables
+    while bits:
+        low = bits & -bits
+        yield variables[low.bit_length() - 1]
+        bits ^= low
+
+
+def linear_scan(region, registers):
+    """
+    Assign registers to a region's intervals, spilling where they run out.
+
+    Intervals are visited in order of start. Those that ended are expired
+    first; when no register is free, the active interval that ends last is
+    spilled (possibly the new one itself). The active list never holds more
+    than `registers` intervals, so each step costs O(registers) and the scan
+    is dominated by the initial sort.
+    """
+    intervals = sorted(region.intervals.values(), key=lambda interval: interval.start)
+    free = [f"r{i}" for i in range(registers - 1, -1, -1)]
+    active = []
+    active_ends = []
+    spilled = []
+    used = set()
+
+    for interval in intervals:
+        while active_ends and active_ends[0] < interval.start:
+            active_ends.pop(0)
+            free.append(active.pop(0).register)
+
+        if free:
+            interval.register = free.pop()
+        elif active_ends[-1] > interval.end:
+            victim = active.pop()
+            active_ends.pop()
+            interval.register = victim.register
+            victim.register = None
+            spilled.append(victim)
+        else:
+            spilled.append(interval)
+            continue
+
+        used.add(interval.register)
+        k = bisect.bisect_right(active_ends, interval.end)
+        active_ends.insert(k, interval.end)
+        active.insert(k, interval)
+
+    region.registers_used = len(used)
+    region.stack_slots = assign_slots(spilled)
+    region.max_pressure = max_pressure(intervals)
+
+
+def assign_slots(spilled):
+    """Give spilled intervals stack slots, reusing a slot once its interval ended"""
+    busy = []
+    free = []
+    slots = 0
+    for interval in sorted(spilled, key=lambda interval: interval.start):
+        while busy and busy[0][0] < interval.start:
+            heapq.heappush(free, heapq.heappop(busy)[1])
+        if free:
+            interval.slot = heapq.heappop(free)
+        else:
+            interval.slot = slots
+            slots += 1
+        heapq.heappush(busy, (interval.end, interval.slot))
+    return slots
+
+
+def max_pressure(intervals):
+    """Largest number of intervals live at one position; `intervals` are sorted by start"""
+    ends = sorted(interval.end for interval in intervals)
+    live = 0
+    highest = 0
+    k = 0
+    for interval in intervals:
+        while k < len(ends) and ends[k] < interval.start:
+            k += 1
+            live -= 1
+        live += 1
+        highest = max(highest, live)
+    return highest
+
+
+def allocate_registers(code, registers=DEFAULT_REGISTERS):
+    """
+    Run linear-scan register allocation over a listing.
+
+    The module body and every function body are allocated separately,
+    each over `registers` general registers. Liveness comes from the same
+    bitset analysis dead code elimination uses.
+
+    Args:
+        code (list): List of Instruction objects
+        registers (int): Number of allocatable registers
+
+    Returns:
+        Allocation: Interval, register or spill slot of every variable
+    """
+    if registers < 1:
+        raise ValueError("at least one register is needed")
+    cfg = build_cfg(code)
+    liveness = LivenessAnalysis(cfg)
+    listing = cfg.to_code()
+    regions, owners = split_regions(listing)
+    allocatable = allocatable_names(listing, regions, owners, liveness.global_names)
+    compute_intervals(cfg, liveness, owners, allocatable, regions)
+    for region in regions:
+        linear_scan(region, registers)
+    return Allocation(registers, listing, regions, owners)
@@ -0,0 +1,441 @@
+import bisect
+import mmap
+import struct
+
+from src.ir import (
+    Instruction, Const, ARITHMETIC_OPS, COMPARISON_OPS, UNARY_OPS, COPY, INDEX, GET_ATTR,
+    SET_INDEX, SET_ATTR, BUILD_LIST, BUILD_TUPLE, CALL, METHOD_CALL, IF_FALSE, GOTO, LABEL,
+    FUNCTION, PARAMS, END_FUNCTION, RETURN, PRINT, COMMENT, UNSUPPORTED, ERROR, format_instruction,
+)
+
+# File layout (all integers are unsigned LEB128 varints):
+#
+#   MAGIC, VERSION byte
+#   metadata length, metadata (UTF-8 JSON text, may be empty)
+#   string count, then each string as length + UTF-8 bytes
+#   listing count, then each listing as instruction count + byte length + instructions
+#
+# An instruction is its opcode byte followed by dest, arg1 and arg2 encoded as
+# values. A value is a varint (payload << 3 | tag), with the tags below; names
+# and string literals are indexes into the string table, so a temp or label that
+# appears a thousand times is stored once.
+MAGIC = b'ICGIR'
+VERSION = 1
+
+TAG_NAME = 0        # plain string operand (variable, label, attribute, message)
+TAG_STR = 1         # Const(str)
+TAG_INT = 2         # Const(int) >= 0
+TAG_NEG_INT = 3     # Const(int) < 0, payload is -value - 1
+TAG_SPECIAL = 4     # payload indexes SPECIAL_VALUES
+TAG_FLOAT = 5       # payload 0: 8-byte float follows, 1: 16-byte complex follows
+TAG_BYTES = 6       # Const(bytes), payload is the length, raw bytes follow
+TAG_TUPLE = 7       # payload is the length, the elements follow
+
+SPECIAL_VALUES = [None, Const(None), Const(True), Const(False), Const(...)]
+
+FLOAT = struct.Struct('<d')
+COMPLEX = struct.Struct('<dd')
+
+# Opcode byte -> opcode. Append only: the byte values are part of the format.
+OPCODES = [
+    COPY, INDEX, GET_ATTR, SET_INDEX, SET_ATTR, BUILD_LIST, BUILD_TUPLE, CALL, METHOD_CALL,
+    IF_FALSE, GOTO, LABEL, FUNCTION, PARAMS, END_FUNCTION, RETURN, PRINT, COMMENT,
+    UNSUPPORTED, ERROR,
+] + sorted(ARITHMETIC_OPS) + sorted(COMPARISON_OPS) + sorted(UNARY_OPS)
+OPCODE_BYTES = {op: i for i, op in enumerate(OPCODES)}
+
+
+class FormatError(ValueError):
+    """Raised when a buffer is not a serialized IR module this version can read"""
+
+
+def write_varint(out, value):
+    """Append `value` to the bytearray `out` as an unsigned LEB128 varint"""
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(view, pos):
+    """Decode the varint at `pos`, returning (value, position after it)"""
+    result = 0
+    shift = 0
+    while True:
+        try:
+            byte = view[pos]
+        except IndexError:
+            raise FormatError("truncated varint") from None
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+class _Encoder:
+    """Encodes instructions against one string table shared by every listing"""
+
+    def __init__(self):
+        self.strings = {}
+
+    def string(self, text):
+        index = self.strings.get(text)
+        if index is None:
+            index = self.strings[text] = len(self.strings)
+        return index
+
+    def value(self, out, value):
+        kind = type(value)
+        if kind is str:
+            write_varint(out, self.string(value) << 3 | TAG_NAME)
+        elif kind is tuple:
+            write_varint(out, len(value) << 3 | TAG_TUPLE)
+            for item in value:
+                self.value(out, item)
+        elif value is None:
+            out.append(TAG_SPECIAL)
+        elif kind is Const:
+            self.const(out, value.value)
+        else:
+            raise TypeError(f"cannot serialize operand {value!r}")
+
+    def const(self, out, value):
+        kind = type(value)
+        if kind is str:
+            write_varint(out, self.string(value) << 3 | TAG_STR)
+        elif kind is int:
+            if value >= 0:
+                write_varint(out, value << 3 | TAG_INT)
+            else:
+                write_varint(out, (-value - 1) << 3 | TAG_NEG_INT)
+        elif kind is float:
+            out.append(TAG_FLOAT)
+            out += FLOAT.pack(value)
+        elif kind is complex:
+            out.append(1 << 3 | TAG_FLOAT)
+            out += COMPLEX.pack(value.real, value.imag)
+        elif kind is bytes:
+            write_varint(out, len(value) << 3 | TAG_BYTES)
+            out += value
+        elif value is None:
+            out.append(1 << 3 | TAG_SPECIAL)
+        elif value is True:
+            out.append(2 << 3 | TAG_SPECIAL)
+        elif value is False:
+            out.append(3 << 3 | TAG_SPECIAL)
+        elif value is ...:
+            out.append(4 << 3 | TAG_SPECIAL)
+        else:
+            raise TypeError(f"cannot serialize literal {value!r}")
+
+    def instructions(self, code):
+        out = bytearray()
+        for instruction in code:
+            opcode = OPCODE_BYTES.get(instruction.op)
+            if opcode is None:
+                raise TypeError(f"cannot serialize opcode {instruction.op!r}")
+            out.append(opcode)
+            self.value(out, instruction.dest)
+            self.value(out, instruction.arg1)
+            self.value(out, instruction.arg2)
+        return out
+
+
+def encode_listings(listings, metadata=''):
+    """
+    Serialize instruction listings into the compact binary format.
+
+    Args:
+        listings (list): Lists of Instruction objects, for example the
+            intermediate and the optimized code of one module
+        metadata (str): Text stored alongside, usually JSON
+
+    Returns:
+        bytes: The encoded module
+    """
+    encoder = _Encoder()
+    bodies = [(len(code), encoder.instructions(code)) for code in listings]
+
+    out = bytearray(MAGIC)
+    out.append(VERSION)
+    meta = metadata.encode('utf-8')
+    write_varint(out, len(meta))
+    out += meta
+    write_varint(out, len(encoder.strings))
+    for text in encoder.strings:
+        data = text.encode('utf-8', 'surrogatepass')
+        write_varint(out, len(data))
+        out += data
+    write_varint(out, len(bodies))
+    for count, body in bodies:
+        write_varint(out, count)
+        write_varint(out, len(body))
+        out += body
+    return bytes(out)
+
+
+class IRReader:
+    """
+    Read a serialized module without copying it.
+
+    The buffer (bytes, memoryview or mmap) is wrapped in a memoryview and
+    only the header is parsed up front: the string table is indexed by
+    offset and each string is decoded the first time an instruction uses it,
+    and a listing's instructions are decoded as it is iterated. Listings can
+    be read in any order without decoding the ones before them.
+    """
+
+    def __init__(self, buffer):
+        self._view = view = memoryview(buffer)
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise FormatError("not a serialized IR module")
+        pos = len(MAGIC)
+        if len(view) <= pos or view[pos] != VERSION:
+            raise FormatError("unsupported IR format version")
+        pos += 1
+
+        length, pos = read_varint(view, pos)
+        self._metadata = (pos, pos + length)
+        pos += length
+
+        count, pos = read_varint(view, pos)
+        self._string_offsets = []
+        for _ in range(count):
+            length, pos = read_varint(view, pos)
+            self._string_offsets.append((pos, pos + length))
+            pos += length
+        self._strings = [None] * count
+
+        count, pos = read_varint(view, pos)
+        self._listings = []
+        for _ in range(count):
+            instructions, pos = read_varint(view, pos)
+            length, pos = read_varint(view, pos)
+            self._listings.append((instructions, pos, pos + length))
+            pos += length
+        if pos > len(view):
+            raise FormatError("truncated IR module")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Release the memoryview so the underlying buffer (or mmap) can be closed"""
+        self._view.release()
+
+    @property
+    def metadata(self):
+        """The metadata text stored with the listings"""
+        start, end = self._metadata
+        return str(self._view[start:end], 'utf-8')
+
+    def __len__(self):
+        return len(self._listings)
+
+    def instruction_count(self, index):
+        """Number of instructions in listing `index`, without decoding them"""
+        return self._listings[index][0]
+
+    def listing(self, index):
+        """Yield the Instruction objects of listing `index` one at a time"""
+        count, pos, end = self._listings[index]
+        view = self._view
+        value = self._value
+        for _ in range(count):
+            try:
+                op = OPCODES[view[pos]]
+            except IndexError:
+                raise FormatError("invalid or truncated instruction") from None
+            dest, pos = value(pos + 1)
+            arg1, pos = value(pos)
+            arg2, pos = value(pos)
+            yield Instruction(op, dest, arg1, arg2)
+        if pos != end:
+            raise FormatError("listing length does not match its instructions")
+
+    def lines(self, index):
+        """Yield listing `index` in the textual three-address form"""
+        for instruction in self.listing(index):
+            yield format_instruction(instruction)
+
+    def _string(self, index):
+        text = self._strings[index]
+        if text is None:
+            start, end = self._string_offsets[index]
+            text = self._strings[index] = \
+                str(self._view[start:end], 'utf-8', 'surrogatepass')
+        return text
+
+    def _value(self, pos):
+        header, pos = read_varint(self._view, pos)
+        tag = header & 7
+        payload = header >> 3
+        if tag == TAG_NAME:
+            return self._string(payload), pos
+        if tag == TAG_TUPLE:
+            items = []
+            for _ in range(payload):
+                item, pos = self._value(pos)
+                items.append(item)
+            return tuple(items), pos
+        if tag == TAG_STR:
+            return Const(self._string(payload)), pos
+        if tag == TAG_INT:
+            return Const(payload), pos
+        if tag == TAG_NEG_INT:
+            return Const(-payload - 1), pos
+        if tag == TAG_SPECIAL:
+            return SPECIAL_VALUES[payload], pos
+        if tag == TAG_FLOAT:
+            if payload == 0:
+                return Const(FLOAT.unpack_from(self._view, pos)[0]), pos + FLOAT.size
+            real, imag = COMPLEX.unpack_from(self._view, pos)
+            return Const(complex(real, imag)), pos + COMPLEX.size
+        return Const(bytes(self._view[pos:pos + payload])), pos + payload
+
+
+def decode_listings(data):
+    """Decode every listing of a serialized module into lists of Instruction objects"""
+    reader = IRReader(data)
+    return [list(reader.listing(i)) for i in range(len(reader))]
+
+
+def write_ir_file(path, listings, metadata=''):
+    """Store listings in a file in the binary format"""
+    with open(path, 'wb') as f:
+        f.write(encode_listings(listings, metadata))
+
+
+class IRFile(IRReader):
+    """An IRReader over a memory-mapped file, for stored artifacts too large to load"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            super().__init__(self._mmap)
+        except Exception:
+            self._mmap.close()
+            raise
+
+    def close(self):
+        super().close()
+        self._mmap.close()
+
+
+def listing_delta(before, after):
+    """
+    Describe `after` as edits to `before`.
+
+    Lines are matched with patience diff: lines that occur exactly once on
+    both sides are anchors, the longest increasing run of anchors is kept
+    and the gaps between them are matched the same way. Generated code is
+    full of unique temporaries and labels, so this stays close to linear
+    where difflib's matcher is quadratic on large listings.
+
+    Args:
+        before (list): Lines (or other hashable items) of the original listing
+        after (list): Lines of the changed listing
+
+    Returns:
+        list: [start, end, replacement] edits in ascending order; replacing
+            before[start:end] with each replacement gives `after`
+    """
+    delta = []
+    i = j = 0
+    for match_i, match_j in _matching_lines(before, after):
+        if match_i > i or match_j > j:
+            delta.append([i, match_i, after[j:match_j]])
+        i = match_i + 1
+        j = match_j + 1
+    if i < len(before) or j < len(after):
+        delta.append([i, len(before), after[j:]])
+    return delta
+
+
+def _matching_lines(before, after):
+    """Return the (i, j) pairs with before[i] == after[j] kept by patience diff, in order"""
+    matches = []
+    # Entries are either a list of matched pairs or a range still to be matched,
+    # (before start, before end, after start, after end); popping them in order
+    # keeps `matches` sorted
+    stack = [(0, len(before), 0, len(after))]
+    while stack:
+        item = stack.pop()
+        if type(item) is list:
+            matches.extend(item)
+            continue
+        lo1, hi1, lo2, hi2 = item
+        while lo1 < hi1 and lo2 < hi2 and before[lo1] == after[lo2]:
+            matches.append((lo1, lo2))
+            lo1 += 1
+            lo2 += 1
+        tail = []
+        while lo1 < hi1 and lo2 < hi2 and before[hi1 - 1] == after[hi2 - 1]:
+            hi1 -= 1
+            hi2 -= 1
+            tail.append((hi1, hi2))
+        tail.reverse()
+
+        parts = []
+        prev1, prev2 = lo1, lo2
+        for i, j in _unique_anchors(before, lo1, hi1, after, lo2, hi2):
+            parts.append((prev1, i, prev2, j))
+            parts.append([(i, j)])
+            prev1, prev2 = i + 1, j + 1
+        if parts:
+            parts.append((prev1, hi1, prev2, hi2))
+        parts.append(tail)
+        stack.extend(reversed(parts))
+    return matches
+
+
+def _unique_anchors(before, lo1, hi1, after, lo2, hi2):
+    """Longest increasing run of lines that occur once in both ranges"""
+    counts = {}
+    for i in range(lo1, hi1):
+        line = before[i]
+        entry = counts.get(line)
+        counts[line] = [i, None] if entry is None else [-1, None]
+    for j in range(lo2, hi2):
+        entry = counts.get(after[j])
+        if entry is not None and entry[0] >= 0:
+            entry[1] = j if entry[1] is None else -1
+    pairs = sorted((i, j) for i, j in counts.values() if i >= 0 and j is not None and j >= 0)
+
+    # Patience sorting: tops[k] is the pair ending the best run of length k + 1
+    tops = []
+    top_js = []
+    back = {}
+    for pair in pairs:
+        k = bisect.bisect_left(top_js, pair[1])
+        back[pair] = tops[k - 1] if k else None
+        if k == len(tops):
+            tops.append(pair)
+            top_js.append(pair[1])
+        else:
+            tops[k] = pair
+            top_js[k] = pair[1]
+    run = []
+    pair = tops[-1] if tops else None
+    while pair is not None:
+        run.append(pair)
+        pair = back[pair]
+    run.reverse()
+    return run
+
+
+def apply_delta(before, delta):
+    """Rebuild the changed listing from the original and a listing_delta"""
+    after = []
+    pos = 0
+    for start, end, replacement in delta:
+        after.extend(before[pos:start])
+        after.extend(replacement)
+        pos = end
+    after.extend(before[pos:])
+    return after
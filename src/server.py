@@ -0,0 +1,180 @@
+"""
+Production serving with a pre-forking gunicorn server.
+
+    python main.py serve [--bind 0.0.0.0:8000] [--workers N] [--compile-timeout S]
+
+The application is imported and warmed up once in the master process,
+then forked into sync workers that share its memory copy-on-write. Each
+worker reuses one generator and optimizer across requests (see
+src.app.worker_compiler), and the limits in src.app bound request size
+and compile time; gunicorn's worker timeout is the last resort for a
+worker that stops responding. Each worker starts its own optimizer pool
+on first use, after the fork, so the CPUs are divided between the
+workers rather than every worker getting a pool of one per CPU.
+
+Background jobs (/jobs) are kept in the memory of the worker that
+accepted them, and a later poll or cancel may reach any worker. They are
+therefore only served with a single worker: with several, they are
+turned off unless --job-workers asks for them, which is refused.
+"""
+import argparse
+import os
+import sys
+
+# Allow running as `python src/server.py` as well as `python -m src.server`
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    # gunicorn is POSIX-only; main() reports it instead of failing at import
+    BaseApplication = object
+
+DEFAULT_BIND = '127.0.0.1:8000'
+
+# Threads running /jobs compilations when the server has a single worker
+DEFAULT_JOB_WORKERS = 2
+
+# Worker timeout on top of the compile timeout before gunicorn kills a worker
+WORKER_TIMEOUT_MARGIN = 20
+
+# Exercises the generator, every pass and the interpreter before workers fork
+WARM_UP_SOURCE = """
+def scale(values, factor):
+    result = []
+    for v in values:
+        result.append(v * factor + 2 * 3)
+    return result
+
+total = 0
+i = 0
+while i < 10:
+    total = total + i * 4
+    i = i + 1
+if total > 100 and not False:
+    print(scale([1, 2, 3], total), len("abc"))
+"""
+
+
+def warm_up():
+    """
+    Run a small program through every stage in the master process.
+
+    Imports, lazily built tables and the master thread's generator and
+    optimizer are then in place before the workers fork, so no worker
+    pays for them on its first request.
+    """
+    from src.app import worker_compiler
+    from src.interpreter import run_code
+    from src.ir import format_code
+    from src.optimizer import DEFAULT_PIPELINE
+    from src.pass_manager import PassManager
+
+    generator, optimizer = worker_compiler()
+    code = generator.generate(WARM_UP_SOURCE)
+    optimized = PassManager(DEFAULT_PIPELINE, optimizer).run(code)
+    format_code(code)
+    format_code(optimized)
+    run_code(optimized)
+
+
+def post_fork(server, worker):
+    """Give each worker its own compilation cache connection"""
+    from src.app import compile_cache
+    compile_cache.reconnect()
+
+
+class ProductionServer(BaseApplication):
+    """gunicorn application serving an already imported WSGI app"""
+
+    def __init__(self, application, options):
+        self.application = application
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if value is not None and key in self.cfg.settings:
+                self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+
+def optimizer_workers(args):
+    """Size of each worker's optimizer pool, see src.app.OPTIMIZER_WORKERS"""
+    if args.optimizer_workers is not None:
+        return args.optimizer_workers
+    share = (os.cpu_count() or 1) // args.workers
+    # A pool of one process only adds the cost of shipping the code to it
+    return share if share >= 2 else 0
+
+
+def build_options(args):
+    """Translate command line arguments into gunicorn settings"""
+    return {
+        'bind': args.bind,
+        'workers': args.workers,
+        # Compilation is CPU-bound, so one request per process; the
+        # compile deadline also relies on requests running on the main thread
+        'worker_class': 'sync',
+        'preload_app': True,
+        'timeout': int(args.compile_timeout) + WORKER_TIMEOUT_MARGIN,
+        'max_requests': args.max_requests,
+        'max_requests_jitter': args.max_requests // 10 if args.max_requests else 0,
+        'post_fork': post_fork,
+        'accesslog': '-' if args.access_log else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the code generator with pre-forked workers.")
+    parser.add_argument('--bind', default=DEFAULT_BIND, help="Address to listen on (host:port)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (default: one per CPU)")
+    parser.add_argument('--compile-timeout', type=float,
+                        default=float(os.environ.get('COMPILE_TIMEOUT', 10)),
+                        help="Seconds before a compilation is aborted with 503")
+    parser.add_argument('--optimization-budget', type=float,
+                        default=float(os.environ.get('OPTIMIZATION_BUDGET', 5)),
+                        help="Seconds after which no further optimizer pass is started")
+    parser.add_argument('--max-request-bytes', type=int,
+                        default=int(os.environ.get('MAX_REQUEST_BYTES', 2 * 1024 * 1024)),
+                        help="Largest request body accepted")
+    parser.add_argument('--optimizer-workers', type=int,
+                        default=int(os.environ['OPTIMIZER_WORKERS']) if 'OPTIMIZER_WORKERS' in os.environ else None,
+                        help="Optimizer pool processes of each worker, 0 to optimize in the worker "
+                             "(default: the CPUs divided between the workers)")
+    parser.add_argument('--job-workers', type=int,
+                        default=int(os.environ['JOB_WORKERS']) if 'JOB_WORKERS' in os.environ else None,
+                        help="Threads running /jobs compilations, 0 to turn /jobs off "
+                             f"(default: {DEFAULT_JOB_WORKERS} with one worker, else 0)")
+    parser.add_argument('--max-requests', type=int, default=10_000,
+                        help="Requests before a worker is recycled (0 to never recycle)")
+    parser.add_argument('--access-log', action='store_true', help="Log every request to stdout")
+    args = parser.parse_args(argv)
+
+    if BaseApplication is object:
+        sys.exit("Production mode needs gunicorn: pip install gunicorn (POSIX only)")
+
+    job_workers = args.job_workers
+    if job_workers is None:
+        job_workers = DEFAULT_JOB_WORKERS if args.workers == 1 else 0
+    if job_workers > 0 and args.workers > 1:
+        sys.exit("Background jobs live in the worker that accepted them, so they need --workers 1; "
+                 "use --job-workers 0 to serve several workers without /jobs")
+
+    # src.app reads its limits from the environment when it is imported
+    os.environ['COMPILE_TIMEOUT'] = str(args.compile_timeout)
+    os.environ['OPTIMIZATION_BUDGET'] = str(args.optimization_budget)
+    os.environ['MAX_REQUEST_BYTES'] = str(args.max_request_bytes)
+    os.environ['JOB_WORKERS'] = str(job_workers)
+    os.environ['OPTIMIZER_WORKERS'] = str(optimizer_workers(args))
+
+    from src.app import app
+    warm_up()
+    ProductionServer(app, build_options(args)).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,471 @@
+import math
+
+from src.cfg import build_cfg
+from src.folding import fold_binary, fold_unary, FOLDABLE_TYPES
+from src.ir import (
+    Instruction, Const, COPY, IF_FALSE, GOTO, PARAMS, FUNCTION, END_FUNCTION, BINARY_OPS,
+    UNARY_OPS,
+)
+
+# Instructions whose result the constant propagator can compute; every
+# other definition (calls, indexing, parameters, ...) is unknown
+EVALUATED_OPS = BINARY_OPS | frozenset(UNARY_OPS) | frozenset([COPY])
+
+
+class _Lattice:
+    """Marker for the two non-constant lattice values"""
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+
+# Not yet known to have any value (no executable definition seen)
+TOP = _Lattice('TOP')
+# May have more than one value at run time
+BOTTOM = _Lattice('BOTTOM')
+
+# Value number shared by every definition or read the propagator cannot know
+UNKNOWN = 0
+
+
+class SSAForm:
+    """
+    Static single assignment view of an instruction listing.
+
+    The listing itself is not rewritten. Every computed definition gets a
+    value number, every read is mapped to the value number that reaches
+    it, and phis are placed at the iterated dominance frontiers of the
+    blocks that define each variable. Only variables read in some block
+    before being written there can need a phi (semi-pruned form), so
+    temporaries that live inside one block never get one, and neither do
+    variables only ever set by calls or parameters.
+
+    Module code and every function body are renamed separately from their
+    own entry. Everything the propagator cannot know - call results,
+    parameters, reads with no definition on some path (globals, builtins,
+    names bound by an earlier listing) - shares the single value UNKNOWN.
+    So do names bound by `function` instructions: the binding happens
+    where the definition is written, which the module's control flow steps
+    over, so every read of them is unknown.
+
+    Values are plain integers. For each instruction `operand_values[pos]`
+    holds one value number per operand (None for literals), and
+    `def_values[pos]` the value it defines, positions counting
+    instructions in block order across the whole listing.
+    """
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.code = []
+        self.block_of = []
+        self.block_start = []
+        self.operand_values = []
+        self.def_values = []
+        # Per value: the variable, and the instructions and phis that read it
+        self.value_names = [None]
+        self.instruction_users = [[]]
+        self.phi_users = [[]]
+        # Block index -> phi values placed there; phi value -> block and (pred, value) args
+        self.phis = {}
+        self.phi_block = {}
+        self.phi_args = {}
+        self._bound = frozenset()
+        self._build()
+
+    def new_value(self, var):
+        value = len(self.value_names)
+        self.value_names.append(var)
+        self.instruction_users.append([])
+        self.phi_users.append([])
+        return value
+
+    def _build(self):
+        cfg = self.cfg
+        for block in cfg.blocks:
+            self.block_start.append(len(self.code))
+            self.code.extend(block.instructions)
+            self.block_of.extend([block.index] * len(block.instructions))
+        self.block_start.append(len(self.code))
+        self.operand_values = [None] * len(self.code)
+        self.def_values = [None] * len(self.code)
+        self._bound = frozenset(ins.arg1 for ins in self.code if ins.op == FUNCTION)
+
+        idom = cfg.dominators()
+        frontiers = self._dominance_frontiers(idom)
+        children = {}
+        for node, parent in idom.items():
+            if node != parent:
+                children.setdefault(parent, []).append(node)
+
+        for entry in cfg.entries:
+            region = cfg.reverse_postorder(entry)
+            if len(region) > 1:
+                self._place_phis(region, frontiers)
+            self._rename(entry, children)
+
+    def _dominance_frontiers(self, idom):
+        """
+        Dominance frontier of every reachable block.
+
+        Each join is walked up from its predecessors to its immediate
+        dominator (Cooper, Harvey and Kennedy). A region entry acts as if
+        it had an extra predecessor outside the region, so a loop back to
+        the entry puts the entry in the frontier of the loop body.
+        """
+        frontiers = {}
+        for block in self.cfg.blocks:
+            b = block.index
+            if b not in idom:
+                continue
+            preds = [p for p in block.predecessors if p in idom]
+            is_entry = idom[b] == b
+            if len(preds) < 2 and not (is_entry and preds):
+                continue
+            for runner in preds:
+                while is_entry or runner != idom[b]:
+                    frontiers.setdefault(runner, set()).add(b)
+                    if runner == idom[runner]:
+                        break
+                    runner = idom[runner]
+        return frontiers
+
+    def _place_phis(self, region, frontiers):
+        """Insert phis for the region's cross-block variables at their iterated frontiers"""
+        code = self.code
+        block_start = self.block_start
+        def_sites = {}
+        crossing = set()
+        # Variables set by an instruction the propagator can evaluate
+        computed = set()
+
+        for b in region:
+            written = set()
+            for pos in range(block_start[b], block_start[b + 1]):
+                ins = code[pos]
+                for operand in ins.operands():
+                    if type(operand) is str and operand not in written:
+                        crossing.add(operand)
+                dest = ins.dest
+                if dest is not None:
+                    if ins.op in EVALUATED_OPS:
+                        computed.add(dest)
+                    if dest not in written:
+                        written.add(dest)
+                        def_sites.setdefault(dest, []).append(b)
+                elif ins.op == PARAMS:
+                    for var in ins.arg1:
+                        if var not in written:
+                            written.add(var)
+                            def_sites.setdefault(var, []).append(b)
+
+        for var in crossing:
+            if var not in computed or var in self._bound:
+                continue
+            placed = set()
+            work = list(def_sites[var])
+            while work:
+                for b in frontiers.get(work.pop(), ()):
+                    if b not in placed:
+                        placed.add(b)
+                        phi = self.new_value(var)
+                        self.phis.setdefault(b, []).append(phi)
+                        self.phi_block[phi] = b
+                        self.phi_args[phi] = []
+                        work.append(b)
+
+    def _rename(self, entry, children):
+        """Map every read in the region to its reaching value, walking the dominator tree"""
+        code = self.code
+        blocks = self.cfg.blocks
+        block_start = self.block_start
+        bound = self._bound
+        phis = self.phis
+        value_names = self.value_names
+        instruction_users = self.instruction_users
+        operand_values = self.operand_values
+        def_values = self.def_values
+        # Variable -> value reaching the current point; undo restores it on the way back up
+        current = {}
+
+        # The entry is also reached from outside the region, where everything is unknown
+        for phi in phis.get(entry, ()):
+            self._add_phi_arg(phi, None, UNKNOWN)
+
+        work = [(entry, None)]
+        while work:
+            b, undo = work.pop()
+            if undo is not None:
+                for var, previous in reversed(undo):
+                    current[var] = previous
+                continue
+
+            undo = []
+            for phi in phis.get(b, ()):
+                var = value_names[phi]
+                undo.append((var, current.get(var, UNKNOWN)))
+                current[var] = phi
+
+            for pos in range(block_start[b], block_start[b + 1]):
+                ins = code[pos]
+                operands = ins.operands()
+                if operands:
+                    values = [current.get(operand, UNKNOWN) if type(operand) is str else None
+                              for operand in operands]
+                    operand_values[pos] = values
+                    for value in values:
+                        if value:
+                            instruction_users[value].append(pos)
+                dest = ins.dest
+                if dest is not None:
+                    value = self.new_value(dest) if ins.op in EVALUATED_OPS else UNKNOWN
+                    def_values[pos] = value
+                    if dest not in bound:
+                        undo.append((dest, current.get(dest, UNKNOWN)))
+                        current[dest] = value
+                elif ins.op == PARAMS:
+                    for var in ins.arg1:
+                        undo.append((var, current.get(var, UNKNOWN)))
+                        current[var] = UNKNOWN
+
+            for succ in blocks[b].successors:
+                for phi in phis.get(succ, ()):
+                    self._add_phi_arg(phi, b, current.get(value_names[phi], UNKNOWN))
+
+            work.append((b, undo))
+            for child in children.get(b, ()):
+                work.append((child, None))
+
+    def _add_phi_arg(self, phi, pred, value):
+        self.phi_args[phi].append((pred, value))
+        if value:
+            self.phi_users[value].append(phi)
+
+
+class SparseConditionalConstantPropagation:
+    """
+    Wegman-Zadeck sparse conditional constant propagation over an SSAForm.
+
+    Each value sits in a three-level lattice: TOP (no executable
+    definition seen yet), a Const, or BOTTOM (varies at run time). Two
+    worklists drive the analysis. A CFG edge that becomes executable
+    evaluates the phis of its target and, the first time the target is
+    reached, its instructions. A value that drops in the lattice
+    re-evaluates only the instructions and phis that read it. Every value
+    can drop at most twice, so the work is proportional to the number of
+    def-use edges plus the size of the graph.
+
+    Phis only meet the arguments of executable edges, and an `iffalse` on
+    a constant marks only the edge it takes, so code behind a branch that
+    never goes one way neither runs nor weakens the values after the join.
+    """
+
+    def __init__(self, ssa):
+        self.ssa = ssa
+        cfg = ssa.cfg
+        self.lattice = [TOP] * len(ssa.value_names)
+        self.lattice[UNKNOWN] = BOTTOM
+        self.executable = [False] * len(cfg.blocks)
+        self.edges = set()
+        # Worklists: CFG edges that became executable, values that dropped
+        self._flow = [(None, entry) for entry in cfg.entries]
+        self._values = []
+        self.label_blocks = {}
+        for block in cfg.blocks:
+            if block.label is not None:
+                self.label_blocks[block.label] = block.index
+        self._solve()
+
+    def value_of(self, pos, k):
+        """Lattice value of operand k of the instruction at pos"""
+        values = self.ssa.operand_values[pos]
+        value = values[k] if values is not None else None
+        if value is None:
+            operand = self.ssa.code[pos].operands()[k]
+            if type(operand) is Const and type(operand.value) in FOLDABLE_TYPES:
+                return operand
+            return BOTTOM
+        return self.lattice[value]
+
+    def _solve(self):
+        ssa = self.ssa
+        cfg = ssa.cfg
+        flow = self._flow
+        values = self._values
+
+        while flow or values:
+            while flow:
+                pred, b = flow.pop()
+                if pred is not None:
+                    if (pred, b) in self.edges:
+                        continue
+                    self.edges.add((pred, b))
+                for phi in ssa.phis.get(b, ()):
+                    self._visit_phi(phi)
+                if self.executable[b]:
+                    continue
+                self.executable[b] = True
+                for pos in range(ssa.block_start[b], ssa.block_start[b + 1]):
+                    self._visit(pos)
+                block = cfg.blocks[b]
+                if block.terminator.op != IF_FALSE:
+                    for succ in block.successors:
+                        flow.append((b, succ))
+
+            while values:
+                value = values.pop()
+                for phi in ssa.phi_users[value]:
+                    if self.executable[ssa.phi_block[phi]]:
+                        self._visit_phi(phi)
+                for pos in ssa.instruction_users[value]:
+                    if self.executable[ssa.block_of[pos]]:
+                        self._visit(pos)
+
+    def _lower(self, value, new):
+        old = self.lattice[value]
+        new = _meet(old, new)
+        if new is not old:
+            self.lattice[value] = new
+            self._values.append(value)
+
+    def _visit_phi(self, phi):
+        ssa = self.ssa
+        b = ssa.phi_block[phi]
+        result = TOP
+        for pred, value in ssa.phi_args[phi]:
+            if pred is None or (pred, b) in self.edges:
+                result = _meet(result, self.lattice[value])
+                if result is BOTTOM:
+                    break
+        self._lower(phi, result)
+
+    def _visit(self, pos):
+        ssa = self.ssa
+        ins = ssa.code[pos]
+        op = ins.op
+
+        if op == IF_FALSE:
+            condition = self.value_of(pos, 0)
+            if condition is TOP:
+                return
+            b = ssa.block_of[pos]
+            successors = ssa.cfg.blocks[b].successors
+            target = self.label_blocks.get(ins.arg2)
+            fallthrough = next((s for s in successors if s != target), target)
+            if condition is BOTTOM:
+                taken = successors
+            else:
+                taken = [target if not condition.value else fallthrough]
+            for succ in taken:
+                if succ is not None:
+                    self._flow.append((b, succ))
+            return
+
+        value = ssa.def_values[pos]
+        if not value:
+            return
+
+        if op == COPY:
+            result = self.value_of(pos, 0)
+        elif op in BINARY_OPS:
+            left = self.value_of(pos, 0)
+            right = self.value_of(pos, 1)
+            if left is BOTTOM or right is BOTTOM:
+                result = BOTTOM
+            elif left is TOP or right is TOP:
+                result = TOP
+            else:
+                result = fold_binary(op, left.value, right.value) or BOTTOM
+        else:
+            operand = self.value_of(pos, 0)
+            if operand is TOP or operand is BOTTOM:
+                result = operand
+            else:
+                result = fold_unary(op, operand.value) or BOTTOM
+        self._lower(value, result)
+
+    def constant(self, value):
+        """Return the Const a value always holds, or None"""
+        result = self.lattice[value]
+        return result if type(result) is Const else None
+
+
+def _meet(a, b):
+    if a is TOP:
+        return b
+    if b is TOP or a is b:
+        return a
+    if a is BOTTOM or b is BOTTOM:
+        return BOTTOM
+    if a == b and (type(a.value) is not float or math.copysign(1, a.value) == math.copysign(1, b.value)):
+        return a
+    return BOTTOM
+
+
+def propagate_constants(code):
+    """
+    Sparse conditional constant propagation over a whole listing.
+
+    Reads of values proven constant are replaced by the literal,
+    computations with a constant result become copies of it, branches on
+    a constant condition become a jump or disappear, and blocks never
+    reached from an executable edge are removed. Definitions are left in
+    place for dead code elimination to clean up.
+
+    Args:
+        code (list): List of Instruction objects
+
+    Returns:
+        tuple: (new instruction list, number of instructions changed or removed)
+    """
+    cfg = build_cfg(code)
+    ssa = SSAForm(cfg)
+    sccp = SparseConditionalConstantPropagation(ssa)
+    constant = sccp.constant
+
+    result = []
+    changes = 0
+    for block in cfg.blocks:
+        b = block.index
+        start = ssa.block_start[b]
+        # Function exits stay so `function`/`end function` remain balanced
+        if not sccp.executable[b] and block.instructions[0].op != END_FUNCTION:
+            changes += len(block.instructions)
+            continue
+
+        for pos in range(start, ssa.block_start[b + 1]):
+            ins = ssa.code[pos]
+            op = ins.op
+
+            if op == IF_FALSE:
+                condition = sccp.value_of(pos, 0)
+                if type(condition) is Const:
+                    if not condition.value:
+                        result.append(Instruction(GOTO, arg1=ins.arg2))
+                    changes += 1
+                    continue
+
+            value = ssa.def_values[pos]
+            if value is not None and op in EVALUATED_OPS:
+                const = constant(value)
+                if const is not None:
+                    if not (op == COPY and ins.arg1 == const):
+                        ins = Instruction(COPY, ins.dest, const)
+                        changes += 1
+                    result.append(ins)
+                    continue
+
+            values = ssa.operand_values[pos]
+            if values is not None:
+                operands = ins.operands()
+                replaced = [operand if value is None else constant(value) or operand
+                            for operand, value in zip(operands, values)]
+                if any(new is not old for new, old in zip(replaced, operands)):
+                    ins = ins.with_operands(replaced)
+                    changes += 1
+            result.append(ins)
+
+    return result, changes
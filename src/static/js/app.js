@@ -1,6 +1,16 @@
 // Initialize CodeMirror
 let editor = null;
 
+// Buffers at least this long are compiled incrementally, one top-level statement at a time
+const INCREMENTAL_THRESHOLD = 4000;
+
+// Buffers at least this long are compiled as background jobs that the page polls
+const JOB_THRESHOLD = 50000;
+const JOB_POLL_INTERVAL_MS = 500;
+
+// Background job of the latest generation, cancelled when it is superseded
+let currentJobId = null;
+
 document.addEventListener('DOMContentLoaded', function() {
     // Initialize CodeMirror editor
     const pythonCodeElement = document.getElementById("pythonCode");
@@ -35,8 +45,13 @@ function setupOptimizationControls() {
     const techniqueCheckboxes = [
         document.getElementById("constFoldingCheck"),
         document.getElementById("constPropCheck"), 
+        document.getElementById("ipcpCheck"),
+        document.getElementById("inliningCheck"),
+        document.getElementById("unreachableCheck"),
+        document.getElementById("cseCheck"),
         document.getElementById("deadCodeCheck"),
-        document.getElementById("combineAssgCheck")
+        document.getElementById("combineAssgCheck"),
+        document.getElementById("loopOptCheck")
     ];
     
     // When main checkbox changes, update all technique checkboxes
@@ -57,6 +72,7 @@ function clearCode() {
     if (editor) {
         editor.setValue("");
     }
+    cancelCurrentJob();
     resetOutputs();
 }
 
@@ -67,6 +83,8 @@ function resetOutputs() {
     document.getElementById("linesAfter").innerText = "-";
     document.getElementById("opsRemoved").innerText = "-";
     document.getElementById("sizeReduction").innerText = "-";
+    resetExecutionStats();
+    displayTargetCode(null);
     document.getElementById("optimizationsList").innerHTML = "<li class='list-group-item'>Run code generation first to see details</li>";
 }
 
@@ -75,13 +93,20 @@ async function generateIntermediateCode() {
     
     const pythonCode = editor.getValue();
     const optimize = document.getElementById("optimizeCheckbox").checked;
+    const profile = document.getElementById("profileCheck")?.checked ?? false;
+    const allocate = document.getElementById("registersCheck")?.checked ?? false;
     
     // Get optimization settings
     const optimizationSettings = {
         constantFolding: document.getElementById("constFoldingCheck")?.checked ?? true,
         constantPropagation: document.getElementById("constPropCheck")?.checked ?? true,
+        interproceduralConstantPropagation: document.getElementById("ipcpCheck")?.checked ?? true,
+        functionInlining: document.getElementById("inliningCheck")?.checked ?? true,
+        unreachableCodeElimination: document.getElementById("unreachableCheck")?.checked ?? true,
+        commonSubexpressionElimination: document.getElementById("cseCheck")?.checked ?? true,
         deadCodeElimination: document.getElementById("deadCodeCheck")?.checked ?? true,
-        combineAssignments: document.getElementById("combineAssgCheck")?.checked ?? true
+        combineAssignments: document.getElementById("combineAssgCheck")?.checked ?? true,
+        loopOptimization: document.getElementById("loopOptCheck")?.checked ?? true
     };
     
     try {
@@ -89,25 +114,42 @@ async function generateIntermediateCode() {
         document.getElementById("intermediateOutput").innerText = "Generating...";
         document.getElementById("optimizedOutput").innerText = "Generating...";
         
-        // Send the code to the server
-        const response = await fetch('/generate', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                code: pythonCode,
-                optimize: optimize,
-                optimizationSettings: optimizationSettings
-            })
-        });
-        
-        // Process the response
-        if (!response.ok) {
-            throw new Error(`Server returned ${response.status}: ${response.statusText}`);
+        const requestBody = {
+            code: pythonCode,
+            optimize: optimize,
+            incremental: pythonCode.length >= INCREMENTAL_THRESHOLD,
+            profile: profile,
+            optimizationSettings: optimizationSettings
+        };
+        if (allocate) {
+            requestBody.registers = parseInt(document.getElementById("registerCount").value, 10) || 8;
         }
         
-        const data = await response.json();
+        // Large buffers go through the job API so the request does not time out,
+        // unless the server has background jobs turned off
+        let data = null;
+        if (pythonCode.length >= JOB_THRESHOLD) {
+            data = await runCompileJob(requestBody);
+        } else {
+            cancelCurrentJob();
+        }
+        if (data === null) {
+            // Send the code to the server
+            const response = await fetch('/generate', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify(requestBody)
+            });
+            
+            // Process the response
+            if (!response.ok) {
+                throw new Error(`Server returned ${response.status}: ${response.statusText}`);
+            }
+            
+            data = await response.json();
+        }
         
         // Display the results
         if (data.intermediate_code) {
@@ -121,11 +163,13 @@ async function generateIntermediateCode() {
             
             // Calculate and display optimization statistics
             displayOptimizationStats(data.intermediate_code, data.optimized_code, data.optimizations_applied || []);
+            displayExecutionStats(data.optimization_stats || {}, data.profile);
         } else {
             document.getElementById("optimizedOutput").innerText = 
                 "Optimization not applied";
             resetOptimizationStats();
         }
+        displayTargetCode(data);
         
         // Show the optimized code tab
         const optimizedTab = document.getElementById("optimized-tab");
@@ -142,6 +186,72 @@ async function generateIntermediateCode() {
     }
 }
 
+async function runCompileJob(requestBody) {
+    cancelCurrentJob();
+    
+    let response = await fetch('/jobs', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify(requestBody)
+    });
+    if (response.status === 503) {
+        // Background jobs are turned off on this server
+        return null;
+    }
+    if (!response.ok) {
+        throw new Error(`Server returned ${response.status}: ${response.statusText}`);
+    }
+    
+    let job = await response.json();
+    const jobId = job.job_id;
+    currentJobId = jobId;
+    
+    // Poll until the job finishes, showing its stage and the code generated so far
+    while (job.status === "queued" || job.status === "running") {
+        showJobProgress(job);
+        await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+        if (currentJobId !== jobId) {
+            throw new Error("Compilation cancelled");
+        }
+        
+        response = await fetch(`/jobs/${jobId}`);
+        if (!response.ok) {
+            throw new Error(`Server returned ${response.status}: ${response.statusText}`);
+        }
+        job = await response.json();
+    }
+    
+    if (currentJobId === jobId) {
+        currentJobId = null;
+    }
+    if (job.status === "done") {
+        return job.result;
+    }
+    if (job.status === "cancelled") {
+        throw new Error("Compilation cancelled");
+    }
+    throw new Error(job.error || `Compilation ${job.status}`);
+}
+
+function showJobProgress(job) {
+    const stage = job.stage ? ` (${job.stage})` : "";
+    document.getElementById("optimizedOutput").innerText = `Compiling in the background: ${job.status}${stage}...`;
+    if (job.partial && job.partial.intermediate_code) {
+        document.getElementById("intermediateOutput").innerText =
+            job.partial.intermediate_code.join('\n');
+    }
+}
+
+function cancelCurrentJob() {
+    if (!currentJobId) return;
+    
+    const jobId = currentJobId;
+    currentJobId = null;
+    fetch(`/jobs/${jobId}`, { method: 'DELETE' }).catch(error => console.error("Error:", error));
+}
+
 function displayOptimizationStats(originalCode, optimizedCode, optimizationsApplied) {
     if (!originalCode || !optimizedCode) return;
     
@@ -164,8 +274,13 @@ function displayOptimizationStats(originalCode, optimizedCode, optimizationsAppl
     if (!optimizationsApplied || optimizationsApplied.length === 0) {
         const constFolding = document.getElementById("constFoldingCheck")?.checked;
         const constProp = document.getElementById("constPropCheck")?.checked;
+        const ipcp = document.getElementById("ipcpCheck")?.checked;
+        const inlining = document.getElementById("inliningCheck")?.checked;
+        const unreachable = document.getElementById("unreachableCheck")?.checked;
+        const cse = document.getElementById("cseCheck")?.checked;
         const deadCode = document.getElementById("deadCodeCheck")?.checked;
         const combineAssign = document.getElementById("combineAssgCheck")?.checked;
+        const loopOpt = document.getElementById("loopOptCheck")?.checked;
         
         if (constFolding) {
             optimizationsListElement.innerHTML += `<li class="list-group-item text-success">Constant folding applied</li>`;
@@ -173,12 +288,27 @@ function displayOptimizationStats(originalCode, optimizedCode, optimizationsAppl
         if (constProp) {
             optimizationsListElement.innerHTML += `<li class="list-group-item text-success">Constant propagation applied</li>`;
         }
+        if (ipcp) {
+            optimizationsListElement.innerHTML += `<li class="list-group-item text-success">Interprocedural constant propagation applied</li>`;
+        }
+        if (inlining) {
+            optimizationsListElement.innerHTML += `<li class="list-group-item text-success">Function inlining applied</li>`;
+        }
+        if (unreachable) {
+            optimizationsListElement.innerHTML += `<li class="list-group-item text-success">Unreachable code elimination applied</li>`;
+        }
+        if (cse) {
+            optimizationsListElement.innerHTML += `<li class="list-group-item text-success">Common subexpression elimination applied</li>`;
+        }
         if (deadCode) {
             optimizationsListElement.innerHTML += `<li class="list-group-item text-success">Dead code elimination applied</li>`;
         }
         if (combineAssign) {
             optimizationsListElement.innerHTML += `<li class="list-group-item text-success">Assignment combinations applied</li>`;
         }
+        if (loopOpt) {
+            optimizationsListElement.innerHTML += `<li class="list-group-item text-success">Loop optimization applied</li>`;
+        }
     } else {
         // Display server-provided optimizations
         optimizationsApplied.forEach(opt => {
@@ -191,10 +321,44 @@ function displayOptimizationStats(originalCode, optimizedCode, optimizationsAppl
     }
 }
 
+function displayExecutionStats(stats, profile) {
+    if (!profile || stats.dynamic_instructions_before === undefined) {
+        resetExecutionStats();
+        return;
+    }
+    
+    const error = profile.intermediate_code.error || (profile.optimized_code && profile.optimized_code.error);
+    document.getElementById("dynamicBefore").innerText = stats.dynamic_instructions_before;
+    document.getElementById("dynamicAfter").innerText = stats.dynamic_instructions_after;
+    document.getElementById("dynamicReduction").innerText = error
+        ? `${stats.dynamic_reduction_percentage}% (stopped: ${error})`
+        : `${stats.dynamic_reduction_percentage}%`;
+}
+
+function displayTargetCode(data) {
+    const stats = data && data.register_allocation;
+    if (!stats) {
+        document.getElementById("targetOutput").innerText = "Enable register allocation to see target code...";
+        document.getElementById("registerStats").innerText = "";
+        return;
+    }
+    document.getElementById("targetOutput").innerText = data.target_code.join('\n');
+    document.getElementById("registerStats").innerText =
+        `${stats.registers} registers, peak pressure ${stats.max_pressure}, ` +
+        `${stats.spilled} variables spilled (${stats.spill_loads} loads, ${stats.spill_stores} stores)`;
+}
+
+function resetExecutionStats() {
+    document.getElementById("dynamicBefore").innerText = "-";
+    document.getElementById("dynamicAfter").innerText = "-";
+    document.getElementById("dynamicReduction").innerText = "-";
+}
+
 function resetOptimizationStats() {
     document.getElementById("linesBefore").innerText = "-";
     document.getElementById("linesAfter").innerText = "-";
     document.getElementById("opsRemoved").innerText = "-";
     document.getElementById("sizeReduction").innerText = "-";
+    resetExecutionStats();
     document.getElementById("optimizationsList").innerHTML = "<li class='list-group-item'>Optimization not enabled</li>";
 } 
\ No newline at end of file
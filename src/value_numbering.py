@@ -0,0 +1,244 @@
+from src.ir import (
+    Instruction, Const, is_temp, COPY, INDEX, GET_ATTR, SET_INDEX, SET_ATTR, BUILD_TUPLE,
+    CALL, METHOD_CALL, PARAMS, FUNCTION, LABEL, END_FUNCTION, BINARY_OPS, UNARY_OPS,
+)
+
+# Operators whose result does not depend on operand order for the builtin types.
+# '+' is missing on purpose: it concatenates strings, lists and tuples.
+COMMUTATIVE_OPS = frozenset(['*', '&', '|', '^', '==', '!=', 'is', 'is not'])
+
+# Builtins whose result depends only on their arguments (and what they refer to)
+PURE_CALLS = frozenset([
+    'len', 'abs', 'min', 'max', 'int', 'float', 'str', 'bool', 'round', 'ord', 'chr',
+])
+
+# Expressions that read through a reference; any store or impure call may change them
+MEMORY_OPS = frozenset([INDEX, GET_ATTR, CALL, 'in', 'not in'])
+
+# Literal types whose values can never change
+SCALAR_TYPES = frozenset([int, float, complex, bool, str, bytes, type(None)])
+
+# Pure builtins that always return a scalar
+SCALAR_CALLS = frozenset(['len', 'int', 'float', 'str', 'bool', 'round', 'ord', 'chr'])
+
+# Instructions that may write to lists, dicts or object attributes
+CLOBBER_OPS = frozenset([CALL, METHOD_CALL, SET_INDEX, SET_ATTR])
+
+# Instructions where control from other paths can join
+JOIN_OPS = frozenset([LABEL, FUNCTION, END_FUNCTION])
+
+
+class ValueNumbering:
+    """
+    Local value numbering over extended basic blocks.
+
+    Every variable and literal gets a value number, and every computation
+    is hashed as (op, operand value numbers). When the same key is seen
+    again while the variable that first held it still does, the
+    computation becomes a copy of that variable. Operands of commutative
+    operators are sorted so `a * b` and `b * a` share a key. Later reads of
+    a temporary turned into such a copy go to the original variable
+    instead, so the copy itself becomes dead.
+
+    The tables are cleared at labels and function boundaries, where other
+    paths join; the code after a conditional jump keeps them because it is
+    only reached from that jump. Reads through a reference (indexing,
+    attributes, `in`, pure builtin calls such as `len`) are dropped at the
+    first store or impure call, since either may change what they read.
+    So are operators applied to anything but scalars (literals and results
+    of operators and builtins on scalars): `L == M` or `L * 2` read the
+    lists L and M refer to.
+    """
+
+    def __init__(self, shadowed=()):
+        # Builtins the program rebinds are no longer known to be pure
+        self.pure_calls = PURE_CALLS - frozenset(shadowed)
+        self.reset()
+
+    def reset(self):
+        self.values = {}
+        self.holders = {}
+        self.copies = set()
+        self.expressions = {}
+        self.memory = {}
+        # Value numbers known to hold immutable scalars
+        self.scalars = set()
+        self.next_value = 0
+
+    def rewrite(self, ins):
+        """Return `ins`, or a copy of an earlier result that computed the same value"""
+        op = ins.op
+        if op in JOIN_OPS:
+            self.reset()
+            return ins
+
+        ins = self._substitute(ins)
+        dest = ins.dest
+        key = self._key(ins)
+        if key is None:
+            if op in CLOBBER_OPS and not self._is_pure_call(ins):
+                self.memory = {}
+            if dest is not None:
+                self._define(dest, self._fresh())
+            elif op == PARAMS:
+                for param in ins.arg1:
+                    self._define(param, self._fresh())
+            return ins
+
+        if op == COPY:
+            self._define(dest, key)
+            return ins
+
+        scalar = self._is_scalar(ins, key)
+        if op in MEMORY_OPS or not (scalar or op == BUILD_TUPLE):
+            table = self.memory
+        else:
+            table = self.expressions
+        value = table.get(key)
+        if value is not None:
+            holder = self._holder(value)
+            if holder is not None and holder != dest:
+                self._define(dest, value)
+                if is_temp(dest):
+                    self.copies.add(dest)
+                return Instruction(COPY, dest, holder)
+
+        value = self._fresh()
+        table[key] = value
+        if scalar:
+            self.scalars.add(value)
+        self._define(dest, value)
+        return ins
+
+    def _define(self, var, value):
+        """Record that `var` now holds `value`"""
+        self.values[var] = value
+        if self._holder(value) is None:
+            self.holders[value] = var
+
+    def _holder(self, value):
+        """Return the variable first seen holding `value`, if it still does"""
+        holder = self.holders.get(value)
+        if holder is not None and self.values.get(holder) == value:
+            return holder
+        return None
+
+    def _substitute(self, ins):
+        """Read temporaries this pass turned into copies from the variable they copy"""
+        copies = self.copies
+        if not copies:
+            return ins
+        operands = ins.operands()
+        replaced = None
+        for i, operand in enumerate(operands):
+            if operand in copies:
+                value = self.values.get(operand)
+                holder = self._holder(value) if value is not None else None
+                if holder is not None and holder != operand:
+                    if replaced is None:
+                        replaced = list(operands)
+                    replaced[i] = holder
+        return ins if replaced is None else ins.with_operands(replaced)
+
+    def _key(self, ins):
+        """Hash key of the value an instruction computes, or None if it cannot be reused"""
+        op = ins.op
+        if ins.dest is None:
+            return None
+        if op == COPY:
+            return self._operand(ins.arg1)
+        if op in BINARY_OPS:
+            left = self._operand(ins.arg1)
+            right = self._operand(ins.arg2)
+            if op in COMMUTATIVE_OPS and right < left:
+                left, right = right, left
+            return (op, left, right)
+        if op in UNARY_OPS or op == INDEX:
+            return (op, self._operand(ins.arg1), self._operand(ins.arg2))
+        if op == GET_ATTR:
+            return (op, self._operand(ins.arg1), ins.arg2)
+        if op == BUILD_TUPLE:
+            return (op,) + tuple(self._operand(item) for item in ins.arg1)
+        if self._is_pure_call(ins):
+            return (op, ins.arg1) + tuple(self._operand(arg) for arg in ins.arg2)
+        return None
+
+    def _is_scalar(self, ins, key):
+        """Whether an operator or pure call only reads scalars and gives a scalar"""
+        op = ins.op
+        if op in BINARY_OPS or op in UNARY_OPS:
+            return all(value in self.scalars for value in key[1:] if value != -1)
+        return op == CALL and ins.arg1 in SCALAR_CALLS
+
+    def _is_pure_call(self, ins):
+        return ins.op == CALL and ins.arg1 in self.pure_calls
+
+    def _operand(self, operand):
+        """Value number of a variable or literal, numbering it on first sight"""
+        if operand is None:
+            return -1
+        if type(operand) is Const:
+            key = _literal_key(operand.value)
+            value = self.values.get(key)
+            if value is None:
+                value = self.values[key] = self._fresh()
+                if type(operand.value) in SCALAR_TYPES:
+                    self.scalars.add(value)
+            return value
+        value = self.values.get(operand)
+        if value is None:
+            value = self._fresh()
+            self._define(operand, value)
+        return value
+
+    def _fresh(self):
+        self.next_value += 1
+        return self.next_value
+
+
+def _literal_key(value):
+    """
+    Key a literal so that only interchangeable values share it.
+
+    0.0 and -0.0 are equal but print differently, and NaN is equal to
+    nothing, so floats and complex numbers are keyed by their repr.
+    """
+    kind = type(value)
+    if kind is float or kind is complex:
+        return (kind, repr(value))
+    return (kind, value)
+
+
+def rebound_names(code):
+    """Return every name the program assigns, takes as a parameter or defines as a function"""
+    names = set()
+    for ins in code:
+        if ins.op == FUNCTION:
+            names.add(ins.arg1)
+        elif ins.op == PARAMS:
+            names.update(ins.arg1)
+        elif ins.dest is not None:
+            names.add(ins.dest)
+    return names
+
+
+def number_values(code):
+    """
+    Replace recomputed values with copies of the variables already holding them.
+
+    Args:
+        code (list): List of Instruction objects
+
+    Returns:
+        tuple: (new instruction list, number of instructions replaced)
+    """
+    numbering = ValueNumbering(rebound_names(code))
+
+    result = []
+    replaced = 0
+    for ins in code:
+        new = numbering.rewrite(ins)
+        if new is not ins:
+            replaced += 1
+        result.append(new)
+    return result, replaced
@@ -0,0 +1,44 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from src.batch import compile_chunk, iter_batch
+
+
+def test_missing_source_does_not_read_the_named_file(tmp_path):
+    secret = tmp_path / "settings.py"
+    secret.write_text('SECRET_KEY = "hunter2"\n')
+
+    for name in [str(secret), "/etc/passwd"]:
+        [result] = compile_chunk([(name, None)])
+        assert 'error' in result
+        assert 'intermediate_code' not in result
+        assert 'hunter2' not in str(result)
+
+
+def test_iter_batch_does_not_read_files_by_default(tmp_path):
+    secret = tmp_path / "settings.py"
+    secret.write_text('SECRET_KEY = "hunter2"\n')
+
+    with ThreadPoolExecutor(1) as executor:
+        results = list(iter_batch([(str(secret), None), ("/etc/passwd", None)], executor=executor))
+    assert len(results) == 2
+    assert all('error' in result and 'hunter2' not in str(result) for result in results)
+
+
+def test_command_line_reads_files(tmp_path):
+    source = tmp_path / "program.py"
+    source.write_text("x = 1 + 2\n")
+
+    [result] = compile_chunk([(str(source), None)], read_files=True)
+    assert 'error' not in result
+    assert result['intermediate_code']
+
+
+def test_optimization_stops_at_the_time_budget():
+    source = "x = 1 + 2\ny = x * 3\nprint(y)\n"
+    [result] = compile_chunk([("program.py", source)], time_budget=0)
+    assert result['budget_exhausted']
+    assert result['lines_after'] == result['lines_before']
+
+    [result] = compile_chunk([("program.py", source)], time_budget=10)
+    assert not result['budget_exhausted']
+    assert result['lines_after'] < result['lines_before']
@@ -0,0 +1,71 @@
+import ast
+
+import pytest
+
+from benchmarks.programs import SHAPES
+from benchmarks.suite import compare, scaling_exponents
+from src.interpreter import run_code
+from src.optimizer import CodeOptimizer
+from src.parser import generate_intermediate_code
+
+
+@pytest.mark.parametrize('shape', list(SHAPES))
+def test_shapes_are_valid_programs_that_grow_with_size(shape):
+    small, large = SHAPES[shape](2), SHAPES[shape](8)
+    ast.parse(small)
+    assert len(generate_intermediate_code(large)) > len(generate_intermediate_code(small))
+
+
+@pytest.mark.parametrize('shape', list(SHAPES))
+def test_optimizing_a_shape_keeps_its_output(shape):
+    code = generate_intermediate_code(SHAPES[shape](2))
+    before = run_code(code)
+    assert before.get('error') is None
+    assert run_code(CodeOptimizer().optimize(code))['output'] == before['output']
+
+
+def run(size, instructions, **stages):
+    return {'size': size, 'instructions': instructions,
+            'stages': {stage: {'ms': ms, 'peak_kb': 100} for stage, ms in stages.items()}}
+
+
+def results(runs, calibration_ms=10.0):
+    return {'calibration_ms': calibration_ms,
+            'results': {'shape': {'runs': runs, 'exponents': scaling_exponents(runs)}}}
+
+
+def test_scaling_exponents():
+    exponents = scaling_exponents([run(1, 100, linear=10, quadratic=10, fast=1),
+                                   run(4, 400, linear=40, quadratic=160, fast=4)])
+    assert exponents == {'linear': 1.0, 'quadratic': 2.0, 'fast': None}
+
+
+def test_no_regressions_against_itself():
+    baseline = results([run(1, 100, a=20), run(4, 400, a=80)])
+    assert compare(baseline, baseline, 2.0, 0.5) == []
+
+
+def test_slower_stages_are_regressions():
+    baseline = results([run(1, 100, a=20, b=20), run(4, 400, a=80, b=80)])
+    current = results([run(1, 100, a=20, b=20), run(4, 400, a=80, b=200)])
+    messages = compare(current, baseline, 2.0, 0.5)
+    assert any('size 4 b' in message for message in messages)
+    assert not any(' a' in message for message in messages)
+
+
+def test_timings_are_calibrated_for_machine_speed():
+    baseline = results([run(1, 100, a=20), run(4, 400, a=80)])
+    slower_machine = results([run(1, 100, a=60), run(4, 400, a=240)], calibration_ms=30.0)
+    assert compare(slower_machine, baseline, 2.0, 0.5) == []
+
+
+def test_growing_exponent_is_a_regression():
+    baseline = results([run(1, 100, a=20), run(4, 400, a=80)])
+    current = results([run(1, 100, a=20), run(4, 400, a=320)])
+    assert any('scaling exponent 1.0 -> 2.0' in message for message in compare(current, baseline, 10.0, 0.5))
+
+
+def test_small_absolute_differences_are_noise():
+    baseline = results([run(1, 100, a=0.1)])
+    current = results([run(1, 100, a=1.0)])
+    assert compare(current, baseline, 2.0, 0.5) == []
@@ -0,0 +1,80 @@
+import sqlite3
+
+from src.cache import CompilationCache, cache_key
+
+
+def disk_rows(path):
+    with sqlite3.connect(path) as db:
+        return [key for key, in db.execute("SELECT key FROM entries ORDER BY rowid")]
+
+
+def test_disk_tier_keeps_the_newest_entries(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = CompilationCache(disk_path=path, max_disk_entries=3)
+    for i in range(5):
+        cache.put(f"k{i}", b"x" * 10)
+
+    assert disk_rows(path) == ['k2', 'k3', 'k4']
+    assert cache.stats()['disk_evictions'] == 2
+
+    reopened = CompilationCache(disk_path=path, max_disk_entries=3)
+    assert reopened.get('k0') is None
+    assert reopened.get('k4') == b"x" * 10
+
+
+def test_rewritten_entry_counts_as_newest(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = CompilationCache(disk_path=path, max_disk_entries=2)
+    cache.put('a', b"1")
+    cache.put('b', b"2")
+    cache.put('a', b"3")
+    cache.put('c', b"4")
+
+    assert disk_rows(path) == ['a', 'c']
+
+
+def test_memory_tier_evicts_least_recently_used_entries():
+    cache = CompilationCache(max_bytes=30)
+    cache.put('a', b"x" * 10)
+    cache.put('b', b"x" * 10)
+    cache.put('c', b"x" * 10)
+    assert cache.get('a') is not None
+    cache.put('d', b"x" * 10)
+
+    assert cache.get('b') is None
+    assert all(cache.get(key) is not None for key in 'acd')
+    stats = cache.stats()
+    assert stats['evictions'] == 1 and stats['bytes'] == 30
+
+
+def test_values_larger_than_the_memory_tier_are_not_kept():
+    cache = CompilationCache(max_bytes=5)
+    cache.put('a', b"x" * 10)
+    assert cache.get('a') is None
+    assert cache.stats()['bytes'] == 0
+
+
+def test_disk_hits_are_promoted_to_memory(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    CompilationCache(disk_path=path).put('a', b"1")
+    cache = CompilationCache(disk_path=path)
+    assert cache.get('a') == b"1"
+    assert cache.get('a') == b"1"
+    stats = cache.stats()
+    assert stats['disk_hits'] == 1 and stats['hits'] == 1
+
+
+def test_cache_key_covers_every_setting():
+    base = ("x = 1", True, ['constant_folding'])
+    keys = {
+        cache_key(*base),
+        cache_key("x = 2", True, ['constant_folding']),
+        cache_key("x = 1", False, ['constant_folding']),
+        cache_key("x = 1", True, ['dead_code_elimination']),
+        cache_key(*base, incremental=True),
+        cache_key(*base, profile=True),
+        cache_key(*base, output='binary'),
+        cache_key(*base, registers=4),
+    }
+    assert len(keys) == 8
+    assert cache_key(*base) == cache_key(*base)
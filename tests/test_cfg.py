@@ -0,0 +1,59 @@
+from benchmarks.programs import nested_loops, many_functions
+from src.cfg import build_cfg
+from src.ir import END_FUNCTION
+from src.parser import generate_intermediate_code
+
+
+def walk_dominates(idom, a, b):
+    if b not in idom:
+        return False
+    while a != b:
+        if idom[b] == b:
+            return False
+        b = idom[b]
+    return True
+
+
+def test_dominates_matches_the_dominator_tree():
+    for source in [nested_loops(20), many_functions(20)]:
+        cfg = build_cfg(generate_intermediate_code(source))
+        idom = cfg.dominators()
+        count = len(cfg.blocks)
+        for a in range(count):
+            for b in range(count):
+                assert cfg.dominates(a, b) == walk_dominates(idom, a, b)
+
+
+LOOP_AND_FUNCTION = """
+i = 0
+while i < 3:
+    i = i + 1
+def f(a):
+    return a
+print(f(i))
+"""
+
+
+def test_blocks_and_edges():
+    code = generate_intermediate_code(LOOP_AND_FUNCTION)
+    cfg = build_cfg(code)
+    edges = [(block.index, block.function, sorted(block.successors)) for block in cfg.blocks]
+    assert edges == [
+        (0, None, [1]),         # i = 0
+        (1, None, [2, 3]),      # loop test
+        (2, None, [1]),         # body, back to the test
+        (3, None, [6]),         # loop exit steps over the function
+        (4, 'f', [5]),          # return goes to the function exit
+        (5, 'f', []),
+        (6, None, []),
+    ]
+    assert cfg.entries == [0, 4]
+    assert cfg.to_code() == code
+
+
+def test_remove_unreachable_keeps_function_exits():
+    code = generate_intermediate_code("def f(a):\n    return a\n    a = 2\nx = 1\n")
+    cfg = build_cfg(code)
+    assert cfg.remove_unreachable() == 1
+    assert [ins.op for ins in cfg.to_code()].count(END_FUNCTION) == 1
+    assert all(ins.dest != 'a' for ins in cfg.to_code())
@@ -0,0 +1,27 @@
+import time
+
+import pytest
+
+from src.deadline import iter_with_deadline, CompileTimeout
+
+
+def slow_items(count, seconds):
+    for i in range(count):
+        time.sleep(seconds)
+        yield i
+
+
+def test_producing_items_past_the_deadline_raises():
+    produced = []
+    with pytest.raises(CompileTimeout):
+        for item in iter_with_deadline(slow_items(100, 0.02), 0.1):
+            produced.append(item)
+    assert 1 <= len(produced) < 10
+
+
+def test_time_spent_by_the_consumer_is_not_counted():
+    produced = []
+    for item in iter_with_deadline(slow_items(5, 0), 0.05):
+        time.sleep(0.02)
+        produced.append(item)
+    assert produced == [0, 1, 2, 3, 4]
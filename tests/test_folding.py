@@ -0,0 +1,90 @@
+import pytest
+
+from src.folding import MAX_INT_BITS, MAX_STR_LENGTH, fold_binary, fold_unary, fold_instruction
+from src.ir import Instruction, Const, COPY
+from src.optimizer import CodeOptimizer
+
+
+@pytest.mark.parametrize('op, left, right, expected', [
+    ('+', 2, 3, 5),
+    ('/', 7, 2, 3.5),
+    ('//', -7, 2, -4),
+    ('%', -7, 3, 2),
+    ('**', 2, 10, 1024),
+    ('**', 2, -1, 0.5),
+    ('<<', 1, 4, 16),
+    ('^', 6, 3, 5),
+    ('+', 0.5, 1, 1.5),
+    ('+', 'ab', 'c', 'abc'),
+    ('*', 'ab', 3, 'ababab'),
+    ('*', 2, 'ab', 'abab'),
+    ('<', 'a', 'b', True),
+    ('==', 'a', 1, False),
+    ('+', True, True, 2),
+])
+def test_folds_like_python(op, left, right, expected):
+    result = fold_binary(op, left, right)
+    assert result == Const(expected)
+
+
+@pytest.mark.parametrize('op, left, right', [
+    ('/', 1, 0),
+    ('//', 1, 0),
+    ('%', 1.0, 0.0),
+    ('<<', 1, -1),
+    ('**', 0, -1),
+    ('**', -8, 0.5),
+    ('**', 10.0, 400),
+    ('+', 'a', 1),
+    ('-', 'a', 'b'),
+    ('%', 'a%s', 'b'),
+    ('*', 'a', 2.0),
+    ('in', 'a', 'abc'),
+    ('is', 1, 1),
+    ('+', None, 1),
+])
+def test_leaves_failing_or_unsupported_operations_alone(op, left, right):
+    assert fold_binary(op, left, right) is None
+
+
+@pytest.mark.parametrize('op, left, right', [
+    ('**', 10, 10 ** 6),
+    ('<<', 1, MAX_INT_BITS + 1),
+    ('*', 2 ** MAX_INT_BITS, 2 ** MAX_INT_BITS),
+    ('*', 'a', MAX_STR_LENGTH + 1),
+    ('+', 'a' * MAX_STR_LENGTH, 'a'),
+])
+def test_oversized_results_are_left_for_run_time(op, left, right):
+    assert fold_binary(op, left, right) is None
+
+
+def test_unary_operators():
+    assert fold_unary('neg', 3) == Const(-3)
+    assert fold_unary('not', '') == Const(True)
+    assert fold_unary('invert', 5) == Const(-6)
+    assert fold_unary('invert', 1.5) is None
+
+
+def test_folded_instructions_become_copies():
+    assert fold_instruction(Instruction('*', 't0', Const(6), Const(7))) == Instruction(COPY, 't0', Const(42))
+    unknown = Instruction('*', 't0', 'x', Const(7))
+    assert fold_instruction(unknown) is unknown
+
+
+def test_folding_never_evaluates_source_text(monkeypatch):
+    def refuse(*args, **kwargs):
+        raise AssertionError("eval called")
+    monkeypatch.setattr('builtins.eval', refuse)
+    code = [Instruction('+', 't0', Const("__import__('os')"), Const('x'))]
+    folded = CodeOptimizer().optimize_with_technique(code, 'constant_folding')
+    assert folded == [Instruction(COPY, 't0', Const("__import__('os')x"))]
+
+
+def test_folding_chains_through_temporaries_in_one_pass():
+    code = [
+        Instruction('+', 't0', Const(1), Const(2)),
+        Instruction('*', 't1', 't0', Const(4)),
+        Instruction('-', 'x', 't1', Const(2)),
+    ]
+    folded = CodeOptimizer().optimize_with_technique(code, 'constant_folding')
+    assert folded[-1] == Instruction(COPY, 'x', Const(10))
@@ -0,0 +1,65 @@
+from src.forwarding import forward_temporaries
+from src.interpreter import run_code
+from src.ir import Instruction, Const, COPY, CALL, LABEL, format_code
+from src.optimizer import CodeOptimizer
+from src.parser import generate_intermediate_code
+
+
+def test_computations_are_stored_straight_into_their_variable():
+    code, removed = forward_temporaries(generate_intermediate_code("x = a + b * c\nprint(x)\n"))
+    assert format_code(code) == ["t0 = b * c", "x = a + t0", "t2 = call print(x)"]
+    assert removed == 1
+
+
+def test_copied_operands_are_substituted_into_the_reader():
+    code = [
+        Instruction(COPY, 't0', 'x'),
+        Instruction(COPY, 't1', Const(2)),
+        Instruction('+', 'y', 't0', 't1'),
+    ]
+    assert forward_temporaries(code) == ([Instruction('+', 'y', 'x', Const(2))], 2)
+
+
+def test_copies_are_not_forwarded_past_an_assignment_to_their_source():
+    code = [
+        Instruction(COPY, 't0', 'x'),
+        Instruction(COPY, 'x', Const(5)),
+        Instruction('+', 'y', 't0', Const(1)),
+    ]
+    assert forward_temporaries(code) == (code, 0)
+
+
+def test_copies_of_globals_are_not_forwarded_past_calls():
+    code = [
+        Instruction(COPY, 't0', 'x'),
+        Instruction(CALL, 't1', 'f', ()),
+        Instruction('+', 'y', 't0', Const(1)),
+    ]
+    assert forward_temporaries(code) == (code, 0)
+
+
+def test_nothing_is_forwarded_across_blocks():
+    code = [
+        Instruction(COPY, 't0', 'x'),
+        Instruction(LABEL, arg1='L0'),
+        Instruction('+', 'y', 't0', Const(1)),
+    ]
+    assert forward_temporaries(code) == (code, 0)
+
+
+def test_temps_read_twice_or_live_on_exit_stay():
+    twice = [Instruction(COPY, 't0', 'x'), Instruction('+', 'y', 't0', 't0')]
+    assert forward_temporaries(twice) == (twice, 0)
+    code = [Instruction(COPY, 't0', 'x'), Instruction('+', 'y', 't0', Const(1))]
+    assert forward_temporaries(code, live_on_exit=['t0']) == (code, 0)
+
+
+def test_forwarding_keeps_behavior():
+    source = ("def f(n):\n    return n * 2 + 1\nx = 3\ny = x\nx = f(x) - y\n"
+              "for i in [1, 2]:\n    x = x + i * y\nprint(x, y)\n")
+    code = generate_intermediate_code(source)
+    forwarded, removed = forward_temporaries(code)
+    assert removed > 0
+    assert run_code(forwarded)['output'] == run_code(code)['output']
+    optimized = CodeOptimizer().optimize(code)
+    assert run_code(optimized)['output'] == run_code(code)['output']
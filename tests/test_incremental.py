@@ -0,0 +1,21 @@
+from src.incremental import IncrementalCompiler
+
+SOURCE = "x = 1 + 2\ny = x * 3\n\ndef f(a):\n    b = 2 * 3\n    return a + b\n"
+
+
+def test_optimization_stops_at_the_time_budget():
+    compiler = IncrementalCompiler()
+    result = compiler.compile(SOURCE, time_budget=0)
+    assert result['budget_exhausted']
+    assert result['optimized_instructions'] == result['intermediate_instructions']
+
+    # Units cut short were not cached, so they are optimized in full next time
+    result = compiler.compile(SOURCE, time_budget=10)
+    assert not result['budget_exhausted']
+    assert len(result['optimized_instructions']) < len(result['intermediate_instructions'])
+
+
+def test_unchanged_units_are_reused():
+    compiler = IncrementalCompiler()
+    assert compiler.compile(SOURCE)['units_compiled'] == 3
+    assert compiler.compile(SOURCE.replace('2 * 3', '2 * 4'))['units_compiled'] == 1
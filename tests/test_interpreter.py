@@ -0,0 +1,100 @@
+import pytest
+
+from src.interpreter import run_code, MAX_SEQUENCE_LENGTH
+from src.optimizer import CodeOptimizer
+from src.parser import generate_intermediate_code
+
+GROWING_PROGRAMS = [
+    "s = 'ab'\nfor i in range(40):\n    s = s + s\nprint(len(s))\n",
+    "L = [1]\nfor i in range(40):\n    L = L + L\nprint(len(L))\n",
+    "t = (1,)\nfor i in range(40):\n    t = t + t\nprint(len(t))\n",
+    "x = 3\nfor i in range(40):\n    x = x * x\nprint(x > 0)\n",
+]
+
+
+@pytest.mark.parametrize('source', GROWING_PROGRAMS)
+def test_exponential_growth_is_stopped(source):
+    result = run_code(generate_intermediate_code(source))
+    assert 'too large' in result['error']
+
+
+def test_bounded_growth_still_runs():
+    source = f"s = 'a' * {MAX_SEQUENCE_LENGTH // 2}\ns = s + s\nx = 2 ** 1000\ny = x * x\nprint(len(s), y > x)\n"
+    result = run_code(generate_intermediate_code(source))
+    assert result.get('error') is None
+    assert result['output'] == [f"{MAX_SEQUENCE_LENGTH} True"]
+
+
+UNBOUNDED_METHODS = [
+    "s = 'a'\nt = s.ljust(10 ** 9)\n",
+    "s = 'a' * 2000\nt = s.replace('a', s)\n",
+    "L = [1]\nfor i in range(40):\n    L.extend(L)\n",
+    "s = ','\nt = s.join(['ab' * 1000] * 1000)\n",
+]
+
+
+@pytest.mark.parametrize('source', UNBOUNDED_METHODS)
+def test_method_results_are_bounded(source):
+    result = run_code(generate_intermediate_code(source))
+    assert 'too large' in result['error']
+
+
+def test_methods_outside_the_allowed_set_are_refused():
+    result = run_code(generate_intermediate_code("s = 'a\\tb'\nt = s.expandtabs(10 ** 9)\n"))
+    assert 'cannot call method expandtabs' in result['error']
+
+
+def test_allowed_methods_still_run():
+    source = ("L = [3, 1]\nL.extend(range(2))\nL.sort()\ns = '-'.join(['a', 'b'])\n"
+              "print(L, s.replace('-', '+').ljust(5, '.'), 'x'.zfill(3))\n")
+    result = run_code(generate_intermediate_code(source))
+    assert result.get('error') is None
+    assert result['output'] == ["[0, 1, 1, 3] a+b.. 00x"]
+
+
+RECURSIVE = """def fact(n):
+    if n < 2:
+        return 1
+    return n * fact(n - 1)
+x = 0
+for i in [1, 2, 3]:
+    x = x + fact(i)
+print(x)
+"""
+
+
+def test_functions_calls_and_loops_run():
+    result = run_code(generate_intermediate_code(RECURSIVE))
+    assert result.get('error') is None
+    assert result['output'] == ['9']
+
+
+def test_runaway_programs_hit_the_step_limit():
+    result = run_code(generate_intermediate_code("while True:\n    pass\n"), max_steps=100)
+    assert 'step limit' in result['error']
+
+
+def test_run_time_errors_are_reported():
+    result = run_code(generate_intermediate_code("print(undefined)\n"))
+    assert 'undefined' in result['error']
+
+
+def test_profile_counts_every_executed_instruction():
+    code = generate_intermediate_code(RECURSIVE)
+    result = run_code(code, profile=True)
+    profile = result['profile']
+    assert len(profile.line_counts) == len(code)
+    assert profile.total == sum(profile.line_counts) == result['steps']
+    # fact is entered once per call: 1 + 2 + 3 times
+    assert profile.line_counts[1] == 6
+    hottest = profile.as_dict(hottest=1)['hottest_blocks'][0]
+    assert hottest['label'] == code[hottest['line']].arg1
+    assert hottest['count'] == 4
+
+
+def test_optimization_lowers_the_dynamic_instruction_count():
+    code = generate_intermediate_code("x = 2 * 3 + 4\nprint(x)\n")
+    before = run_code(code)
+    after = run_code(CodeOptimizer().optimize(code))
+    assert before['output'] == after['output']
+    assert after['steps'] < before['steps']
@@ -0,0 +1,86 @@
+import pytest
+
+from src.callgraph import build_call_graph
+from src.interpreter import run_code
+from src.interprocedural import inline_functions, propagate_interprocedural_constants
+from src.ir import CALL, FUNCTION, format_code
+from src.optimizer import CodeOptimizer
+from src.parser import generate_intermediate_code
+
+FUNCTIONS = """def sq(x):
+    return x * x
+def fact(n):
+    if n < 2:
+        return 1
+    return n * fact(n - 1)
+def even(n):
+    if n == 0:
+        return True
+    return odd(n - 1)
+def odd(n):
+    if n == 0:
+        return False
+    return even(n - 1)
+h = sq
+print(sq(3), fact(4), even(4))
+"""
+
+
+def test_call_graph_finds_recursion_and_escaping_functions():
+    graph = build_call_graph(generate_intermediate_code(FUNCTIONS))
+    assert set(graph.functions) == {'sq', 'fact', 'even', 'odd'}
+    assert graph.recursive == {'fact', 'even', 'odd'}
+    assert graph.escaping == {'sq'}
+    assert graph.order.index('sq') < graph.order.index('fact')
+    assert [site.callee for site in graph.sites if site.region is None] == ['sq', 'fact', 'even']
+
+
+@pytest.mark.parametrize('source', [
+    "f = 3\ndef f(x):\n    return x\nprint(f(1))\n",
+    "def f(x):\n    return x\ndef f(x):\n    return -x\nprint(f(1))\n",
+    "def f(x):\n    return x\ndef g(f):\n    return f(1)\nprint(g(abs))\n",
+])
+def test_rebound_or_redefined_functions_are_not_known(source):
+    assert 'f' not in build_call_graph(generate_intermediate_code(source)).functions
+
+
+def test_only_small_non_recursive_functions_are_inlined():
+    code, inlined = inline_functions(generate_intermediate_code(FUNCTIONS))
+    assert inlined == 1
+    calls = [ins.arg1 for ins in code if ins.op == CALL]
+    assert 'sq' not in calls and 'fact' in calls and 'even' in calls
+    # sq is still read as a value, so its definition stays
+    assert any(ins.op == FUNCTION and ins.arg1 == 'sq' for ins in code)
+    assert "sq$i0$t0 = 3 * 3" in format_code(code)
+
+
+def test_functions_with_every_call_inlined_are_removed():
+    code, inlined = inline_functions(generate_intermediate_code(
+        "def add(a, b):\n    return a + b\nprint(add(1, 2), add(3, 4))\n"))
+    assert inlined == 2
+    assert not any(ins.op == FUNCTION for ins in code)
+
+
+def test_constant_arguments_and_results_cross_calls():
+    code, changes = propagate_interprocedural_constants(generate_intermediate_code(
+        "def f(a, k):\n    return a * k\ndef one():\n    return 1\nprint(f(1, 10), f(2, 10), one())\n"))
+    listing = format_code(code)
+    assert changes == 2
+    assert "k = 10" in listing and "a = 1" not in listing
+    assert listing[-1] == "t1 = call print(t2, t3, 1)"
+
+
+@pytest.mark.parametrize('source', [
+    FUNCTIONS,
+    "def f(a, k):\n    return a * k\nprint(f(1, 10), f(2, 10))\n",
+    "g = 5\ndef f(x):\n    return x + g\ndef h(g):\n    return f(g) * g\nprint(h(2))\n",
+    "def f(x):\n    if x:\n        return 1\ndef g():\n    return f(0)\nprint(g(), f(1))\n",
+    "L = []\ndef push(v):\n    L.append(v)\n    return len(L)\nfor i in [1, 2, 3]:\n    push(i)\nprint(L)\n",
+])
+def test_interprocedural_passes_keep_behavior(source):
+    code = generate_intermediate_code(source)
+    expected = run_code(code)['output']
+    optimizer = CodeOptimizer()
+    for technique in ('inlining', 'interprocedural_constant_propagation'):
+        assert run_code(optimizer.optimize_with_technique(code, technique))['output'] == expected
+    assert run_code(optimizer.optimize(code))['output'] == expected
@@ -0,0 +1,77 @@
+import pytest
+
+from src.ir import (
+    Instruction, Const, COPY, INDEX, CALL, METHOD_CALL, SET_INDEX, PRINT, RETURN, is_temp,
+    format_code,
+)
+from src.parser import generate_intermediate_code
+
+SOURCE = """x = 2 + 3 * y
+L = [x, 'a']
+L[0] = -x
+def f(a):
+    return a.b
+if x < 4:
+    print(f(L), L[1])
+"""
+
+LISTING = [
+    "t0 = 3 * y",
+    "t1 = 2 + t0",
+    "x = t1",
+    't2 = [x, "a"]',
+    "L = t2",
+    "t3 = -x",
+    "L[0] = t3",
+    "function f:",
+    "  params: a",
+    "t4 = a.b",
+    "return t4",
+    "end function",
+    "t5 = x < 4",
+    "if t5 == False goto L0",
+    "t7 = call f(L)",
+    "t8 = L[1]",
+    "t6 = call print(t7, t8)",
+    "goto L1",
+    "L0:",
+    "L1:",
+]
+
+
+def test_instructions_format_as_three_address_code():
+    assert format_code(generate_intermediate_code(SOURCE)) == LISTING
+
+
+def test_literals_of_different_types_are_different_operands():
+    assert Const(1) == Const(1)
+    assert Const(1) != Const(True)
+    assert Const(1) != Const(1.0)
+    assert Const('x') != 'x'
+
+
+@pytest.mark.parametrize('ins, operands', [
+    (Instruction('+', 't0', 'a', Const(1)), ('a', Const(1))),
+    (Instruction(COPY, 'x', 't0'), ('t0',)),
+    (Instruction(INDEX, 't1', 'L', 'i'), ('L', 'i')),
+    (Instruction(CALL, 't2', 'f', ('a', Const(2))), ('a', Const(2))),
+    (Instruction(METHOD_CALL, 't3', 'append', ('L', 'x')), ('L', 'x')),
+    (Instruction(SET_INDEX, None, 'L', (Const(0), 'x')), ('L', Const(0), 'x')),
+    (Instruction(PRINT, arg1=('a', Const('b'))), ('a', Const('b'))),
+    (Instruction(RETURN, arg1='x'), ('x',)),
+])
+def test_with_operands_replaces_what_operands_returns(ins, operands):
+    assert ins.operands() == operands
+    assert ins.with_operands(ins.operands()) == ins
+    renamed = ins.with_operands(['z' if type(op) is str else op for op in operands])
+    assert 'z' in renamed.operands() and renamed.op == ins.op and renamed.dest == ins.dest
+
+
+def test_instructions_have_no_instance_dict():
+    with pytest.raises(AttributeError):
+        Instruction(COPY, 'x', Const(1)).extra = 1
+
+
+def test_is_temp():
+    assert is_temp('t0') and is_temp('f$t12')
+    assert not is_temp('t') and not is_temp('total') and not is_temp(Const(1))
@@ -0,0 +1,40 @@
+import time
+
+from src.jobs import JobQueue, DONE, FAILED, CANCELLED, FINISHED_STATES
+
+
+def wait(job):
+    for _ in range(200):
+        if job.status in FINISHED_STATES:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job still {job.status}")
+
+
+def run_stages(job, stages, seconds):
+    for stage in range(stages):
+        job.update(f"stage{stage}")
+        time.sleep(seconds)
+    return 'finished'
+
+
+def test_job_finishes_within_its_timeout():
+    queue = JobQueue(max_workers=1, timeout=5)
+    job = wait(queue.submit(run_stages, 3, 0))
+    assert job.status == DONE and job.result == 'finished'
+
+
+def test_job_past_its_timeout_fails_at_the_next_stage():
+    queue = JobQueue(max_workers=1, timeout=0.05)
+    job = wait(queue.submit(run_stages, 100, 0.02))
+    assert job.status == FAILED
+    assert 'did not finish' in job.error
+
+
+def test_running_job_stops_when_cancelled():
+    queue = JobQueue(max_workers=1)
+    job = queue.submit(run_stages, 100, 0.02)
+    while job.stage is None:
+        time.sleep(0.01)
+    queue.cancel(job.id)
+    assert wait(job).status == CANCELLED
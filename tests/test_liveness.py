@@ -0,0 +1,88 @@
+import pytest
+
+from src.interpreter import run_code
+from src.ir import Instruction, Const, CALL
+from src.liveness import eliminate_dead_code
+from src.optimizer import CodeOptimizer
+from src.parser import generate_intermediate_code
+
+
+@pytest.mark.parametrize('op', ['/', '//', '%', '**'])
+def test_unused_operations_that_may_raise_are_kept(op):
+    code = [
+        Instruction(op, 'x', 'a', 'b'),
+        Instruction(CALL, 't0', 'print', (Const(1),)),
+    ]
+    kept, removed = eliminate_dead_code(code)
+    assert removed == 0
+    assert kept == code
+
+
+@pytest.mark.parametrize('op', ['//', '%', '<<', '>>'])
+def test_unused_integer_division_or_shift_by_a_safe_literal_is_removed(op):
+    code = [
+        Instruction(CALL, 'a', 'len', ('L',)),
+        Instruction(op, 'x', 'a', Const(2)),
+    ]
+    assert eliminate_dead_code(code) == (code[:1], 1)
+
+
+@pytest.mark.parametrize('op', ['/', '//', '%'])
+def test_unused_division_of_an_unknown_value_is_kept(op):
+    code = [Instruction(op, 'x', 'a', Const(2))]
+    assert eliminate_dead_code(code) == (code, 0)
+
+
+def test_division_by_zero_still_raises_after_optimization():
+    code = generate_intermediate_code("x = 1 / 0\nprint(1)\n")
+    result = run_code(CodeOptimizer().optimize(code))
+    assert result['error'].startswith('ZeroDivisionError')
+
+
+MAY_RAISE = [
+    ("L = [1, 2]\nx = L[10]\nprint(1)\n", 'IndexError'),
+    ("a = 'x'\nb = 1\nx = a + b\nprint(1)\n", 'TypeError'),
+    ("a = len([])\nb = -1\nx = a << b\nprint(1)\n", 'ValueError'),
+    ("a = 'x'\nb = 1\nx = a < b\nprint(1)\n", 'TypeError'),
+]
+
+
+@pytest.mark.parametrize('source, error', MAY_RAISE)
+def test_unused_operations_that_raise_still_raise_after_optimization(source, error):
+    code = generate_intermediate_code(source)
+    assert run_code(code)['error'].startswith(error)
+    result = run_code(CodeOptimizer().optimize_with_technique(code, 'dead_code_elimination'))
+    assert result['error'].startswith(error)
+    assert run_code(CodeOptimizer().optimize(code))['error'].startswith(error)
+
+
+def test_unused_integer_counter_is_removed():
+    source = "n = 0\ni = 0\nwhile i < 10:\n    n = n + 1\n    i = i + 1\nprint(i)\n"
+    code = generate_intermediate_code(source)
+    optimized, removed = eliminate_dead_code(code)
+    assert removed >= 2
+    assert run_code(optimized)['output'] == ['10']
+
+
+def test_names_a_function_reads_stay_live_at_calls():
+    source = "def show():\n    print(g)\ng = 5\nshow()\nh = 6\n"
+    code = generate_intermediate_code(source)
+    optimized, removed = eliminate_dead_code(code)
+    assert removed == 1
+    assert run_code(optimized)['output'] == ['5']
+
+
+def test_live_on_exit_keeps_names_for_later_code():
+    code = generate_intermediate_code("a = 1\nb = 2\n")
+    assert eliminate_dead_code(code, live_on_exit=['b'])[1] == 1
+
+
+@pytest.mark.parametrize('source', [
+    "f = abs\nprint(f(-3))\n",
+    "len = abs\nprint(len(-3))\n",
+    "len = abs\ndef k(v):\n    return len(v)\nprint(k(-3))\n",
+])
+def test_names_that_are_called_stay_live(source):
+    code = generate_intermediate_code(source)
+    optimized = CodeOptimizer().optimize(code)
+    assert run_code(optimized)['output'] == run_code(code)['output'] == ['3']
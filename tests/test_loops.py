@@ -0,0 +1,88 @@
+from src.interpreter import run_code
+from src.loops import optimize_loops, scalar_names
+from src.optimizer import CodeOptimizer
+from src.parser import generate_intermediate_code
+from src.value_numbering import SCALAR_CALLS
+
+MUTATED_IN_LOOP = """
+L = [1]
+M = [1, 2]
+count = 0
+i = 0
+while i < 10:
+    if L == M:
+        count = count + 1
+    if i == 0:
+        L.append(2)
+    i = i + 1
+print(count)
+"""
+
+SCALAR_INVARIANT = """
+a = 3
+L = []
+i = 0
+while i < 10:
+    L.append(a * 4)
+    i = i + 1
+print(L)
+"""
+
+ZERO_TRIP = """
+a = 'x'
+b = 1
+n = len([])
+i = 0
+while i < n:
+    print(a + b)
+    i = i + 1
+print('done')
+"""
+
+INTEGER_INVARIANT = """
+n = len([1, 2, 3])
+k = n * 2
+total = 0
+i = 0
+while i < n:
+    total = total + (k + 1)
+    i = i + 1
+print(total)
+"""
+
+
+def test_operators_that_may_raise_stay_in_loops_that_run_zero_times():
+    code = generate_intermediate_code(ZERO_TRIP)
+    assert run_code(code)['output'] == ['done']
+    optimized = CodeOptimizer().optimize_with_technique(code, 'loop_optimization')
+    assert run_code(optimized) == run_code(code)
+    assert run_code(CodeOptimizer().optimize(code))['output'] == ['done']
+
+
+def test_integer_arithmetic_is_hoisted_from_blocks_that_may_not_run():
+    code = generate_intermediate_code(INTEGER_INVARIANT)
+    optimized, changes = optimize_loops(code)
+    assert changes >= 1
+    assert run_code(optimized)['output'] == run_code(code)['output'] == ['21']
+
+
+def test_operators_on_objects_the_loop_mutates_stay_in_the_loop():
+    code = generate_intermediate_code(MUTATED_IN_LOOP)
+    expected = run_code(code)['output']
+    assert expected == ['9']
+    assert run_code(CodeOptimizer().optimize_with_technique(code, 'loop_optimization'))['output'] == expected
+    assert run_code(CodeOptimizer().optimize(code))['output'] == expected
+
+
+def test_operators_on_scalars_are_hoisted_from_loops_with_stores():
+    code = generate_intermediate_code(SCALAR_INVARIANT)
+    optimized, changes = optimize_loops(code)
+    assert changes >= 1
+    assert run_code(optimized)['output'] == run_code(code)['output']
+
+
+def test_scalar_names():
+    code = generate_intermediate_code("a = 3\nb = a * 2\nL = [a]\nc = L * 2\nd = len(L) + b\n")
+    scalars = scalar_names(code, SCALAR_CALLS)
+    assert {'a', 'b', 'd'} <= scalars
+    assert 'L' not in scalars and 'c' not in scalars
@@ -0,0 +1,65 @@
+from src.metrics import Histogram, Counter, CallbackMetric, MetricsRegistry, StageTimer, NULL_TIMER
+from src.parser import IntermediateCodeGenerator
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram('latency_seconds', "Latency", (0.1, 1), ('stage',))
+    for value in (0.05, 0.5, 0.5, 3):
+        histogram.observe(value, 'parse')
+    histogram.observe(0.1, 'lower')
+    assert histogram.render() == [
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{stage="lower",le="0.1"} 1',
+        'latency_seconds_bucket{stage="lower",le="1"} 1',
+        'latency_seconds_bucket{stage="lower",le="+Inf"} 1',
+        'latency_seconds_sum{stage="lower"} 0.1',
+        'latency_seconds_count{stage="lower"} 1',
+        'latency_seconds_bucket{stage="parse",le="0.1"} 1',
+        'latency_seconds_bucket{stage="parse",le="1"} 3',
+        'latency_seconds_bucket{stage="parse",le="+Inf"} 4',
+        'latency_seconds_sum{stage="parse"} 4.05',
+        'latency_seconds_count{stage="parse"} 4',
+    ]
+
+
+def test_counters_and_label_escaping():
+    counter = Counter('requests_total', "Requests", ('endpoint',))
+    counter.inc('/generate')
+    counter.inc('/generate', amount=2)
+    counter.inc('say "hi"\n')
+    assert counter.render()[2:] == [
+        'requests_total{endpoint="/generate"} 3',
+        'requests_total{endpoint="say \\"hi\\"\\n"} 1',
+    ]
+
+
+def test_registry_renders_every_metric():
+    registry = MetricsRegistry()
+    registry.register(Counter('a_total', "A")).inc()
+    registry.register(CallbackMetric('b', "B", 'gauge', lambda: 7))
+    text = registry.render()
+    assert text.endswith("\n")
+    assert "a_total 1\n" in text and "# TYPE b gauge\nb 7\n" in text
+
+
+def test_stage_timer_accumulates_repeated_stages():
+    timer = StageTimer()
+    timer.add('fold', 0.001)
+    with timer.stage('parse'):
+        pass
+    timer.add('fold', 0.002)
+    timings = timer.as_dict()
+    assert list(timings) == ['fold', 'parse']
+    assert timings['fold'] == 3.0
+
+
+def test_generator_times_parsing_and_lowering_separately():
+    timer = StageTimer()
+    IntermediateCodeGenerator().generate("x = 1 + 2\nprint(x)\n", timer)
+    assert list(timer.as_dict()) == ['parse', 'lower']
+
+
+def test_null_timer_records_nothing():
+    with NULL_TIMER.stage('parse'):
+        NULL_TIMER.add('parse', 1.0)
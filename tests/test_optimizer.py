@@ -0,0 +1,94 @@
+from src.interpreter import run_code
+from src.ir import Instruction, Const, COPY, GOTO, LABEL, IF_FALSE, PRINT, COMMENT, format_code
+from src.optimizer import CodeOptimizer, ConstantPropagator, StreamingOptimizer
+from src.parser import IntermediateCodeGenerator, generate_intermediate_code
+
+
+def test_jump_over_labels_only_is_removed():
+    code = [
+        Instruction(IF_FALSE, arg1='c', arg2='L4'),
+        Instruction(PRINT, arg1=(Const(1),)),
+        Instruction(GOTO, arg1='L5'),
+        Instruction(LABEL, arg1='L4'),
+        Instruction(LABEL, arg1='L5'),
+        Instruction(PRINT, arg1=(Const(2),)),
+    ]
+    optimized = CodeOptimizer().optimize_with_technique(code, 'unreachable_code_elimination')
+    assert Instruction(GOTO, arg1='L5') not in optimized
+    assert Instruction(LABEL, arg1='L5') not in optimized
+    assert Instruction(LABEL, arg1='L4') in optimized
+
+
+def test_if_else_chains_keep_their_behavior():
+    source = "x = len([1, 2])\nif x > 5:\n    print('big')\nelif x > 1:\n    print('mid')\nelse:\n    print('small')\n"
+    code = generate_intermediate_code(source)
+    optimized = CodeOptimizer().optimize_with_technique(code, 'unreachable_code_elimination')
+    assert run_code(optimized)['output'] == run_code(code)['output'] == ['mid']
+
+
+def propagate(code, temps_only=False):
+    propagator = ConstantPropagator(temps_only)
+    result = []
+    for ins in code:
+        ins = propagator.substitute(ins)
+        propagator.record(ins)
+        result.append(ins)
+    return result
+
+
+def test_constants_reach_later_reads_until_redefined():
+    code = [
+        Instruction(COPY, 'x', Const(2)),
+        Instruction('+', 'a', 'x', Const(1)),
+        Instruction(COPY, 'x', 'y'),
+        Instruction('+', 'b', 'x', Const(1)),
+    ]
+    result = propagate(code)
+    assert result[1] == Instruction('+', 'a', Const(2), Const(1))
+    assert result[3] == code[3]
+
+
+def test_constants_do_not_flow_past_labels():
+    code = [
+        Instruction(COPY, 'x', Const(2)),
+        Instruction(LABEL, arg1='L0'),
+        Instruction('+', 'a', 'x', Const(1)),
+    ]
+    assert propagate(code) == code
+
+
+def test_temps_only_leaves_user_variables_alone():
+    code = [
+        Instruction(COPY, 'x', Const(2)),
+        Instruction(COPY, 't0', Const(3)),
+        Instruction('+', 'a', 'x', 't0'),
+    ]
+    assert propagate(code, temps_only=True)[2] == Instruction('+', 'a', 'x', Const(3))
+
+
+def test_every_constant_reaches_its_reads():
+    code = [Instruction(COPY, f"v{i}", Const(i)) for i in range(20000)]
+    code += [Instruction('+', f"w{i}", f"v{i}", Const(1)) for i in range(20000)]
+    result = propagate(code)
+    assert result[-1] == Instruction('+', 'w19999', Const(19999), Const(1))
+
+
+def test_streaming_folds_through_temporaries_across_chunks():
+    source = "x = 2 * 3\ny = x + 1\nprint(y * 2)\n"
+    optimizer = StreamingOptimizer()
+    chunks = [optimizer.feed(chunk) for chunk in IntermediateCodeGenerator().generate_chunks(source)]
+    assert format_code(chunks[1]) == ["t1 = 7", "y = 7"]
+    assert run_code([ins for chunk in chunks for ins in chunk])['output'] == ['14']
+
+
+def test_streaming_drops_comments_and_keeps_behavior():
+    source = "import os\nx = 0\nfor i in [1, 2, 3]:\n    x = x + i\nprint(x)\n"
+    code = generate_intermediate_code(source)
+    optimized = list(StreamingOptimizer().stream(iter(code)))
+    assert not any(ins.op == COMMENT for ins in optimized)
+    assert run_code(optimized)['output'] == run_code(code)['output'] == ['6']
+
+
+def test_streaming_applies_only_the_selected_passes():
+    code = generate_intermediate_code("x = 2 * 3\n")
+    assert StreamingOptimizer(['remove_comments']).feed(code) == code
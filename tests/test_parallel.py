@@ -0,0 +1,74 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from benchmarks.programs import many_functions
+from src.interpreter import run_code
+from src.ir import PRINT, format_code
+from src.optimizer import CodeOptimizer, DEFAULT_PIPELINE
+from src.parallel import ParallelPassManager, join_units, split_units
+from src.parser import generate_intermediate_code
+from src.pass_manager import PassManager
+
+MODULE = """g = 2
+def f(x):
+    return x * g
+def h(n):
+    total = 0
+    for i in [1, 2, 3]:
+        total = total + f(i) + n
+    return total
+abs = print
+def k(v):
+    abs(v)
+    return v
+print(h(4), k(-3))
+"""
+
+
+def optimize_units(code, executor=None, workers=None):
+    manager = ParallelPassManager(DEFAULT_PIPELINE, CodeOptimizer(), executor, workers,
+                                  min_instructions=0)
+    return manager.run(code), manager
+
+
+def test_functions_are_stubbed_in_the_module_unit():
+    code = generate_intermediate_code(MODULE)
+    module, functions = split_units(code)
+    assert [function[0].arg1 for function in functions] == ['f', 'h', 'k']
+    stub = module[1:5]
+    assert format_code(stub) == ["function f:", "  params: x", "print g", "end function"]
+    assert join_units(module, functions) == code
+
+
+@pytest.mark.parametrize('source', [MODULE, many_functions(6)])
+def test_units_keep_the_program_output(source):
+    code = generate_intermediate_code(source)
+    optimized, manager = optimize_units(code)
+    # The first round optimizes the module code and every function
+    assert manager.units_optimized >= len(split_units(code)[1]) + 1
+    assert run_code(optimized)['output'] == run_code(code)['output']
+    serial = PassManager(DEFAULT_PIPELINE, CodeOptimizer()).run(code)
+    assert run_code(optimized)['steps'] <= run_code(serial)['steps'] * 1.1
+
+
+def test_rebound_builtins_are_not_treated_as_pure_in_function_units():
+    optimized, _ = optimize_units(generate_intermediate_code(MODULE))
+    assert run_code(optimized)['output'] == ['-3', '24 -3']
+    assert not any(ins.op == PRINT for ins in optimized)
+
+
+def test_small_listings_are_optimized_whole():
+    code = generate_intermediate_code(MODULE)
+    manager = ParallelPassManager(DEFAULT_PIPELINE, CodeOptimizer())
+    assert manager.run(code) == PassManager(DEFAULT_PIPELINE, CodeOptimizer()).run(code)
+    assert manager.units == 0
+
+
+def test_the_result_does_not_depend_on_the_pool(monkeypatch):
+    monkeypatch.setattr('src.parallel.POOL_MIN_INSTRUCTIONS', 0)
+    code = generate_intermediate_code(many_functions(8))
+    in_process, _ = optimize_units(code)
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        pooled, manager = optimize_units(code, pool, 2)
+    assert pooled == in_process
@@ -0,0 +1,105 @@
+import ast
+
+import pytest
+
+from src.interpreter import run_code
+from src.ir import COMMENT, UNSUPPORTED, ERROR, format_code
+from src.parser import (
+    IntermediateCodeGenerator, BINARY_OPERATORS, COMPARISON_OPERATORS, generate_intermediate_code,
+    generate_intermediate_code_stream,
+)
+
+
+def output_of(source):
+    result = run_code(generate_intermediate_code(source))
+    assert result.get('error') is None
+    return result['output']
+
+
+def test_every_handler_names_a_method():
+    generator = IntermediateCodeGenerator()
+    handlers = {**generator.STATEMENT_HANDLERS, **generator.EXPRESSION_HANDLERS}
+    for method in handlers.values():
+        assert callable(getattr(generator, method))
+
+
+@pytest.mark.parametrize('source, node_type', [
+    ("import os\n", 'Import'),
+    ("with open('f') as f:\n    pass\n", 'With'),
+    ("del x\n", 'Delete'),
+])
+def test_unsupported_statements_become_comments(source, node_type):
+    code = generate_intermediate_code(source)
+    assert [(ins.op, ins.arg1) for ins in code] == [(COMMENT, f"Unsupported node type: {node_type}")]
+
+
+def test_unsupported_expressions_become_placeholders():
+    code = generate_intermediate_code("f = lambda: 1\n")
+    assert (code[0].op, code[0].arg1) == (UNSUPPORTED, "Unsupported expression: Lambda")
+    assert format_code(code)[-1] == f"f = {code[0].dest}"
+
+
+def test_every_operator_node_has_an_opcode():
+    for operator in ast.operator.__subclasses__():
+        assert operator in BINARY_OPERATORS
+    for operator in ast.cmpop.__subclasses__():
+        assert operator in COMPARISON_OPERATORS
+
+
+@pytest.mark.parametrize('source, expected', [
+    ("x = 7\nx += 3\nx //= 4\nprint(x)\n", ["2"]),
+    ("L = [1, 2]\nL[1] *= 5\nprint(L)\n", ["[1, 10]"]),
+    ("x = -3\ny = not x\nz = ~x\nprint(x, y, z, +x)\n", ["-3 False 2 -3"]),
+    ("a = 0\nb = 'b'\nprint(a and b, a or b, b and a, 1 and 2 and 3)\n", ["0 b 0 3"]),
+    ("x = 2\nprint(1 < x < 3, 1 < x > 3, x == 2 != 3)\n", ["True False True"]),
+    ("s = 'hello'\nprint(s[1], s[1:4], s[::-1], s.upper())\n", ["e ell olleh HELLO"]),
+    ("t = (1, 'a', [2, 3])\na, b, c = t\nprint(a, b, c, len(t))\n", ["1 a [2, 3] 3"]),
+    ("x = y = 4\nprint(x + y, 2 ** 3, 7 % 4, 7 / 2, 6 & 3, 6 | 3, 6 ^ 3, 1 << 4, 32 >> 2)\n",
+     ["8 8 3 3.5 2 7 5 16 8"]),
+    ("print(1 in [1], 2 not in [1], None is None, 1 is not None)\n", ["True True True True"]),
+])
+def test_lowered_code_computes_what_python_computes(source, expected):
+    assert output_of(source) == expected
+
+
+def test_chained_comparisons_evaluate_each_operand_once():
+    code = generate_intermediate_code("r = a < f() < b\n")
+    assert [ins.arg1 for ins in code].count('f') == 1
+
+
+def test_short_circuit_skips_the_right_operand():
+    source = "def boom():\n    print('boom')\n    return 1\nx = 0 and boom()\ny = 1 or boom()\nprint(x, y)\n"
+    assert output_of(source) == ["0 1"]
+
+
+STREAMED = """x = 1 + 2
+def f(a):
+    if a:
+        return a * x
+    return 0
+for i in [1, 2]:
+    print(f(i))
+import os
+y = x and f(x)
+"""
+
+
+def test_chunks_concatenate_to_the_whole_module():
+    chunks = list(IntermediateCodeGenerator().generate_chunks(STREAMED))
+    assert len(chunks) == len(ast.parse(STREAMED).body)
+    assert [ins for chunk in chunks for ins in chunk] == generate_intermediate_code(STREAMED)
+    assert list(generate_intermediate_code_stream(STREAMED)) == generate_intermediate_code(STREAMED)
+
+
+def test_chunks_are_lowered_on_demand():
+    generator = IntermediateCodeGenerator()
+    chunks = generator.generate_chunks("x = 1\ny = 2\n")
+    first = next(chunks)
+    assert format_code(first) == ["x = 1"]
+    assert generator.code == []
+    assert format_code(next(chunks)) == ["y = 2"]
+
+
+def test_syntax_errors_are_streamed_as_one_error_chunk():
+    chunks = list(IntermediateCodeGenerator().generate_chunks("x = (\n"))
+    assert len(chunks) == 1 and chunks[0][0].op == ERROR
@@ -0,0 +1,69 @@
+from src.ir import Instruction, Const, COPY
+from src.optimizer import CodeOptimizer, DEFAULT_PIPELINE
+from src.parser import generate_intermediate_code
+from src.pass_manager import PassManager
+
+SOURCE = "x = 2 * 3\ny = x + 1\nz = y\nprint(z)\n"
+
+
+class ParityOptimizer:
+    """
+    Stands in for CodeOptimizer with two passes that feed each other:
+    'even' and 'odd' drop the first instruction when the listing has an
+    even or odd length above `limit`.
+    """
+
+    def __init__(self, limit):
+        self.code = []
+        self.limit = limit
+        self.calls = []
+
+    def run_pass(self, name):
+        self.calls.append(name)
+        size = len(self.code)
+        if size > self.limit and size % 2 == (0 if name == 'even' else 1):
+            self.code = self.code[1:]
+            return True
+        return False
+
+
+def listing(size):
+    return [Instruction(COPY, f"v{i}", Const(i)) for i in range(size)]
+
+
+def test_runs_to_a_fixed_point_and_skips_passes_with_nothing_new():
+    optimizer = ParityOptimizer(limit=2)
+    manager = PassManager(['even', 'odd'], optimizer)
+    assert len(manager.run(listing(5))) == 2
+    stats = {entry['pass']: entry for entry in manager.report()}
+    assert stats['even']['changes'] == 1
+    assert stats['odd']['changes'] == 2
+    assert stats['odd']['instructions_removed'] == 2
+    # The code has not changed since odd last ran, so the last round skips it
+    assert stats['odd']['skipped'] == 1
+    assert manager.iterations == 3
+
+
+def test_max_iterations_bounds_the_rounds():
+    manager = PassManager(['even', 'odd'], ParityOptimizer(limit=0), max_iterations=3)
+    assert len(manager.run(listing(100))) == 94
+
+
+def test_should_stop_is_asked_before_every_pass():
+    optimizer = ParityOptimizer(limit=0)
+    manager = PassManager(['even', 'odd'], optimizer, should_stop=lambda: len(optimizer.calls) == 3)
+    assert len(manager.run(listing(10))) == 7
+    assert not manager.budget_exhausted
+
+
+def test_time_budget_stops_before_the_next_pass():
+    manager = PassManager(['even', 'odd'], ParityOptimizer(limit=0), time_budget=0)
+    assert len(manager.run(listing(10))) == 10
+    assert manager.budget_exhausted
+
+
+def test_result_matches_the_default_optimizer():
+    code = generate_intermediate_code(SOURCE)
+    manager = PassManager(DEFAULT_PIPELINE, CodeOptimizer())
+    assert manager.run(code) == CodeOptimizer().optimize(code)
+    assert not manager.budget_exhausted
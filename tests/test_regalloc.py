@@ -0,0 +1,80 @@
+import pytest
+
+from benchmarks.programs import SHAPES
+from src.lowering import lower_to_assembly
+from src.ir import CALL
+from src.parser import generate_intermediate_code
+from src.regalloc import MODULE, allocate_registers
+
+SOURCE = """def f(a, b):
+    c = a + b
+    d = a * b
+    e = c - d
+    return e * c
+x = 1
+y = 2
+z = x + y
+print(f(x, y), z)
+"""
+
+
+def assert_no_conflicts(allocation):
+    for region in allocation.regions:
+        intervals = list(region.intervals.values())
+        for i, first in enumerate(intervals):
+            assert (first.register is None) != (first.slot is None)
+            for second in intervals[i + 1:]:
+                overlap = first.start <= second.end and second.start <= first.end
+                if overlap and first.register is not None:
+                    assert first.register != second.register, (first, second)
+                if overlap and first.slot is not None:
+                    assert first.slot != second.slot, (first, second)
+
+
+@pytest.mark.parametrize('registers', [1, 2, 3, 8])
+@pytest.mark.parametrize('shape', list(SHAPES))
+def test_overlapping_intervals_never_share_a_register_or_slot(shape, registers):
+    allocation = allocate_registers(generate_intermediate_code(SHAPES[shape](3)), registers)
+    assert_no_conflicts(allocation)
+    for region in allocation.regions:
+        assert region.registers_used <= registers
+
+
+def test_enough_registers_means_no_spills():
+    stats = allocate_registers(generate_intermediate_code(SOURCE), 8).stats()
+    assert stats['max_pressure'] == 3 and stats['spilled'] == 0
+    assert [region['name'] for region in stats['regions']] == [MODULE, 'f']
+
+
+def test_module_variables_read_by_functions_stay_in_memory():
+    allocation = allocate_registers(generate_intermediate_code("n = 2\ndef g():\n    return n\nprint(g())\n"))
+    assert allocation.regions[0].location('n') is None
+
+
+def test_at_least_one_register_is_needed():
+    with pytest.raises(ValueError):
+        allocate_registers(generate_intermediate_code(SOURCE), 0)
+
+
+def test_lowering_emits_a_section_per_region():
+    lines, stats = lower_to_assembly(generate_intermediate_code(SOURCE))
+    assert lines[0] == 'main:' and 'f:' in lines
+    assert lines.index('  halt') < lines.index('f:')
+    assert stats['spill_loads'] == stats['spill_stores'] == 0
+
+
+def test_spilled_variables_go_through_their_stack_slot():
+    lines, stats = lower_to_assembly(generate_intermediate_code(SOURCE), registers=1)
+    assert stats['spilled'] > 0
+    assert stats['spill_loads'] == sum(1 for line in lines if line.strip().startswith('load '))
+    assert stats['spill_stores'] == sum(1 for line in lines if line.strip().startswith('store '))
+    slots = stats['regions'][0]['stack_slots']
+    assert lines[1] == f"  enter {slots}"
+
+
+def test_called_variables_keep_their_register_or_slot_until_the_call():
+    code = generate_intermediate_code("f = abs\nx = 1\ny = 2\nz = x + y\nprint(f(-3), z)\n")
+    allocation = allocate_registers(code, 2)
+    call = next(i for i, ins in enumerate(allocation.code) if ins.op == CALL and ins.arg1 == 'f')
+    assert allocation.regions[0].location('f').end >= 2 * call
+    assert_no_conflicts(allocation)
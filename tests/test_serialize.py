@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+from src.ir import Instruction, Const, COPY, CALL, PRINT, format_code
+from src.optimizer import CodeOptimizer
+from src.parser import generate_intermediate_code
+from src.serialize import (
+    FormatError, IRFile, IRReader, apply_delta, decode_listings, encode_listings, listing_delta,
+    write_ir_file,
+)
+
+SOURCE = """def f(a, b):
+    s = a + b * 2
+    return s.upper() if False else s
+x = [1, -2, 3.5, 'text', None, True]
+y = (x[0], f(1, 2))
+print(x, y, 2 ** 70, -(2 ** 70))
+"""
+
+
+def test_listings_round_trip_with_their_metadata():
+    code = generate_intermediate_code(SOURCE)
+    optimized = CodeOptimizer().optimize(code)
+    data = encode_listings([code, optimized], metadata='{"v": 1}')
+    assert decode_listings(data) == [code, optimized]
+    reader = IRReader(data)
+    assert reader.metadata == '{"v": 1}'
+    assert reader.instruction_count(1) == len(optimized)
+    assert list(reader.lines(0)) == format_code(code)
+
+
+@pytest.mark.parametrize('value', [
+    0, -1, 2 ** 100, -(2 ** 100), True, False, None, ..., 1.5, -0.0, float('inf'), 1 + 2j,
+    b'\x00\xff', '', 'café', '\ud800',
+])
+def test_literals_keep_their_type_and_value(value):
+    code = [Instruction(COPY, 'x', Const(value)), Instruction(PRINT, arg1=(Const(value), 'x'))]
+    decoded = decode_listings(encode_listings([code]))[0]
+    assert decoded == code
+    assert repr(decoded[0].arg1.value) == repr(value)
+
+
+def test_repeated_names_are_stored_once():
+    code = [Instruction(CALL, 'result', 'some_long_function_name', ('argument',))] * 1000
+    assert len(encode_listings([code])) < 1000 * 8
+
+
+def test_listings_can_be_read_out_of_order():
+    listings = [[Instruction(COPY, f'x{i}', Const(i))] for i in range(3)]
+    reader = IRReader(encode_listings(listings))
+    assert list(reader.listing(2)) == listings[2]
+    assert list(reader.listing(0)) == listings[0]
+
+
+def test_files_are_memory_mapped(tmp_path):
+    code = generate_intermediate_code(SOURCE)
+    path = tmp_path / 'module.ir'
+    write_ir_file(path, [code], metadata='m')
+    with IRFile(path) as reader:
+        assert reader.metadata == 'm'
+        assert list(reader.listing(0)) == code
+
+
+@pytest.mark.parametrize('data', [b'', b'nope', b'ICGIR\x63', encode_listings([[]])[:-1] + b'\x05'])
+def test_bad_input_raises_format_error(data):
+    with pytest.raises(FormatError):
+        decode_listings(data)
+
+
+def test_truncated_listings_are_detected():
+    data = encode_listings([generate_intermediate_code(SOURCE)])
+    with pytest.raises(FormatError):
+        decode_listings(data[:-3])
+
+
+def test_delta_rebuilds_the_changed_listing():
+    before = format_code(generate_intermediate_code(SOURCE))
+    after = format_code(CodeOptimizer().optimize(generate_intermediate_code(SOURCE)))
+    delta = listing_delta(before, after)
+    assert apply_delta(before, delta) == after
+    assert listing_delta(after, after) == []
+
+
+def test_random_deltas_rebuild_the_changed_listing():
+    rng = random.Random(7)
+    for _ in range(200):
+        before = [rng.choice('abcdef') for _ in range(rng.randrange(12))]
+        after = [rng.choice('abcdefg') for _ in range(rng.randrange(12))]
+        assert apply_delta(before, listing_delta(before, after)) == after
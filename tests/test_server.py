@@ -0,0 +1,11 @@
+from argparse import Namespace
+
+from src import server
+
+
+def test_optimizer_pools_share_the_cpus_between_workers(monkeypatch):
+    monkeypatch.setattr(server.os, 'cpu_count', lambda: 8)
+    assert server.optimizer_workers(Namespace(workers=1, optimizer_workers=None)) == 8
+    assert server.optimizer_workers(Namespace(workers=4, optimizer_workers=None)) == 2
+    assert server.optimizer_workers(Namespace(workers=8, optimizer_workers=None)) == 0
+    assert server.optimizer_workers(Namespace(workers=8, optimizer_workers=3)) == 3
@@ -0,0 +1,59 @@
+import pytest
+
+from src.interpreter import run_code
+from src.ir import format_code, IF_FALSE
+from src.parser import generate_intermediate_code
+from src.ssa import propagate_constants
+
+
+def propagate(source):
+    code = generate_intermediate_code(source)
+    propagated, changes = propagate_constants(code)
+    assert run_code(propagated)['output'] == run_code(code)['output']
+    return format_code(propagated), changes
+
+
+def test_branch_on_a_constant_removes_the_other_side():
+    listing, changes = propagate("x = 1\nif x > 0:\n    y = 2\nelse:\n    y = 3\nprint(y)\n")
+    assert "y = 3" not in listing
+    assert not any(line.startswith("if ") for line in listing)
+    assert listing[-1] == "t1 = call print(2)"
+    assert changes > 0
+
+
+def test_values_that_change_in_a_loop_are_not_constant():
+    listing, changes = propagate("x = 1\nwhile x < 10:\n    x = x + 1\nprint(x)\n")
+    assert listing[-1] == "t2 = call print(x)"
+    assert changes == 0
+
+
+def test_a_value_reassigned_to_the_same_constant_in_a_loop_stays_constant():
+    listing, _ = propagate("i = 0\nx = 5\nwhile i < 3:\n    i = i + 1\n    x = 5\nprint(x)\n")
+    assert listing[-1] == "t2 = call print(5)"
+
+
+def test_parameters_are_unknown_but_locals_are_propagated():
+    listing, _ = propagate("def f(a):\n    b = 2\n    return a + b\nprint(f(1))\n")
+    assert "t0 = a + 2" in listing
+
+
+def test_signed_zeros_do_not_meet_as_one_constant():
+    listing, _ = propagate("x = -0.0\nif len([1]):\n    x = 0.0\nprint(x)\n")
+    assert listing[-1] == "t3 = call print(x)"
+
+
+@pytest.mark.parametrize('source', [
+    "x = 0\nfor i in [1, 2, 3]:\n    if i > 1:\n        x = x + i\nprint(x)\n",
+    "a = 3\nb = a * 2\nif b == 6 and a < 4:\n    print('yes')\nelse:\n    print('no')\n",
+    "def g(n):\n    if n:\n        return 1\n    return 2\nprint(g(0), g(1))\n",
+])
+def test_propagation_keeps_behavior(source):
+    propagate(source)
+
+
+def test_propagation_is_idempotent():
+    code, _ = propagate_constants(generate_intermediate_code(
+        "x = 1\nif x:\n    y = x + 1\nprint(y)\n"))
+    again, changes = propagate_constants(code)
+    assert again == code and changes == 0
+    assert not any(ins.op == IF_FALSE for ins in code)
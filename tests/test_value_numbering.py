@@ -0,0 +1,68 @@
+import pytest
+
+from src.interpreter import run_code
+from src.optimizer import CodeOptimizer
+from src.parser import generate_intermediate_code
+from src.ir import Instruction, Const, COPY, CALL
+from src.value_numbering import number_values, rebound_names
+
+MUTATED_OPERANDS = [
+    ("L = [1]\nM = [1]\na = L == M\nL.append(2)\nb = L == M\nprint(a, b)\n", ['True False']),
+    ("L = [1, 2]\nx = L * 2\nL[0] = 5\ny = L * 2\nprint(x, y)\n", ['[1, 2, 1, 2] [5, 2, 5, 2]']),
+]
+
+
+@pytest.mark.parametrize('source, expected', MUTATED_OPERANDS)
+def test_operators_on_mutated_objects_are_recomputed(source, expected):
+    code = generate_intermediate_code(source)
+    numbered = CodeOptimizer().optimize_with_technique(code, 'common_subexpression_elimination')
+    assert run_code(numbered)['output'] == expected
+    assert run_code(CodeOptimizer().optimize(code))['output'] == expected
+
+
+def test_operators_on_scalars_survive_impure_calls():
+    code = [
+        Instruction(COPY, 'a', Const(3)),
+        Instruction('*', 't1', 'a', Const(4)),
+        Instruction(CALL, 't2', 'print', ('t1',)),
+        Instruction('*', 't3', 'a', Const(4)),
+    ]
+    numbered, replaced = number_values(code)
+    assert replaced == 1
+    assert numbered[3] == Instruction(COPY, 't3', 't1')
+
+
+PARAMETER_SHADOWS_BUILTIN = """
+def counted(x):
+    print('called')
+    return 1
+
+def f(len, x):
+    a = len(x)
+    b = len(x)
+    return a + b
+
+print(f(counted, [1]))
+"""
+
+
+def test_parameters_shadowing_pure_builtins_are_not_reused():
+    code = generate_intermediate_code(PARAMETER_SHADOWS_BUILTIN)
+    assert 'len' in rebound_names(code)
+    expected = ['called', 'called', '2']
+    assert run_code(code)['output'] == expected
+    numbered = CodeOptimizer().optimize_with_technique(code, 'common_subexpression_elimination')
+    assert run_code(numbered)['output'] == expected
+    assert run_code(CodeOptimizer().optimize(code))['output'] == expected
+
+
+def test_signed_zeros_get_different_value_numbers():
+    code = [
+        Instruction(CALL, 'c', 'len', ('L',)),
+        Instruction('*', 'a', 'c', Const(0.0)),
+        Instruction('*', 'b', 'c', Const(-0.0)),
+    ]
+    numbered, replaced = number_values(code)
+    assert replaced == 0
+    source = "c = len([1])\na = c * 0.0\nb = c * -0.0\nprint(a, b)\n"
+    assert run_code(CodeOptimizer().optimize(generate_intermediate_code(source)))['output'] == ['0.0 -0.0']